@@ -0,0 +1,87 @@
+# config/background.py
+"""
+Tiny in-process background runner for work that must not sit on a request's
+critical path (Graph refreshes, cache warm-ups, ...).
+
+Jobs run on a small thread pool; each job gets fresh DB connections and its
+exceptions are logged, never raised into the request. With
+BACKGROUND_TASKS_EAGER=1 (tests) jobs run inline.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger("lms.background")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "BACKGROUND_TASKS_WORKERS", 4),
+                    thread_name_prefix="lms-bg",
+                )
+    return _executor
+
+
+def _run(fn, args, kwargs, key=None):
+    close_old_connections()
+    try:
+        fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background job %s failed", getattr(fn, "__name__", fn))
+    finally:
+        if key is not None:
+            with _inflight_lock:
+                _inflight.discard(key)
+        close_old_connections()
+
+
+def _eager() -> bool:
+    return bool(getattr(settings, "BACKGROUND_TASKS_EAGER", False))
+
+
+def submit(fn, *args, **kwargs) -> None:
+    """
+    Run fn(*args, **kwargs) in the background.
+    """
+    if _eager():
+        _run(fn, args, kwargs)
+        return
+    _get_executor().submit(_run, fn, args, kwargs)
+
+
+def submit_once(key: str, fn, *args, **kwargs) -> bool:
+    """
+    Like submit(), but skipped while a job with the same key is still queued or
+    running in this process. Returns True if the job was scheduled.
+    """
+    with _inflight_lock:
+        if key in _inflight:
+            return False
+        _inflight.add(key)
+
+    if _eager():
+        _run(fn, args, kwargs, key)
+    else:
+        _get_executor().submit(_run, fn, args, kwargs, key)
+    return True
+
+
+def submit_on_commit(fn, *args, **kwargs) -> None:
+    """
+    submit() once the current transaction commits (immediately outside one),
+    so the job sees the rows the request wrote.
+    """
+    transaction.on_commit(lambda: submit(fn, *args, **kwargs))
@@ -0,0 +1,224 @@
+# config/instrumentation.py
+"""
+Per-request metrics: DB query count/time, Microsoft Graph call count/time,
+total latency and response size.
+
+- RequestMetricsMiddleware collects them for every request, folds them into
+  in-process per-route aggregates and adds a Server-Timing header for staff
+  users (everyone with REQUEST_METRICS_SERVER_TIMING, e.g. in development).
+- graph_timer() is the hook used by users.graph and courses.sharepoint around
+  every outbound Graph/SharePoint HTTP call.
+- route_stats is the staff-only endpoint that exposes the aggregates.
+
+Everything is a handful of counters per request, so it is safe to leave on.
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+logger = logging.getLogger("lms.metrics")
+
+
+class RequestMetrics:
+    __slots__ = ("db_queries", "db_time", "graph_calls", "graph_time")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.graph_calls = 0
+        self.graph_time = 0.0
+
+
+_current = contextvars.ContextVar("lms_request_metrics", default=None)
+
+
+def current_metrics():
+    """
+    Metrics of the request being served on this thread/task (None outside requests).
+    """
+    return _current.get()
+
+
+def record_graph_call(seconds: float) -> None:
+    m = _current.get()
+    if m is None:
+        return
+    m.graph_calls += 1
+    m.graph_time += seconds
+
+
+@contextmanager
+def graph_timer():
+    """
+    Wrap one outbound Graph/SharePoint HTTP call.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_graph_call(time.perf_counter() - t0)
+
+
+# -----------------------------
+# Aggregates (process-local)
+# -----------------------------
+
+class RouteStats:
+    FIELDS = ("count", "errors", "total_ms", "max_ms", "db_queries", "db_ms", "graph_calls", "graph_ms", "bytes")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+        self._since = time.time()
+
+    def record(self, route: str, *, status_code: int, total_ms: float, m: RequestMetrics, size: int) -> None:
+        with self._lock:
+            row = self._routes.get(route)
+            if row is None:
+                row = self._routes[route] = dict.fromkeys(self.FIELDS, 0)
+            row["count"] += 1
+            if status_code >= 500:
+                row["errors"] += 1
+            row["total_ms"] += total_ms
+            row["max_ms"] = max(row["max_ms"], total_ms)
+            row["db_queries"] += m.db_queries
+            row["db_ms"] += m.db_time * 1000.0
+            row["graph_calls"] += m.graph_calls
+            row["graph_ms"] += m.graph_time * 1000.0
+            row["bytes"] += size
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = {k: dict(v) for k, v in self._routes.items()}
+            since = self._since
+
+        out = []
+        for route, row in routes.items():
+            n = row["count"] or 1
+            out.append({
+                "route": route,
+                "count": row["count"],
+                "errors": row["errors"],
+                "avg_ms": round(row["total_ms"] / n, 2),
+                "max_ms": round(row["max_ms"], 2),
+                "avg_db_queries": round(row["db_queries"] / n, 2),
+                "avg_db_ms": round(row["db_ms"] / n, 2),
+                "avg_graph_calls": round(row["graph_calls"] / n, 2),
+                "avg_graph_ms": round(row["graph_ms"] / n, 2),
+                "avg_bytes": int(row["bytes"] / n),
+            })
+        out.sort(key=lambda r: r["avg_ms"] * r["count"], reverse=True)
+        return {"since": since, "routes": out}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes = {}
+            self._since = time.time()
+
+
+route_stats_store = RouteStats()
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+
+def _route_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return f"{request.method} /{match.route}"
+
+
+def _response_size(response) -> int:
+    if getattr(response, "streaming", False):
+        try:
+            return int(response.get("Content-Length") or 0)
+        except (TypeError, ValueError):
+            return 0
+    return len(getattr(response, "content", b"") or b"")
+
+
+class RequestMetricsMiddleware:
+    """
+    Keep this first in MIDDLEWARE so the latency covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = bool(getattr(settings, "REQUEST_METRICS_ENABLED", True))
+        self.slow_ms = float(getattr(settings, "REQUEST_METRICS_SLOW_MS", 1000))
+        self.log_all = bool(getattr(settings, "REQUEST_METRICS_LOG_ALL", False))
+        self.server_timing = bool(getattr(settings, "REQUEST_METRICS_SERVER_TIMING", False))
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        m = RequestMetrics()
+        token = _current.set(m)
+
+        def _db_wrapper(execute, sql, params, many, context):
+            t0 = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                m.db_queries += 1
+                m.db_time += time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        try:
+            with connection.execute_wrapper(_db_wrapper):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total_ms = (time.perf_counter() - t0) * 1000.0
+
+        # timings reveal query counts and Graph usage: staff only unless enabled for all.
+        # DRF copies the user it authenticated (JWT) onto the Django request.
+        if self.server_timing or getattr(getattr(request, "user", None), "is_staff", False):
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={m.db_time * 1000.0:.1f};desc="{m.db_queries} queries"',
+                f'graph;dur={m.graph_time * 1000.0:.1f};desc="{m.graph_calls} calls"',
+                f"total;dur={total_ms:.1f}",
+            ])
+
+        route = _route_name(request)
+        size = _response_size(response)
+        route_stats_store.record(route, status_code=response.status_code, total_ms=total_ms, m=m, size=size)
+
+        if self.log_all or total_ms >= self.slow_ms:
+            logger.log(
+                logging.WARNING if total_ms >= self.slow_ms else logging.INFO,
+                "%s status=%s total_ms=%.1f db_queries=%d db_ms=%.1f graph_calls=%d graph_ms=%.1f bytes=%d",
+                route, response.status_code, total_ms,
+                m.db_queries, m.db_time * 1000.0, m.graph_calls, m.graph_time * 1000.0, size,
+            )
+
+        return response
+
+
+# -----------------------------
+# Stats endpoint
+# -----------------------------
+
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAdminUser])
+def route_stats(request):
+    """
+    GET    /api/metrics/ -> per-route aggregates since start (or last reset)
+    DELETE /api/metrics/ -> reset aggregates
+    """
+    if request.method == "DELETE":
+        route_stats_store.reset()
+        return Response(status=204)
+    return Response(route_stats_store.snapshot())
@@ -1,3 +1,4 @@
+from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 import os
@@ -35,6 +36,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Request metrics first so latency covers the whole stack
+    "config.instrumentation.RequestMetricsMiddleware",
+
     # CORS must be near the top
     "corsheaders.middleware.CorsMiddleware",
 
@@ -67,12 +71,83 @@ TEMPLATES = [
 WSGI_APPLICATION = "config.wsgi.application"
 
 # Database
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# -----------------------------
+# ✅ Profile selected by DB_ENGINE: "sqlite" (local dev, default) or "postgres" (production)
+# -----------------------------
+DB_ENGINE = os.getenv("DB_ENGINE", "sqlite").strip().lower()
+
+if DB_ENGINE in ("postgres", "postgresql"):
+    # pgbouncer in transaction pooling mode cannot keep server-side cursors or
+    # persistent connections, so the pooler owns connection reuse instead of Django.
+    DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0") == "1"
+
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("DB_NAME", "lms"),
+            "USER": os.getenv("DB_USER", "lms"),
+            "PASSWORD": os.getenv("DB_PASSWORD", ""),
+            "HOST": os.getenv("DB_HOST", "localhost"),
+            "PORT": os.getenv("DB_PORT", "5432"),
+            "CONN_MAX_AGE": 0 if DB_PGBOUNCER else int(os.getenv("DB_CONN_MAX_AGE", "600")),
+            "CONN_HEALTH_CHECKS": True,
+            "DISABLE_SERVER_SIDE_CURSORS": DB_PGBOUNCER,
+            "OPTIONS": {
+                "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
+                "application_name": os.getenv("DB_APPLICATION_NAME", "lms-backend"),
+            },
+        }
+    }
+else:
+    # WAL lets readers proceed while update_progress / quiz_submit write, busy_timeout
+    # (the "timeout" option) waits for the write lock instead of failing with
+    # "database is locked", and IMMEDIATE transactions take that lock up front.
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.getenv("DB_NAME", str(BASE_DIR / "db.sqlite3")),
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "60")),
+            "OPTIONS": {
+                "timeout": int(os.getenv("DB_SQLITE_BUSY_TIMEOUT_SECONDS", "20")),
+                "transaction_mode": "IMMEDIATE",
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                ),
+            },
+        }
+    }
+
+# Cache
+# -----------------------------
+# ✅ Shared by all workers so the Graph app token / SKU map (users.graph) are
+# fetched once per host (file) or per deployment (redis), not once per worker.
+# CACHE_BACKEND: "file" (default), "redis" (CACHE_LOCATION=redis://...) or "locmem".
+# The file backend stores the Graph app token unencrypted under CACHE_LOCATION:
+# keep it private to the app user, or use redis in production.
+# -----------------------------
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "file").strip().lower()
+
+if CACHE_BACKEND == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", "redis://127.0.0.1:6379/1"),
+        }
+    }
+elif CACHE_BACKEND == "locmem":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+        }
     }
-}
 
 # Password validation (not used for login, but keep defaults)
 AUTH_PASSWORD_VALIDATORS = [
@@ -91,6 +166,28 @@ USE_TZ = True
 # Static files
 STATIC_URL = "static/"
 
+# ✅ NEW: video_stream range serving (courses.streaming): per-process cache of
+# SharePoint item size / mime / eTag, and the most ranges served per request
+STREAM_META_TTL_SECONDS = int(os.getenv("STREAM_META_TTL_SECONDS", "300"))
+STREAM_META_CACHE_SIZE = int(os.getenv("STREAM_META_CACHE_SIZE", "5000"))
+STREAM_MAX_RANGES = int(os.getenv("STREAM_MAX_RANGES", "16"))
+
+# ✅ NEW: read size bounds for forwarded video bytes (adapted to throughput)
+STREAM_CHUNK_MIN_BYTES = int(os.getenv("STREAM_CHUNK_MIN_BYTES", str(64 * 1024)))
+STREAM_CHUNK_MAX_BYTES = int(os.getenv("STREAM_CHUNK_MAX_BYTES", str(1024 * 1024)))
+
+# ✅ NEW: optional local copies of streamed videos, served with sendfile where
+# the server supports it. Empty = off. Oldest files are evicted past MAX_BYTES.
+STREAM_CACHE_ROOT = os.getenv("STREAM_CACHE_ROOT", "")
+STREAM_CACHE_MAX_BYTES = int(os.getenv("STREAM_CACHE_MAX_BYTES", str(20 * 1024 ** 3)))
+STREAM_CACHE_MAX_FILE_BYTES = int(os.getenv("STREAM_CACHE_MAX_FILE_BYTES", str(1024 ** 3)))
+
+# ✅ NEW: local cache of resized course thumbnails (courses.thumbnails)
+THUMBNAIL_ROOT = os.getenv("THUMBNAIL_ROOT", str(BASE_DIR / ".cache" / "thumbnails"))
+THUMBNAIL_CACHE_SECONDS = int(os.getenv("THUMBNAIL_CACHE_SECONDS", str(365 * 24 * 3600)))
+# an original that failed to render is not fetched again for this long
+THUMBNAIL_FAILURE_SECONDS = int(os.getenv("THUMBNAIL_FAILURE_SECONDS", "600"))
+
 # ✅ Tell Django to look in BASE_DIR/static (your backend/static folder)
 STATICFILES_DIRS = [
     BASE_DIR / "static",
@@ -115,10 +212,31 @@ AZURE_CLIENT_ID = os.getenv("AZURE_CLIENT_ID_BACKEND")
 AZURE_TENANT_ID = os.getenv("AZURE_TENANT_ID_BACKEND")
 AZURE_CLIENT_SECRET = os.getenv("AZURE_CLIENT_SECRET")
 
-AZURE_AUTHORITY = f"https://login.microsoftonline.com/{AZURE_TENANT_ID}"
+# ✅ NEW: base URLs are overridable so the backend can run against the local
+# fake tenant (python manage.py fake_graph) for offline tests/benchmarks.
+AZURE_LOGIN_BASE_URL = os.getenv("AZURE_LOGIN_BASE_URL", "https://login.microsoftonline.com").rstrip("/")
+GRAPH_BASE_URL = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0").rstrip("/")
+
+AZURE_AUTHORITY = f"{AZURE_LOGIN_BASE_URL}/{AZURE_TENANT_ID}"
 AZURE_GRAPH_SCOPE = os.getenv("AZURE_GRAPH_SCOPE", "https://graph.microsoft.com/.default")
 LMS_TRAINERS_GROUP_ID = os.getenv("LMS_TRAINERS_GROUP_ID", "")
 
+# ✅ NEW: Graph app token / SKU map are renewed in the background once they are
+# this close to expiry, so requests never wait on the token endpoint
+GRAPH_CACHE_RENEW_BEFORE_SECONDS = int(os.getenv("GRAPH_CACHE_RENEW_BEFORE_SECONDS", "300"))
+
+# ✅ NEW: Entra signing keys (users.jwks): shared JWKS lifetime, background
+# renewal window, and the minimum gap between refetches for an unknown kid
+JWKS_CACHE_TTL_SECONDS = int(os.getenv("JWKS_CACHE_TTL_SECONDS", str(6 * 3600)))
+JWKS_CACHE_RENEW_BEFORE_SECONDS = int(os.getenv("JWKS_CACHE_RENEW_BEFORE_SECONDS", "3600"))
+JWKS_FORCED_REFRESH_INTERVAL_SECONDS = int(os.getenv("JWKS_FORCED_REFRESH_INTERVAL_SECONDS", "60"))
+
+# ✅ NEW: max verified Entra access tokens remembered per process (azure_auth)
+AZURE_TOKEN_CACHE_SIZE = int(os.getenv("AZURE_TOKEN_CACHE_SIZE", "10000"))
+
+# ✅ NEW: license snapshots older than this are refreshed in the background on login
+LICENSE_REFRESH_TTL_SECONDS = int(os.getenv("LICENSE_REFRESH_TTL_SECONDS", str(24 * 3600)))
+
 # ✅ NEW: Frontend client id (audience for id_token)
 AZURE_FRONTEND_CLIENT_ID = os.getenv("AZURE_FRONTEND_CLIENT_ID", "")
 
@@ -129,12 +247,28 @@ AZURE_FRONTEND_CLIENT_ID = os.getenv("AZURE_FRONTEND_CLIENT_ID", "")
 AZURE_API_AUDIENCE = os.getenv("AZURE_API_AUDIENCE", f"api://{AZURE_CLIENT_ID}")
 
 # ✅ DRF auth: your app-issued JWT only (SimpleJWT)
+# ClaimsJWTAuthentication resolves request.user from the token's "lms" claim
+# (no query); tokens without it behave like plain JWTAuthentication.
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.ClaimsJWTAuthentication",
     ),
 }
 
+# ✅ Access tokens are accepted without a user-row lookup (claims, above), so
+# their lifetime bounds how long a stale claim can be used. Deactivating or
+# deleting a user revokes their tokens at once through the cache
+# (users.authentication.revoke_user); keep this short all the same.
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=int(os.getenv("JWT_ACCESS_TOKEN_MINUTES", "5"))),
+}
+
+# Stamp role / staff flags / trainer flag into app-issued tokens
+JWT_USER_CLAIMS_ENABLED = os.getenv("JWT_USER_CLAIMS_ENABLED", "1") == "1"
+
+# How long a stamped trainer flag is trusted before Graph is asked again
+LMS_TRAINER_CLAIM_TTL_SECONDS = int(os.getenv("LMS_TRAINER_CLAIM_TTL_SECONDS", "900"))
+
 # ✅ SharePoint embed URL allowlist (for creator video validation)
 ALLOWED_EMBED_DOMAINS = [
     "aspectmaint.sharepoint.com",
@@ -159,5 +293,41 @@ SHAREPOINT_FIELD_ROOT_FOLDER = os.getenv("SHAREPOINT_FIELD_ROOT_FOLDER", "Common
 # Signed streaming link TTL seconds
 VIDEO_STREAM_SIGNED_URL_TTL_SECONDS = int(os.getenv("VIDEO_STREAM_SIGNED_URL_TTL_SECONDS", "900"))  # 15 min
 
+# ✅ NEW: playback token keys (courses.playback), "kid:secret,kid:secret".
+# The first signs, all verify: add the new key first, drop the old one after
+# the TTL above. Set it in production; the default is for local development.
+VIDEO_STREAM_SIGNING_KEYS = os.getenv(
+    "VIDEO_STREAM_SIGNING_KEYS", "dev:insecure-development-playback-key" if DEBUG else ""
+)
+
 # Upload chunk size (bytes) for Graph upload sessions
 GRAPH_UPLOAD_CHUNK_SIZE = int(os.getenv("GRAPH_UPLOAD_CHUNK_SIZE", str(10 * 1024 * 1024)))  # 10MB
+
+# -----------------------------
+# ✅ Request metrics (Server-Timing header + /api/metrics/)
+# -----------------------------
+REQUEST_METRICS_ENABLED = os.getenv("REQUEST_METRICS_ENABLED", "1") == "1"
+
+# Requests slower than this are logged at WARNING on the "lms.metrics" logger
+REQUEST_METRICS_SLOW_MS = int(os.getenv("REQUEST_METRICS_SLOW_MS", "1000"))
+
+# Log one INFO line per request (noisy; meant for load tests)
+REQUEST_METRICS_LOG_ALL = os.getenv("REQUEST_METRICS_LOG_ALL", "0") == "1"
+
+# Server-Timing goes to staff users only; set to 1 to send it to every client (development)
+REQUEST_METRICS_SERVER_TIMING = os.getenv("REQUEST_METRICS_SERVER_TIMING", "0") == "1"
+
+# -----------------------------
+# ✅ Background jobs (config.background)
+# -----------------------------
+BACKGROUND_TASKS_WORKERS = int(os.getenv("BACKGROUND_TASKS_WORKERS", "4"))
+
+# Warm shared caches when a worker starts (config.startup)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+
+# Run jobs inline instead of on the pool (tests / debugging)
+BACKGROUND_TASKS_EAGER = os.getenv("BACKGROUND_TASKS_EAGER", "0") == "1"
+
+# ✅ NEW: id-watermark rollups (logins, analytics) leave rows younger than this
+# for the next run, so ids whose transaction commits late are not skipped
+ROLLUP_SAFETY_LAG_SECONDS = int(os.getenv("ROLLUP_SAFETY_LAG_SECONDS", "300"))
@@ -0,0 +1,129 @@
+# config/shared_cache.py
+"""
+Values that are expensive to fetch (Graph app token, SKU map, JWKS) and must
+be shared by every worker.
+
+A SharedValue lives in the Django cache (settings.CACHES; shared by all
+workers with the file or redis backend) with a process-local copy in front.
+Refresh is single-flight: one thread per process (a lock) and one process per
+cache (a cache.add lock key); everyone else waits for, or keeps using, the
+current value. A value within `renew_before` seconds of expiry is still served
+and renewed by a background job, so only a cold cache ever blocks a request.
+
+Values are stored as-is: with the file backend the Graph app token sits
+unencrypted under CACHE_LOCATION (Django creates it 0700, files 0600). Keep
+that directory private to the app user, or use redis (CACHE_BACKEND).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from config import background
+
+# A value closer than this to expiry is never handed out
+HARD_EXPIRY_MARGIN_SECONDS = 60
+
+# How long a cold caller waits for another process's fetch before fetching itself
+LOCK_WAIT_SECONDS = 15
+
+
+def _usable(entry, now: float, min_remaining: float) -> bool:
+    return bool(entry and entry.get("value") is not None and now < entry["expires_at"] - min_remaining)
+
+
+class SharedValue:
+    def __init__(self, key_func, fetch, *, renew_before=lambda: 300):
+        """
+        key_func() -> cache key (evaluated per call, so it follows settings)
+        fetch() -> (value, lifetime_seconds)
+        renew_before() -> seconds before expiry to start background renewal
+        """
+        self.key_func = key_func
+        self.fetch = fetch
+        self.renew_before = renew_before
+        self.local = {"key": None, "value": None, "expires_at": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, "SHARED_CACHE_ALIAS", "default")]
+
+    def get(self):
+        """
+        Current value, blocking only when there is no usable one.
+        """
+        key = self.key_func()
+        now = time.time()
+
+        entry = self.local if self.local.get("key") == key else None
+        if not _usable(entry, now, HARD_EXPIRY_MARGIN_SECONDS):
+            entry = self.refresh(min_remaining=HARD_EXPIRY_MARGIN_SECONDS, wait=True)
+
+        value, expires_at = entry["value"], entry["expires_at"]
+
+        renew_before = int(self.renew_before())
+        if now >= expires_at - renew_before:
+            background.submit_once(
+                f"shared-renew:{key}", self.refresh, min_remaining=renew_before, wait=False,
+            )
+
+        return value
+
+    def refresh(self, *, min_remaining: float, wait: bool, accept=None):
+        """
+        Single-flight refresh. An entry (local or shared) with more than
+        min_remaining seconds left, and for which accept(value) holds, is
+        reused instead of fetching. Returns the entry, or None if another
+        process holds the refresh and wait is False.
+        """
+        key = self.key_func()
+        cache = self._cache()
+
+        def good(entry, now):
+            return _usable(entry, now, min_remaining) and (accept is None or accept(entry["value"]))
+
+        with self._lock:
+            now = time.time()
+            if self.local.get("key") == key and good(self.local, now):
+                return dict(self.local)
+
+            shared = cache.get(key)
+            if good(shared, now):
+                self.local.update(shared, key=key)
+                return shared
+
+            lock_key = key + ":lock"
+            owns_lock = cache.add(lock_key, 1, timeout=30)
+            if not owns_lock:
+                if not wait:
+                    return None
+                # Another process is fetching; wait briefly for its result
+                deadline = time.time() + LOCK_WAIT_SECONDS
+                while time.time() < deadline:
+                    time.sleep(0.1)
+                    shared = cache.get(key)
+                    if _usable(shared, time.time(), HARD_EXPIRY_MARGIN_SECONDS) and \
+                            (accept is None or accept(shared["value"])):
+                        self.local.update(shared, key=key)
+                        return shared
+
+            try:
+                value, lifetime = self.fetch()
+                entry = {"value": value, "expires_at": time.time() + lifetime}
+                cache.set(key, entry, timeout=int(lifetime))
+                self.local.update(entry, key=key)
+                return entry
+            finally:
+                # never release a lock another process holds (it is still fetching)
+                if owns_lock:
+                    cache.delete(lock_key)
+
+    def reset(self) -> None:
+        """
+        Drop the value from this process and the shared cache.
+        """
+        key = self.key_func()
+        self._cache().delete_many([key, key + ":lock"])
+        self.local.update({"key": None, "value": None, "expires_at": 0})
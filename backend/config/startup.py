@@ -0,0 +1,39 @@
+# config/startup.py
+"""
+Per-process checks and warm-up, called from wsgi.py / asgi.py once the app
+is loaded (not for management commands or tests).
+"""
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+
+from config import background
+
+
+def _graph_configured() -> bool:
+    return bool(settings.AZURE_TENANT_ID and settings.AZURE_CLIENT_ID and settings.AZURE_CLIENT_SECRET)
+
+
+def check_configuration() -> None:
+    """
+    Run the "lms" system checks (e.g. courses.checks) and refuse to serve
+    with errors, so a misconfigured worker fails at boot, not per request.
+    """
+    errors = [e for e in checks.run_checks(tags=["lms"]) if e.is_serious()]
+    if errors:
+        raise ImproperlyConfigured("; ".join(f"{e.id}: {e.msg}" for e in errors))
+
+
+def warm_up() -> None:
+    """
+    Fetch the Graph app token, SKU map and Entra signing keys in the
+    background so the first requests of a fresh worker do not pay for them.
+    """
+    if not getattr(settings, "STARTUP_WARMUP", True) or not _graph_configured():
+        return
+
+    from users.graph import warm_graph_caches
+    from users.jwks import key_store
+
+    background.submit(warm_graph_caches)
+    background.submit(key_store.warm)
@@ -1,7 +1,9 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
-from rest_framework_simplejwt.views import TokenRefreshView
+
+from config.instrumentation import route_stats
+from users.views import ClaimsTokenRefreshView
 
 def home(request):
     return JsonResponse({"status": "ok", "service": "backend"})
@@ -14,7 +16,10 @@ urlpatterns = [
     path("api/", include("courses.urls")),
     path("api/", include("training.urls")),  # ✅ ADD THIS
 
-    path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("api/token/refresh/", ClaimsTokenRefreshView.as_view(), name="token_refresh"),
+
+    # per-route latency / query / Graph aggregates (staff only)
+    path("api/metrics/", route_stats, name="route_stats"),
 
     # homepage
     path("", home),
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# ✅ NEW: fail on missing configuration, then warm Graph token/SKU caches off the request path
+from config.startup import check_configuration, warm_up  # noqa: E402
+
+check_configuration()
+warm_up()
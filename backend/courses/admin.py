@@ -3,7 +3,8 @@ from django import forms
 
 from .models import (
     Course, CourseSection, CourseVideo, CourseProgress, CourseVideoOpened,
-    CourseQuiz, QuizQuestion, QuizChoice, QuizSubmission, QuizAnswer
+    CourseQuiz, QuizQuestion, QuizChoice, QuizSubmission, QuizAnswer,
+    CourseDailyStats, StorageDeletion,
 )
 
 
@@ -119,3 +120,20 @@ class QuizSubmissionAdmin(admin.ModelAdmin):
 class QuizAnswerAdmin(admin.ModelAdmin):
     list_display = ["submission", "question", "selected_choice"]
     list_select_related = ["submission", "question", "selected_choice"]
+
+
+@admin.register(CourseDailyStats)
+class CourseDailyStatsAdmin(admin.ModelAdmin):
+    # Precomputed by `manage.py rollup_analytics`
+    list_display = ("course", "date", "learners_started", "learners_completed", "quiz_attempts", "quiz_passes")
+    ordering = ("-date",)
+    date_hierarchy = "date"
+    search_fields = ("course__title",)
+
+
+@admin.register(StorageDeletion)
+class StorageDeletionAdmin(admin.ModelAdmin):
+    # Outbox applied by `manage.py process_storage_deletions`
+    list_display = ("__str__", "reason", "attempts", "next_attempt_at", "created_at")
+    ordering = ("next_attempt_at",)
+    search_fields = ("path", "item_id", "reason")
@@ -0,0 +1,396 @@
+# courses/analytics.py
+"""
+Learning analytics (completion, quiz pass rate, drop-off per section) from
+per-course / per-video daily rollups.
+
+rollup_course_analytics (cron: `python manage.py rollup_analytics`) folds new
+CourseVideoOpened rows (one per first open of an item) and QuizSubmission rows
+past their watermarks into CourseDailyStats / VideoDailyStats, using
+CourseLearner to count each learner's start and first pass once. The first run
+starts from watermark 0, i.e. it backfills all history. Reports then read
+rows-per-day instead of scanning the event tables. Rows younger than
+ROLLUP_SAFETY_LAG_SECONDS wait for the next run, so an id that commits after
+a higher one is never skipped (users.activity.settled_rows).
+
+Item analysis (per-question / per-choice) is not rolled up: its counters are
+updated in quiz_submit's own transaction, see record_quiz_item_stats.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.utils import timezone
+
+from users.activity import settled_rows
+from users.models import RollupWatermark
+
+from .models import (
+    CourseDailyStats, CourseLearner, CourseQuiz, CourseSection, CourseVideo, CourseVideoOpened, QuizAnswer,
+    QuizChoiceStats, QuizQuestionStats, QuizSubmission, VideoDailyStats,
+)
+
+OPENS_WATERMARK = "course_video_opens"
+SUBMISSIONS_WATERMARK = "quiz_submissions"
+
+
+def _locked_watermark(name):
+    wm, _ = RollupWatermark.objects.get_or_create(name=name)
+    return RollupWatermark.objects.select_for_update().get(pk=wm.pk)
+
+
+def _add(model, key_fields, deltas: dict) -> None:
+    """
+    Add counters: deltas maps a key tuple (values of key_fields) to {field: n}.
+    """
+    for key, fields in deltas.items():
+        lookup = dict(zip(key_fields, key))
+        _, created = model.objects.get_or_create(**lookup, defaults=fields)
+        if not created:
+            model.objects.filter(**lookup).update(**{f: F(f) + n for f, n in fields.items()})
+
+
+def _first_dates(rows) -> dict:
+    """
+    (user_id, course_id, date) rows -> earliest date per (user_id, course_id).
+    """
+    first = {}
+    for user_id, course_id, day in rows:
+        key = (user_id, course_id)
+        if key not in first or day < first[key]:
+            first[key] = day
+    return first
+
+
+def _start_learners(first_touch: dict) -> Counter:
+    """
+    Insert CourseLearner rows for learners not seen before.
+    Returns newly started learners per (course_id, date).
+    """
+    if not first_touch:
+        return Counter()
+
+    existing = set(
+        CourseLearner.objects
+        .filter(user_id__in={u for u, _ in first_touch}, course_id__in={c for _, c in first_touch})
+        .values_list("user_id", "course_id")
+    )
+    new = {key: day for key, day in first_touch.items() if key not in existing}
+    CourseLearner.objects.bulk_create(
+        [CourseLearner(user_id=u, course_id=c, started_on=day) for (u, c), day in new.items()],
+        ignore_conflicts=True,
+    )
+    return Counter((c, day) for (_, c), day in new.items())
+
+
+def _complete_learners(first_pass: dict) -> Counter:
+    """
+    Stamp completed_on for learners passing for the first time.
+    Returns newly completed learners per (course_id, date).
+    """
+    if not first_pass:
+        return Counter()
+
+    pending = (
+        CourseLearner.objects
+        .filter(
+            user_id__in={u for u, _ in first_pass},
+            course_id__in={c for _, c in first_pass},
+            completed_on__isnull=True,
+        )
+        .values_list("pk", "user_id", "course_id")
+    )
+    by_day = {}
+    for pk, u, c in pending:
+        day = first_pass.get((u, c))
+        if day is not None:
+            by_day.setdefault(day, []).append((pk, c))
+
+    completed = Counter()
+    for day, rows in by_day.items():
+        CourseLearner.objects.filter(pk__in=[pk for pk, _ in rows]).update(completed_on=day)
+        completed.update((c, day) for _, c in rows)
+    return completed
+
+
+def _fold_opens(rows, course_deltas) -> dict:
+    """
+    rows: (id, user_id, course_id, video_id, first_opened_at). Returns the
+    VideoDailyStats deltas and adds to course_deltas.
+    """
+    video_deltas = {}
+    touches = []
+    for _, user_id, course_id, video_id, at in rows:
+        day = timezone.localdate(at)
+        video_deltas.setdefault((course_id, video_id, day), {"viewers": 0})["viewers"] += 1
+        course_deltas.setdefault((course_id, day), Counter())["first_opens"] += 1
+        touches.append((user_id, course_id, day))
+
+    for key, n in _start_learners(_first_dates(touches)).items():
+        course_deltas.setdefault(key, Counter())["learners_started"] += n
+    return video_deltas
+
+
+def _fold_submissions(rows, course_deltas) -> None:
+    """
+    rows: (id, user_id, course_id, submitted_at, all_correct).
+    """
+    touches, passes = [], []
+    for _, user_id, course_id, at, all_correct in rows:
+        day = timezone.localdate(at)
+        counters = course_deltas.setdefault((course_id, day), Counter())
+        counters["quiz_attempts"] += 1
+        touches.append((user_id, course_id, day))
+        if all_correct:
+            counters["quiz_passes"] += 1
+            passes.append((user_id, course_id, day))
+
+    # A course without required videos can be passed without opening anything
+    for key, n in _start_learners(_first_dates(touches)).items():
+        course_deltas.setdefault(key, Counter())["learners_started"] += n
+    for key, n in _complete_learners(_first_dates(passes)).items():
+        course_deltas.setdefault(key, Counter())["learners_completed"] += n
+
+
+def rollup_course_analytics(batch_size: int = 5000) -> dict:
+    """
+    Fold new opens and quiz submissions into the daily rollups.
+    Idempotent; concurrent runs serialize on the watermark rows.
+    """
+    opens = submissions = 0
+
+    while True:
+        with transaction.atomic():
+            # Both streams update CourseLearner, so both watermarks are held
+            opens_wm = _locked_watermark(OPENS_WATERMARK)
+            subs_wm = _locked_watermark(SUBMISSIONS_WATERMARK)
+
+            open_rows = settled_rows(list(
+                CourseVideoOpened.objects
+                .filter(id__gt=opens_wm.position)
+                .order_by("id")
+                .values_list("id", "user_id", "course_id", "video_id", "first_opened_at")[:batch_size]
+            ), 4)
+            sub_rows = settled_rows(list(
+                QuizSubmission.objects
+                .filter(id__gt=subs_wm.position)
+                .order_by("id")
+                .values_list("id", "user_id", "quiz__course_id", "submitted_at", "all_correct")[:batch_size]
+            ), 3)
+            if not open_rows and not sub_rows:
+                break
+
+            course_deltas = {}
+            # Opens first: a learner's start comes from their first open when there is one
+            video_deltas = _fold_opens(open_rows, course_deltas)
+            _fold_submissions(sub_rows, course_deltas)
+
+            _add(VideoDailyStats, ("course_id", "video_id", "date"), video_deltas)
+            _add(CourseDailyStats, ("course_id", "date"), {k: dict(v) for k, v in course_deltas.items()})
+
+            for wm, rows in ((opens_wm, open_rows), (subs_wm, sub_rows)):
+                if rows:
+                    wm.position = rows[-1][0]
+                    wm.save(update_fields=["position", "updated_at"])
+
+            opens += len(open_rows)
+            submissions += len(sub_rows)
+
+    return {"opens": opens, "submissions": submissions}
+
+
+def _rate(part, whole):
+    return round(part / whole, 4) if whole else None
+
+
+def course_report(course, date_from=None, date_to=None) -> dict:
+    """
+    Report for the creator UI from the rollups only. Dates are inclusive;
+    None means unbounded.
+    """
+    days = {}
+    if date_from:
+        days["date__gte"] = date_from
+    if date_to:
+        days["date__lte"] = date_to
+
+    daily = list(
+        CourseDailyStats.objects
+        .filter(course=course, **days)
+        .order_by("date")
+        .values("date", "learners_started", "learners_completed", "first_opens", "quiz_attempts", "quiz_passes")
+    )
+    totals = {
+        f: sum(d[f] for d in daily)
+        for f in ("learners_started", "learners_completed", "first_opens", "quiz_attempts", "quiz_passes")
+    }
+    totals["completion_rate"] = _rate(totals["learners_completed"], totals["learners_started"])
+    totals["quiz_pass_rate"] = _rate(totals["quiz_passes"], totals["quiz_attempts"])
+
+    viewers = dict(
+        VideoDailyStats.objects
+        .filter(course=course, **days)
+        .values("video_id")
+        .annotate(n=Sum("viewers"))
+        .values_list("video_id", "n")
+    )
+    videos = list(
+        CourseVideo.objects
+        .filter(course=course)
+        .order_by("section__order", "order")
+        .values("id", "section_id", "video_title", "content_type")
+    )
+
+    # Learners move through sections in order, so the most-opened item of a
+    # section is how many learners reached it
+    sections = []
+    previous = totals["learners_started"]
+    for s in CourseSection.objects.filter(course=course).order_by("order").values("id", "title", "order"):
+        reached = max((viewers.get(v["id"], 0) for v in videos if v["section_id"] == s["id"]), default=0)
+        sections.append({
+            "section_id": s["id"],
+            "title": s["title"],
+            "order": s["order"],
+            "learners": reached,
+            "drop_off_rate": _rate(max(previous - reached, 0), previous),
+        })
+        previous = reached
+
+    wm = RollupWatermark.objects.filter(name=OPENS_WATERMARK).values_list("updated_at", flat=True).first()
+
+    return {
+        "course_id": course.id,
+        "from": date_from,
+        "to": date_to,
+        "rolled_up_at": wm,
+        "totals": totals,
+        "daily": daily,
+        "sections": sections,
+        "videos": [
+            {
+                "video_id": v["id"],
+                "section_id": v["section_id"],
+                "title": v["video_title"],
+                "content_type": v["content_type"],
+                "viewers": viewers.get(v["id"], 0),
+            }
+            for v in videos
+        ],
+    }
+
+
+# -----------------------------
+# Item analysis
+# -----------------------------
+
+def _ensure_item_stats(question_ids, choice_ids) -> None:
+    QuizQuestionStats.objects.bulk_create(
+        [QuizQuestionStats(question_id=q) for q in question_ids], ignore_conflicts=True,
+    )
+    QuizChoiceStats.objects.bulk_create(
+        [QuizChoiceStats(choice_id=c) for c in choice_ids], ignore_conflicts=True,
+    )
+
+
+def record_quiz_item_stats(question_ids, selected: dict) -> None:
+    """
+    Count one submission: question_ids are the quiz's questions, selected maps
+    question_id -> the (valid) choice_id picked. Call inside the transaction
+    that stores the submission; the UPDATEs are row-level increments, so
+    concurrent submissions never lose counts.
+    """
+    question_ids = list(question_ids)
+    choice_ids = list(selected.values())
+    answered_ids = list(selected.keys())
+
+    # Rows for questions/choices added since the last submission
+    _ensure_item_stats(question_ids, choice_ids)
+
+    QuizQuestionStats.objects.filter(question_id__in=question_ids).update(
+        attempts=F("attempts") + 1,
+        answered=F("answered") + Case(When(question_id__in=answered_ids, then=Value(1)), default=Value(0)),
+    )
+    if choice_ids:
+        QuizChoiceStats.objects.filter(choice_id__in=choice_ids).update(selected=F("selected") + 1)
+
+
+def recompute_quiz_item_stats(quiz) -> None:
+    """
+    Rebuild a quiz's counters from QuizAnswer (backfill / repair).
+    The stats rows are locked first, so submissions committing meanwhile are
+    either in the recount or applied on top of it, never both.
+    """
+    questions = {q.id: q for q in quiz.questions.prefetch_related("choices")}
+    choice_ids = [c.id for q in questions.values() for c in q.choices.all()]
+
+    with transaction.atomic():
+        _ensure_item_stats(questions, choice_ids)
+        list(QuizQuestionStats.objects.select_for_update().filter(question_id__in=questions))
+        list(QuizChoiceStats.objects.select_for_update().filter(choice_id__in=choice_ids))
+
+        # Questions carry no creation time, so attempts is the quiz's submission
+        # count (it overstates attempts for questions added after launch)
+        attempts = QuizSubmission.objects.filter(quiz=quiz).count()
+        answered = dict(
+            QuizAnswer.objects.filter(question_id__in=questions)
+            .values("question_id").annotate(n=Count("id")).values_list("question_id", "n")
+        )
+        selected = dict(
+            QuizAnswer.objects.filter(selected_choice_id__in=choice_ids)
+            .values("selected_choice_id").annotate(n=Count("id")).values_list("selected_choice_id", "n")
+        )
+
+        QuizQuestionStats.objects.bulk_update(
+            [QuizQuestionStats(question_id=q, attempts=attempts, answered=answered.get(q, 0)) for q in questions],
+            ["attempts", "answered"],
+        )
+        QuizChoiceStats.objects.bulk_update(
+            [QuizChoiceStats(choice_id=c, selected=selected.get(c, 0)) for c in choice_ids],
+            ["selected"],
+        )
+
+
+def quiz_item_analysis(quiz) -> dict:
+    """
+    Per-question difficulty and per-choice distribution, O(questions) rows.
+    "correct" follows the current answer key, so fixing a wrong key fixes
+    the history too.
+    """
+    quiz = (
+        CourseQuiz.objects
+        .prefetch_related("questions__stats", "questions__choices__stats")
+        .get(pk=quiz.pk)
+    )
+
+    questions = []
+    for q in quiz.questions.all():
+        stats = getattr(q, "stats", None)
+        attempts = stats.attempts if stats else 0
+        answered = stats.answered if stats else 0
+
+        choices = []
+        correct = 0
+        for c in q.choices.all():
+            n = c.stats.selected if hasattr(c, "stats") else 0
+            if c.is_correct:
+                correct += n
+            choices.append({
+                "choice_id": c.id,
+                "text": c.text,
+                "is_correct": c.is_correct,
+                "selected": n,
+                "share": _rate(n, answered),
+            })
+
+        questions.append({
+            "question_id": q.id,
+            "order": q.order,
+            "prompt": q.prompt,
+            "attempts": attempts,
+            "answered": answered,
+            "correct": correct,
+            # classical item difficulty: share of attempts answered correctly
+            "difficulty": _rate(correct, attempts),
+            "choices": choices,
+        })
+
+    return {"quiz_id": quiz.id, "questions": questions}
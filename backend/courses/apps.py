@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+
+    def ready(self):
+        from django.core import checks
+
+        from .checks import TAG, check_playback_signing_keys
+
+        # ✅ a deploy without playback keys fails its checks, not every stream request
+        checks.register(check_playback_signing_keys, TAG)
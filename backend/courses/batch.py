@@ -0,0 +1,364 @@
+# courses/batch.py
+"""
+Batched creator edits: an ordered list of operations on one course, applied
+atomically (POST /api/creator/courses/<id>/batch/). The view authorizes once
+and returns one final snapshot instead of one round-trip per edit.
+
+    {"operations": [
+        {"op": "section.create", "ref": "s1", "title": "Intro"},
+        {"op": "video.create", "section": "$s1", "video_title": "Welcome", "embed_url": "..."},
+        {"op": "sections.reorder", "ids": [12, "$s1"]},
+        {"op": "question.create", "ref": "q1", "prompt": "..."},
+        {"op": "choice.create", "question": "$q1", "text": "Yes", "is_correct": true},
+        ...
+    ]}
+
+Ops are listed in OPERATIONS. Objects created earlier in the batch are referenced as
+"$<ref>". Section / video update and delete ops accept an optional "version"
+(as in If-Match) and fail on a stale one; quiz, question and choice ops accept
+the quiz's version, like the single-item quiz endpoints. Any failing op rolls
+back the whole batch.
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F, Max
+
+from .concurrency import allocate_order, conditional_update
+from .models import Course, CourseQuiz, CourseSection, CourseVideo, QuizChoice, QuizQuestion
+from .storage_cleanup import enqueue_storage_cleanup
+from .serializers import CreatorVideoUpdateSerializer
+
+OPERATIONS = (
+    "section.create", "section.update", "section.delete", "sections.reorder",
+    "video.create", "video.update", "video.delete", "videos.reorder",
+    "quiz.update",
+    "question.create", "question.update", "question.delete",
+    "choice.create", "choice.update", "choice.delete",
+)
+MAX_OPERATIONS = 500
+MAX_CHOICES_PER_QUESTION = 4
+VIDEO_FIELDS = ["content_type", "video_title", "embed_url", "guide_title", "guide_url"]
+
+
+class BatchError(ValueError):
+    def __init__(self, detail, index=None):
+        super().__init__(detail)
+        self.detail = detail
+        self.index = index
+
+
+def reorder(qs, ids) -> None:
+    """
+    Set order = 1..n for ids (exactly the rows of qs). Rows are first moved
+    past the current maximum so no intermediate state breaks the unique
+    (parent, order) constraint, e.g. when swapping two items.
+    """
+    rows = {obj.id: obj for obj in qs}
+    if len(ids) != len(set(ids)) or set(ids) != set(rows):
+        raise BatchError("ids must list every item exactly once")
+
+    offset = (qs.aggregate(m=Max("order")).get("m") or 0) + 1
+    qs.update(order=F("order") + offset)
+    for idx, pk in enumerate(ids, start=1):
+        rows[pk].order = idx
+    qs.model.objects.bulk_update(list(rows.values()), ["order"])
+
+
+class CourseBatch:
+    def __init__(self, course):
+        self.course = course
+        self.refs = {}
+        self._quiz = None
+        self.quiz_changed = False
+        self.quiz_claimed = None  # quiz version the batch edited against, once claimed
+
+    # -----------------------------
+    # helpers
+    # -----------------------------
+
+    def _id(self, value, what):
+        if isinstance(value, str) and value.startswith("$"):
+            if value[1:] not in self.refs:
+                raise BatchError(f"unknown ref {value}")
+            return self.refs[value[1:]]
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise BatchError(f"{what} must be an id or a $ref")
+
+    def _get(self, qs, value, what):
+        obj = qs.filter(id=self._id(value, what)).first()
+        if obj is None:
+            raise BatchError(f"{what} {value} not found in this course")
+        return obj
+
+    def _section(self, value):
+        return self._get(CourseSection.objects.filter(course=self.course), value, "section")
+
+    def _video(self, value):
+        return self._get(CourseVideo.objects.filter(course=self.course), value, "video")
+
+    def _question(self, value):
+        return self._get(QuizQuestion.objects.filter(quiz__course=self.course), value, "question")
+
+    def _choice(self, value):
+        return self._get(QuizChoice.objects.filter(question__quiz__course=self.course), value, "choice")
+
+    def quiz(self, create=False):
+        if self._quiz is None:
+            self._quiz = CourseQuiz.objects.filter(course=self.course).first()
+            if self._quiz is None and create:
+                self._quiz = CourseQuiz.objects.create(course=self.course)
+        return self._quiz
+
+    @staticmethod
+    def _text(op, field, required):
+        value = op.get(field)
+        if value is not None and not isinstance(value, str):
+            raise BatchError(f"{field} must be a string")
+        value = (value or "").strip()
+        if required and not value:
+            raise BatchError(f"{field} is required")
+        return value
+
+    @staticmethod
+    def _flag(op, field, default=False):
+        value = op.get(field, default)
+        if not isinstance(value, bool):
+            raise BatchError(f"{field} must be true or false")
+        return value
+
+    def _ids(self, op, what):
+        ids = op.get("ids")
+        if not isinstance(ids, list):
+            raise BatchError("ids must be a list")
+        return [self._id(v, what) for v in ids]
+
+    def _remember(self, op, obj):
+        ref = op.get("ref")
+        if ref:
+            self.refs[str(ref)] = obj.id
+        return {"id": obj.id}
+
+    @staticmethod
+    def _save_video(video):
+        try:
+            video.save()  # CourseVideo.save runs full_clean
+        except ValidationError as e:
+            raise BatchError(e.message_dict if hasattr(e, "error_dict") else e.messages)
+
+    @staticmethod
+    def _expected(op):
+        if op.get("version") in (None, ""):
+            return None
+        try:
+            return int(op["version"])
+        except (TypeError, ValueError):
+            raise BatchError("version must be an integer")
+
+    def _update(self, model, obj, op, **fields):
+        if conditional_update(model, obj.id, self._expected(op), **fields) is None:
+            raise BatchError(f"{model._meta.model_name} {obj.id} was changed by someone else (stale version)")
+
+    def _claim_quiz(self, op, quiz):
+        """
+        With a "version", step the quiz version if it still matches (once per
+        batch; later ops must carry the same version), like _claim_quiz_version
+        in the views. The row stays locked until the batch commits.
+        """
+        expected = self._expected(op)
+        if expected is None:
+            return
+        if self.quiz_claimed is None:
+            if quiz is None or conditional_update(CourseQuiz, quiz.id, expected) is None:
+                raise BatchError("quiz was changed by someone else (stale version)")
+            self.quiz_claimed = expected
+        elif expected != self.quiz_claimed:
+            raise BatchError("quiz was changed by someone else (stale version)")
+
+    def _delete(self, model, obj, op):
+        expected = self._expected(op)
+        if expected is not None and not list(
+            model.objects.select_for_update().filter(pk=obj.pk, version=expected).values_list("pk", flat=True)
+        ):
+            raise BatchError(f"{model._meta.model_name} {obj.id} was changed by someone else (stale version)")
+        # apply() holds the transaction: the cleanup rows commit with the delete
+        enqueue_storage_cleanup(obj)
+        obj.delete()
+
+    # -----------------------------
+    # operations
+    # -----------------------------
+
+    def section_create(self, op):
+        title = self._text(op, "title", True)
+        order = allocate_order(
+            Course, self.course.id, "next_section_order", CourseSection.objects.filter(course=self.course),
+        )
+        section = CourseSection.objects.create(course=self.course, title=title, order=order)
+        return self._remember(op, section)
+
+    def section_update(self, op):
+        section = self._section(op.get("id"))
+        fields = {"title": self._text(op, "title", True)} if "title" in op else {}
+        self._update(CourseSection, section, op, **fields)
+        return {"id": section.id}
+
+    def section_delete(self, op):
+        self._delete(CourseSection, self._section(op.get("id")), op)
+        return {"id": op.get("id")}
+
+    def sections_reorder(self, op):
+        ids = self._ids(op, "section")
+        reorder(CourseSection.objects.filter(course=self.course), ids)
+        return {}
+
+    def video_create(self, op):
+        section = self._section(op.get("section"))
+        ser = CreatorVideoUpdateSerializer(data=op)
+        if not ser.is_valid():
+            raise BatchError(ser.errors)
+
+        video = CourseVideo(
+            course=self.course,
+            section=section,
+            order=allocate_order(
+                CourseSection, section.id, "next_video_order", CourseVideo.objects.filter(section=section),
+            ),
+            content_type=ser.validated_data.get("content_type", "video"),
+            video_title=ser.validated_data.get("video_title", ""),
+            embed_url=ser.validated_data.get("embed_url", "") or "",
+            guide_title=ser.validated_data.get("guide_title", "Open resource") or "Open resource",
+            guide_url=ser.validated_data.get("guide_url", "") or "",
+        )
+        self._save_video(video)
+        return self._remember(op, video)
+
+    def video_update(self, op):
+        video = self._video(op.get("id"))
+        ser = CreatorVideoUpdateSerializer(video, data=op, partial=True)
+        if not ser.is_valid():
+            raise BatchError(ser.errors)
+        fields = {f: ser.validated_data[f] for f in VIDEO_FIELDS if f in ser.validated_data}
+        for field, value in fields.items():
+            setattr(video, field, value)
+        try:
+            video.full_clean()
+        except ValidationError as e:
+            raise BatchError(e.message_dict if hasattr(e, "error_dict") else e.messages)
+        self._update(CourseVideo, video, op, **fields)
+        return {"id": video.id}
+
+    def video_delete(self, op):
+        self._delete(CourseVideo, self._video(op.get("id")), op)
+        return {"id": op.get("id")}
+
+    def videos_reorder(self, op):
+        section = self._section(op.get("section"))
+        ids = self._ids(op, "video")
+        reorder(CourseVideo.objects.filter(section=section), ids)
+        return {}
+
+    def quiz_update(self, op):
+        quiz = self.quiz(create=True)
+        self._claim_quiz(op, quiz)
+        changed = []
+        title = self._text(op, "title", False) if "title" in op else ""
+        if title and title != quiz.title:
+            quiz.title = title
+            changed.append("title")
+        if "is_published" in op and self._flag(op, "is_published") != quiz.is_published:
+            quiz.is_published = op["is_published"]
+            changed.append("is_published")
+        if changed:
+            quiz.save(update_fields=changed)
+            self.quiz_changed = True
+        return {"id": quiz.id}
+
+    def question_create(self, op):
+        quiz = self.quiz(create=True)
+        self._claim_quiz(op, quiz)
+        prompt = self._text(op, "prompt", True)
+        order = allocate_order(CourseQuiz, quiz.id, "next_question_order", QuizQuestion.objects.filter(quiz=quiz))
+        question = QuizQuestion.objects.create(quiz=quiz, prompt=prompt, order=order)
+        self.quiz_changed = True
+        return self._remember(op, question)
+
+    def question_update(self, op):
+        question = self._question(op.get("id"))
+        self._claim_quiz(op, self.quiz())
+        prompt = self._text(op, "prompt", True) if "prompt" in op else question.prompt
+        if prompt != question.prompt:
+            question.prompt = prompt
+            question.save(update_fields=["prompt"])
+            self.quiz_changed = True
+        return {"id": question.id}
+
+    def question_delete(self, op):
+        question = self._question(op.get("id"))
+        self._claim_quiz(op, self.quiz())
+        question.delete()
+        self.quiz_changed = True
+        return {"id": op.get("id")}
+
+    def choice_create(self, op):
+        question = self._question(op.get("question"))
+        self._claim_quiz(op, self.quiz())
+        if QuizChoice.objects.filter(question=question).count() >= MAX_CHOICES_PER_QUESTION:
+            raise BatchError(f"Each question can have a maximum of {MAX_CHOICES_PER_QUESTION} options.")
+        choice = QuizChoice.objects.create(
+            question=question,
+            text=self._text(op, "text", True),
+            is_correct=self._flag(op, "is_correct"),
+        )
+        self.quiz_changed = True
+        return self._remember(op, choice)
+
+    def choice_update(self, op):
+        choice = self._choice(op.get("id"))
+        self._claim_quiz(op, self.quiz())
+        changed = []
+        text = self._text(op, "text", True) if "text" in op else choice.text
+        if text != choice.text:
+            choice.text = text
+            changed.append("text")
+        if "is_correct" in op and self._flag(op, "is_correct") != choice.is_correct:
+            choice.is_correct = op["is_correct"]
+            changed.append("is_correct")
+        if changed:
+            choice.save(update_fields=changed)
+            self.quiz_changed = True
+        return {"id": choice.id}
+
+    def choice_delete(self, op):
+        choice = self._choice(op.get("id"))
+        self._claim_quiz(op, self.quiz())
+        choice.delete()
+        self.quiz_changed = True
+        return {"id": op.get("id")}
+
+    # -----------------------------
+
+    def apply(self, operations) -> list:
+        if not isinstance(operations, list) or not operations:
+            raise BatchError("operations must be a non-empty list")
+        if len(operations) > MAX_OPERATIONS:
+            raise BatchError(f"At most {MAX_OPERATIONS} operations per batch")
+
+        results = []
+        with transaction.atomic():
+            for index, op in enumerate(operations):
+                name = op.get("op") if isinstance(op, dict) else None
+                if name not in OPERATIONS:
+                    raise BatchError(f"unknown op {name!r}", index)
+                try:
+                    results.append({"op": name, **getattr(self, name.replace(".", "_"))(op)})
+                except BatchError as e:
+                    e.index = index
+                    raise
+
+            # one version step per batch that changed quiz rows, however many it holds
+            # (already taken if a versioned op claimed it)
+            if self.quiz_changed and self.quiz_claimed is None and self.quiz() is not None:
+                self.quiz().bump_version()
+        return results
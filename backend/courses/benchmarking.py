@@ -0,0 +1,128 @@
+# courses/benchmarking.py
+"""
+Shared helpers for the query-budget tests and the bench_db / loadtest commands:
+a throwaway database, a production-sized catalogue seed and latency stats.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.test.utils import setup_databases, teardown_databases
+
+from .models import (
+    Course, CourseSection, CourseVideo, CourseProgress, CourseVideoOpened,
+    CourseQuiz, QuizQuestion, QuizChoice,
+)
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Create a test database for the configured profile, yield, then drop it.
+    The real database is never touched.
+    """
+    db = connections["default"]
+
+    tmp_path = None
+    if db.vendor == "sqlite":
+        # The default sqlite test DB is in-memory; use a real file so WAL and
+        # file locking behave like the dev server does.
+        fd, tmp_path = tempfile.mkstemp(prefix="lms_bench_", suffix=".sqlite3")
+        os.close(fd)
+        db.settings_dict.setdefault("TEST", {})["NAME"] = tmp_path
+
+    old_config = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+    try:
+        yield db.vendor
+    finally:
+        connection.close()
+        teardown_databases(old_config, verbosity=0)
+        if tmp_path:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(tmp_path + suffix)
+                except OSError:
+                    pass
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def seed_catalog(*, courses=200, sections_per_course=2, videos_per_section=5, learners=100, questions=10,
+                 hot_courses=20):
+    """
+    Bulk-seeds a catalogue roughly the size of production:
+    hundreds of courses, thousands of videos and tens of thousands of opens.
+
+    Every learner has progress on, and has opened every video of, the first
+    `hot_courses` courses; those courses also get a quiz.
+    """
+    User = get_user_model()
+
+    learner_objs = User.objects.bulk_create([
+        User(email=f"learner{i}@example.com", username=f"learner{i}", role="office")
+        for i in range(learners)
+    ])
+
+    course_objs = Course.objects.bulk_create([
+        Course(
+            title=f"Course {i} {'safety' if i % 7 == 0 else 'essentials'}",
+            description=f"Description for course {i}",
+            track="field" if i % 2 else "office",
+            category="field" if i % 2 else "office",
+            subcategory="essentials",
+        )
+        for i in range(courses)
+    ])
+
+    section_objs = CourseSection.objects.bulk_create([
+        CourseSection(course=c, title=f"Section {s + 1}", order=s + 1)
+        for c in course_objs
+        for s in range(sections_per_course)
+    ])
+
+    video_objs = CourseVideo.objects.bulk_create([
+        CourseVideo(
+            course=s.course, section=s, order=v + 1, content_type="video",
+            video_title=f"Video {s.order}.{v + 1}",
+            sp_drive_id="drive-1", sp_item_id=f"item-{s.id}-{v}",
+        )
+        for s in section_objs
+        for v in range(videos_per_section)
+    ])
+
+    hot = course_objs[:hot_courses]
+    hot_ids = {c.id for c in hot}
+    hot_videos = [v for v in video_objs if v.course_id in hot_ids]
+    CourseVideoOpened.objects.bulk_create([
+        CourseVideoOpened(user=u, course_id=v.course_id, video=v)
+        for u in learner_objs
+        for v in hot_videos
+    ], batch_size=2000)
+
+    CourseProgress.objects.bulk_create([
+        CourseProgress(user=u, course=c, last_video_index=0)
+        for u in learner_objs
+        for c in hot
+    ], batch_size=2000)
+
+    quiz_objs = CourseQuiz.objects.bulk_create([CourseQuiz(course=c) for c in hot])
+    question_objs = QuizQuestion.objects.bulk_create([
+        QuizQuestion(quiz=q, prompt=f"Question {n + 1}", order=n + 1)
+        for q in quiz_objs
+        for n in range(questions)
+    ])
+    QuizChoice.objects.bulk_create([
+        QuizChoice(question=q, text=f"Choice {k + 1}", is_correct=(k == 0))
+        for q in question_objs
+        for k in range(4)
+    ])
+
+    return {"learners": learner_objs, "courses": course_objs}
@@ -0,0 +1,23 @@
+# courses/checks.py
+"""
+Configuration checks (`manage.py check`, runserver, migrate). Tagged "lms"
+so config.startup can run them when a WSGI/ASGI worker boots.
+"""
+from django.core.checks import Error
+from django.core.exceptions import ImproperlyConfigured
+
+TAG = "lms"
+
+
+def check_playback_signing_keys(app_configs=None, **kwargs):
+    from .playback import signing_keys
+
+    try:
+        signing_keys()
+    except ImproperlyConfigured as e:
+        return [Error(
+            str(e),
+            hint='Set VIDEO_STREAM_SIGNING_KEYS, e.g. "k1:<random secret>"; every video stream needs it.',
+            id="courses.E001",
+        )]
+    return []
@@ -0,0 +1,81 @@
+# courses/concurrency.py
+"""
+Optimistic concurrency for creator edits.
+
+Editable rows carry a `version` column. Clients send the version they last
+saw (If-Match: "<version>" or a "version" field in the body); the write is a
+single conditional UPDATE ... WHERE version = <expected>, so a stale edit
+touches no row and the view answers 412 with the current version. No row
+locks are held while a trainer edits.
+
+Child order numbers come from a counter on the parent row (e.g.
+Course.next_section_order), bumped with one UPDATE, so concurrent creates
+always get distinct orders instead of racing on Max("order") + 1.
+"""
+from django.db import transaction
+from rest_framework.exceptions import ParseError
+from django.db.models import F, IntegerField, Max, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def expected_version(request):
+    """
+    Version the client edited against: If-Match header first, then body
+    "version". None if neither was sent (unconditional edit); a value that
+    is not an integer is a 400, never a silent unconditional write.
+    """
+    raw = request.headers.get("If-Match", "")
+    raw = raw.strip()
+    if raw.startswith("W/"):
+        raw = raw[2:]
+    raw = raw.strip('"')
+    if not raw or raw == "*":
+        raw = request.data.get("version") if hasattr(request.data, "get") else None
+    if raw in (None, ""):
+        return None
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        raise ParseError("If-Match / version must be an integer version")
+
+
+def conditional_update(model, pk, expected=None, **fields):
+    """
+    UPDATE fields (and version + 1) if the row's version still equals
+    `expected` (any version when None). Returns the new version, or None if
+    the row changed or vanished in the meantime.
+    """
+    qs = model.objects.filter(pk=pk)
+    if expected is not None:
+        if not qs.filter(version=expected).update(version=F("version") + 1, **fields):
+            return None
+        return expected + 1
+
+    # unconditional: read back inside the UPDATE's transaction, while its row
+    # lock keeps other writers from stepping the version in between
+    with transaction.atomic(savepoint=False):
+        if not qs.update(version=F("version") + 1, **fields):
+            return None
+        return qs.values_list("version", flat=True).get()
+
+
+def allocate_order(parent_model, parent_pk, counter_field, children) -> int:
+    """
+    Reserve the next order number among `children` (a queryset of the
+    parent's existing rows). The counter never falls behind rows created
+    without it (bulk imports, packages), since it starts past their max.
+    """
+    highest = Subquery(
+        children.order_by()
+        .annotate(_k=Value(1))
+        .values("_k")
+        .annotate(m=Max("order"))
+        .values("m"),
+        output_field=IntegerField(),
+    )
+    with transaction.atomic():
+        parent_model.objects.filter(pk=parent_pk).update(
+            **{counter_field: Greatest(F(counter_field), Coalesce(highest, 0) + 1) + 1}
+        )
+        counter = parent_model.objects.filter(pk=parent_pk).values_list(counter_field, flat=True).get()
+    return counter - 1
@@ -0,0 +1,268 @@
+# courses/exports.py
+"""
+Streaming exports of learner data for audits (progress, opens, quiz
+submissions, quiz answers), joined with user and course.
+
+Rows are read with .values_list().iterator(chunk_size), i.e. a server-side
+cursor on PostgreSQL (unless DB_PGBOUNCER disables them), and written out one
+chunk at a time, so memory stays flat regardless of table size. Used by
+GET /api/creator/exports/<dataset>/ and `manage.py export_learning_data`.
+"""
+import csv
+import io
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.utils import timezone
+
+from .models import CourseProgress, CourseVideoOpened, QuizAnswer, QuizSubmission
+
+CHUNK_SIZE = 2000
+
+# dataset -> (queryset, date field for from/to, [(column, field)])
+DATASETS = {
+    "progress": (
+        lambda: CourseProgress.objects.all(),
+        "last_accessed",
+        [
+            ("progress_id", "id"),
+            ("user_email", "user__email"),
+            ("first_name", "user__first_name"),
+            ("last_name", "user__last_name"),
+            ("course_id", "course_id"),
+            ("course_title", "course__title"),
+            ("last_accessed", "last_accessed"),
+            ("attempted_times", "attempted_times"),
+            ("completed_times", "completed_times"),
+            ("is_completed", "is_completed"),
+            ("completed_at", "completed_at"),
+        ],
+    ),
+    "opens": (
+        lambda: CourseVideoOpened.objects.all(),
+        "first_opened_at",
+        [
+            ("open_id", "id"),
+            ("user_email", "user__email"),
+            ("course_id", "course_id"),
+            ("course_title", "course__title"),
+            ("video_id", "video_id"),
+            ("video_title", "video__video_title"),
+            ("first_opened_at", "first_opened_at"),
+            ("last_opened_at", "last_opened_at"),
+        ],
+    ),
+    "submissions": (
+        lambda: QuizSubmission.objects.all(),
+        "submitted_at",
+        [
+            ("submission_id", "id"),
+            ("user_email", "user__email"),
+            ("course_id", "quiz__course_id"),
+            ("course_title", "quiz__course__title"),
+            ("quiz_id", "quiz_id"),
+            ("submitted_at", "submitted_at"),
+            ("score", "score"),
+            ("total", "total"),
+            ("all_correct", "all_correct"),
+        ],
+    ),
+    "answers": (
+        lambda: QuizAnswer.objects.all(),
+        "submission__submitted_at",
+        [
+            ("answer_id", "id"),
+            ("submission_id", "submission_id"),
+            ("user_email", "submission__user__email"),
+            ("course_id", "submission__quiz__course_id"),
+            ("course_title", "submission__quiz__course__title"),
+            ("submitted_at", "submission__submitted_at"),
+            ("question_id", "question_id"),
+            ("question", "question__prompt"),
+            ("choice_id", "selected_choice_id"),
+            ("choice", "selected_choice__text"),
+            ("is_correct", "selected_choice__is_correct"),
+        ],
+    ),
+}
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _day_start(d):
+    return timezone.make_aware(datetime.combine(d, time.min))
+
+
+def export_rows(dataset: str, date_from=None, date_to=None, chunk_size: int = CHUNK_SIZE):
+    """
+    (column names, row iterator) for a dataset. Dates are inclusive local days.
+    """
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown dataset {dataset!r}; choose from {', '.join(DATASETS)}")
+
+    qs_func, date_field, columns = DATASETS[dataset]
+    qs = qs_func()
+    # Range on the raw timestamp (not __date) so the index on it can be used
+    if date_from:
+        qs = qs.filter(**{f"{date_field}__gte": _day_start(date_from)})
+    if date_to:
+        qs = qs.filter(**{f"{date_field}__lt": _day_start(date_to + timedelta(days=1))})
+
+    rows = (
+        qs.order_by("id")
+        .values_list(*[field for _, field in columns])
+        .iterator(chunk_size=chunk_size)
+    )
+    return [name for name, _ in columns], rows
+
+
+def _cell(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return v
+
+
+def iter_csv(columns, rows, chunk_size: int = CHUNK_SIZE):
+    """
+    CSV bytes, one chunk of rows per yielded piece.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+
+    n = 0
+    for row in rows:
+        writer.writerow([_cell(v) for v in row])
+        n += 1
+        if n % chunk_size == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+
+    yield buf.getvalue().encode("utf-8")
+
+
+class _Drain(io.RawIOBase):
+    """
+    Write-only sink for pyarrow; take() hands over what was written since.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def take(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+def _model_field(model, path: str):
+    """
+    The model field a values_list() path ("user__email", "course_id") ends
+    at; foreign keys resolve to the field they point to.
+    """
+    *joins, last = path.split("__")
+    for name in joins:
+        model = model._meta.get_field(name).related_model
+    field = model._meta.get_field(last)
+    while field.is_relation:
+        field = field.target_field
+    return field
+
+
+def _arrow_type(field):
+    import pyarrow as pa
+
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.AutoField, models.BigAutoField, models.IntegerField)):
+        return pa.int64()  # covers Positive* / Big* / Small* integer fields
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    return pa.string()
+
+
+def parquet_schema(dataset: str):
+    """
+    Arrow schema for a dataset, from its model fields, so a column that is
+    empty in the first chunk still gets its real type.
+    """
+    import pyarrow as pa
+
+    qs_func, _, columns = DATASETS[dataset]
+    model = qs_func().model
+    return pa.schema([(name, _arrow_type(_model_field(model, path))) for name, path in columns])
+
+
+def iter_parquet(columns, rows, schema, chunk_size: int = CHUNK_SIZE):
+    """
+    Parquet bytes, one row group per chunk. Needs pyarrow (optional dependency).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, schema)
+
+    def flush(chunk):
+        writer.write_table(pa.Table.from_pylist([dict(zip(columns, r)) for r in chunk], schema=schema))
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+            yield sink.take()
+
+    if chunk:
+        flush(chunk)
+    writer.close()
+    yield sink.take()
+
+
+def export_stream(dataset: str, fmt: str = "csv", date_from=None, date_to=None, chunk_size: int = CHUNK_SIZE):
+    """
+    Byte-chunk generator for the dataset in fmt ("csv" / "parquet").
+    Validation errors (ExportError) are raised before the first chunk.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format {fmt!r}; choose from {', '.join(FORMATS)}")
+    if fmt == "parquet" and not parquet_available():
+        raise ExportError("Parquet export needs pyarrow installed; use format=csv")
+
+    columns, rows = export_rows(dataset, date_from, date_to, chunk_size)
+    if fmt == "parquet":
+        return iter_parquet(columns, rows, parquet_schema(dataset), chunk_size)
+    return iter_csv(columns, rows, chunk_size)
@@ -0,0 +1,312 @@
+# courses/imports.py
+"""
+Bulk loads of learner history (e.g. from a legacy LMS) into CourseProgress,
+CourseVideoOpened and QuizSubmission. Used by `manage.py import_learning_data`.
+
+Input rows are dicts (CSV columns; the same names courses.exports writes).
+Users are resolved by user_oid / user_email through one lookup map, course
+and video ids against maps loaded once, and each batch is written with
+bulk_create(update_conflicts=True) in its own transaction, so re-running an
+import updates rows instead of duplicating them. Progress is merged with
+what learners did since (never un-completes a course or lowers a counter).
+"""
+import time
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Course, CourseProgress, CourseQuiz, CourseVideo, CourseVideoOpened, QuizSubmission
+
+BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 20
+
+
+class RowError(ValueError):
+    pass
+
+
+def _dt(raw, *, required=False):
+    raw = (raw or "").strip()
+    if not raw:
+        if required:
+            raise RowError("missing timestamp")
+        return None
+    try:
+        value = parse_datetime(raw)
+        if value is None:
+            d = parse_date(raw)
+            value = datetime(d.year, d.month, d.day) if d else None
+    except ValueError:
+        value = None
+    if value is None:
+        raise RowError(f"invalid timestamp {raw!r}")
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def _int(raw, default=0):
+    raw = (raw or "").strip()
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise RowError(f"invalid number {raw!r}")
+
+
+def _bool(raw, default=False):
+    raw = (raw or "").strip().lower()
+    if not raw:
+        return default
+    return raw in ("1", "true", "t", "yes", "y")
+
+
+class _Context:
+    """
+    Everything rows are resolved against, loaded once per import.
+    """
+
+    def __init__(self):
+        self.users = {}
+        for pk, email, email_display, oid in (
+            get_user_model().objects.values_list("pk", "email", "email_display", "azure_oid").iterator()
+        ):
+            for key in (email, email_display):
+                if key:
+                    self.users[key.strip().lower()] = pk
+            if oid:
+                self.users[oid] = pk
+
+        self.courses = set(Course.objects.values_list("id", flat=True))
+        self.video_course = dict(CourseVideo.objects.values_list("id", "course_id"))
+        self.course_quiz = dict(CourseQuiz.objects.values_list("course_id", "id"))
+
+    def user_id(self, row):
+        oid = (row.get("user_oid") or "").strip()
+        if oid and oid in self.users:
+            return self.users[oid]
+        email = (row.get("user_email") or "").strip().lower()
+        if email and email in self.users:
+            return self.users[email]
+        raise RowError(f"unknown user {oid or email or '(blank)'}")
+
+    def course_id(self, row):
+        course_id = _int(row.get("course_id"), None)
+        if course_id not in self.courses:
+            raise RowError(f"unknown course {row.get('course_id')!r}")
+        return course_id
+
+
+# -----------------------------
+# Datasets: build(row, ctx) -> instance, write(instances) -> rows written
+# -----------------------------
+
+def _build_progress(row, ctx):
+    completed_at = _dt(row.get("completed_at"))
+    is_completed = _bool(row.get("is_completed"), default=completed_at is not None)
+    completed_times = _int(row.get("completed_times"), 1 if is_completed else 0)
+    return CourseProgress(
+        user_id=ctx.user_id(row),
+        course_id=ctx.course_id(row),
+        last_video_index=0,
+        is_completed=is_completed,
+        completed_at=completed_at,
+        completed_times=completed_times,
+        attempted_times=_int(row.get("attempted_times"), completed_times),
+    )
+
+
+PROGRESS_FIELDS = ["is_completed", "completed_at", "completed_times", "attempted_times"]
+
+
+def _merge_progress(into, other) -> None:
+    """
+    Fold `other` into `into`: completed stays completed, counters take the
+    larger value, completed_at the earliest known.
+    """
+    into.is_completed = into.is_completed or other.is_completed
+    into.completed_times = max(into.completed_times, other.completed_times)
+    into.attempted_times = max(into.attempted_times, other.attempted_times)
+    known = [d for d in (into.completed_at, other.completed_at) if d is not None]
+    into.completed_at = min(known) if known else None
+
+
+def _write_progress(objs):
+    # One row per key per statement (PostgreSQL rejects touching a row twice)
+    merged = {}
+    for o in objs:
+        key = (o.user_id, o.course_id)
+        if key in merged:
+            _merge_progress(merged[key], o)
+        else:
+            merged[key] = o
+
+    existing = {
+        (p.user_id, p.course_id): p
+        for p in CourseProgress.objects.select_for_update()
+        .filter(user_id__in={u for u, _ in merged}, course_id__in={c for _, c in merged})
+        .only("pk", "user_id", "course_id", *PROGRESS_FIELDS)
+        if (p.user_id, p.course_id) in merged
+    }
+    for key, row in existing.items():
+        _merge_progress(row, merged[key])
+    CourseProgress.objects.bulk_update(list(existing.values()), PROGRESS_FIELDS)
+
+    # new keys; a row a learner created since the lookup gets the legacy values
+    CourseProgress.objects.bulk_create(
+        [o for key, o in merged.items() if key not in existing],
+        update_conflicts=True,
+        unique_fields=["user", "course"],
+        update_fields=PROGRESS_FIELDS,
+    )
+    return len(merged)
+
+
+def _build_open(row, ctx):
+    video_id = _int(row.get("video_id"), None)
+    if video_id not in ctx.video_course:
+        raise RowError(f"unknown video {row.get('video_id')!r}")
+    course_id = ctx.video_course[video_id]
+    if (row.get("course_id") or "").strip() and _int(row.get("course_id")) != course_id:
+        raise RowError(f"video {video_id} is not in course {row.get('course_id')}")
+
+    first = _dt(row.get("first_opened_at") or row.get("opened_at"))
+    obj = CourseVideoOpened(user_id=ctx.user_id(row), course_id=course_id, video_id=video_id)
+    obj.first_opened_at = first
+    obj.last_opened_at = _dt(row.get("last_opened_at")) or first
+    return obj
+
+
+def _write_opens(objs):
+    merged = {}
+    for o in objs:
+        key = (o.user_id, o.video_id)
+        if key in merged and o.first_opened_at and merged[key].first_opened_at:
+            prev = merged[key]
+            o.first_opened_at = min(o.first_opened_at, prev.first_opened_at)
+            o.last_opened_at = max(o.last_opened_at, prev.last_opened_at)
+        merged[key] = o
+
+    def existing():
+        return {
+            (u, v): (pk, first, last)
+            for pk, u, v, first, last in CourseVideoOpened.objects
+            .filter(user_id__in={u for u, _ in merged}, video_id__in={v for _, v in merged})
+            .values_list("pk", "user_id", "video_id", "first_opened_at", "last_opened_at")
+            if (u, v) in merged
+        }
+
+    before = existing()
+    # auto_now_add/auto_now overwrite the instances' times with "now" on
+    # insert; keep the legacy ones to put back afterwards
+    legacy = {k: (o.first_opened_at, o.last_opened_at) for k, o in merged.items() if o.first_opened_at}
+    CourseVideoOpened.objects.bulk_create(
+        list(merged.values()), update_conflicts=True, unique_fields=["user", "video"], update_fields=["course"],
+    )
+
+    fixes = []
+    for key, (pk, _, _) in existing().items():
+        if key not in legacy:
+            continue
+        first, last = legacy[key]
+        if key in before:
+            _, old_first, old_last = before[key]
+            first, last = min(first, old_first), max(last, old_last)
+        fixes.append(CourseVideoOpened(pk=pk, first_opened_at=first, last_opened_at=last))
+    CourseVideoOpened.objects.bulk_update(fixes, ["first_opened_at", "last_opened_at"])
+    return len(merged)
+
+
+def _build_submission(row, ctx):
+    user_id = ctx.user_id(row)
+    course_id = ctx.course_id(row)
+    if course_id not in ctx.course_quiz:
+        raise RowError(f"course {course_id} has no quiz")
+    quiz_id = ctx.course_quiz[course_id]
+
+    submitted_at = _dt(row.get("submitted_at"), required=True)
+    score, total = _int(row.get("score")), _int(row.get("total"))
+    obj = QuizSubmission(
+        user_id=user_id,
+        quiz_id=quiz_id,
+        score=score,
+        total=total,
+        all_correct=_bool(row.get("all_correct"), default=total > 0 and score == total),
+        import_ref=(row.get("ref") or "").strip() or f"import:{user_id}:{quiz_id}:{submitted_at.isoformat()}",
+    )
+    obj.submitted_at = submitted_at
+    return obj
+
+
+def _write_submissions(objs):
+    by_ref = {o.import_ref: o for o in objs}
+    # auto_now_add overwrites submitted_at on insert; put the legacy times back after
+    submitted = {ref: o.submitted_at for ref, o in by_ref.items()}
+    QuizSubmission.objects.bulk_create(
+        list(by_ref.values()),
+        update_conflicts=True,
+        unique_fields=["import_ref"],
+        update_fields=["user", "quiz", "score", "total", "all_correct"],
+    )
+    QuizSubmission.objects.bulk_update(
+        [
+            QuizSubmission(pk=pk, submitted_at=submitted[ref])
+            for pk, ref in QuizSubmission.objects.filter(import_ref__in=by_ref).values_list("pk", "import_ref")
+        ],
+        ["submitted_at"],
+    )
+    return len(by_ref)
+
+
+DATASETS = {
+    "progress": (_build_progress, _write_progress),
+    "opens": (_build_open, _write_opens),
+    "submissions": (_build_submission, _write_submissions),
+}
+
+
+def import_rows(dataset: str, rows, *, batch_size: int = BATCH_SIZE, dry_run: bool = False, progress=None) -> dict:
+    """
+    Import an iterable of row dicts. Bad rows are skipped and counted; each
+    good batch is committed on its own. progress(stats) is called per batch.
+    "imported" counts rows written: input rows for the same key are merged
+    into one (a dry run, which writes nothing, counts the valid input rows).
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r}; choose from {', '.join(DATASETS)}")
+    build, write = DATASETS[dataset]
+
+    started = time.monotonic()
+    ctx = _Context()
+    stats = {"rows": 0, "imported": 0, "skipped": 0, "errors": [], "seconds": 0.0, "rows_per_second": 0.0}
+
+    def flush(batch):
+        if batch and not dry_run:
+            with transaction.atomic():
+                stats["imported"] += write(batch)
+        elif dry_run:
+            stats["imported"] += len(batch)
+        stats["seconds"] = time.monotonic() - started
+        stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+        if progress:
+            progress(stats)
+
+    batch = []
+    # line 1 is the CSV header
+    for line, row in enumerate(rows, start=2):
+        stats["rows"] += 1
+        try:
+            batch.append(build(row, ctx))
+        except RowError as e:
+            stats["skipped"] += 1
+            if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                stats["errors"].append(f"line {line}: {e}")
+            continue
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+
+    flush(batch)
+    return stats
@@ -0,0 +1,29 @@
+# courses/management/commands/backfill_quiz_item_stats.py
+from django.core.management.base import BaseCommand
+
+from courses.analytics import recompute_quiz_item_stats
+from courses.models import CourseQuiz
+
+
+class Command(BaseCommand):
+    """
+    Rebuild per-question / per-choice counters from QuizAnswer. Needed once
+    for submissions made before the counters existed; safe to rerun.
+    """
+
+    help = "Recompute quiz item-analysis counters from stored answers."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quiz", type=int, action="append", default=None,
+                            help="Only this quiz id (repeatable)")
+
+    def handle(self, *args, **opts):
+        qs = CourseQuiz.objects.order_by("id")
+        if opts["quiz"]:
+            qs = qs.filter(id__in=opts["quiz"])
+
+        n = 0
+        for quiz in qs.iterator():
+            recompute_quiz_item_stats(quiz)
+            n += 1
+        self.stdout.write(f"Recomputed item stats for {n} quizzes.")
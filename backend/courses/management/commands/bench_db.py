@@ -0,0 +1,220 @@
+# courses/management/commands/bench_db.py
+import random
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+
+from courses.benchmarking import percentile, throwaway_database
+from courses.models import (
+    Course, CourseSection, CourseVideo, CourseProgress, CourseVideoOpened,
+    CourseQuiz, QuizQuestion, QuizChoice, QuizSubmission, QuizAnswer,
+)
+
+
+class Command(BaseCommand):
+    """
+    Concurrent write benchmark for the configured database profile.
+
+    Runs the same write mix as update_progress / quiz_submit (plus the my_learning
+    read) from several threads against a throwaway test database, so the real
+    database is never touched. Compare profiles by running it twice:
+
+      DB_ENGINE=sqlite   python manage.py bench_db
+      DB_ENGINE=postgres python manage.py bench_db
+    """
+
+    help = "Benchmark concurrent progress/quiz writes against the configured DB profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--seconds", type=float, default=10.0)
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--courses", type=int, default=20)
+        parser.add_argument("--videos-per-course", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **opts):
+        with throwaway_database() as vendor:
+            fixtures = self._seed(opts)
+            results = self._run(fixtures, opts)
+
+        self._report(vendor, opts, results)
+
+    # -----------------------------
+    # Fixtures
+    # -----------------------------
+    def _seed(self, opts):
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(email=f"bench{i}@example.com", username=f"bench{i}", role="office")
+            for i in range(opts["users"])
+        ])
+
+        courses = Course.objects.bulk_create([
+            Course(title=f"Bench course {i}", track="office", category="office", subcategory="essentials")
+            for i in range(opts["courses"])
+        ])
+        sections = CourseSection.objects.bulk_create([
+            CourseSection(course=c, title="Section 1", order=1) for c in courses
+        ])
+        CourseVideo.objects.bulk_create([
+            CourseVideo(
+                course=s.course, section=s, order=j + 1, content_type="video",
+                video_title=f"Video {j + 1}", sp_drive_id="drive", sp_item_id=f"item-{s.id}-{j}",
+            )
+            for s in sections
+            for j in range(opts["videos_per_course"])
+        ])
+
+        quizzes = CourseQuiz.objects.bulk_create([CourseQuiz(course=c) for c in courses])
+        questions = QuizQuestion.objects.bulk_create([
+            QuizQuestion(quiz=q, prompt=f"Question {k + 1}", order=k + 1)
+            for q in quizzes
+            for k in range(5)
+        ])
+        QuizChoice.objects.bulk_create([
+            QuizChoice(question=q, text=f"Choice {n}", is_correct=(n == 0))
+            for q in questions
+            for n in range(4)
+        ])
+
+        videos_by_course = {}
+        for v in CourseVideo.objects.values("id", "course_id"):
+            videos_by_course.setdefault(v["course_id"], []).append(v["id"])
+
+        choices_by_quiz = {}
+        for ch in QuizChoice.objects.values("id", "question_id", "question__quiz_id"):
+            choices_by_quiz.setdefault(ch["question__quiz_id"], {}).setdefault(ch["question_id"], []).append(ch["id"])
+
+        return {
+            "user_ids": [u.id for u in User.objects.only("id")],
+            "videos_by_course": videos_by_course,
+            "quiz_by_course": {q.course_id: q.id for q in CourseQuiz.objects.all()},
+            "choices_by_quiz": choices_by_quiz,
+        }
+
+    # -----------------------------
+    # Workload (mirrors the view code paths)
+    # -----------------------------
+    def _progress(self, user_id, course_id, video_id):
+        obj, _ = CourseProgress.objects.get_or_create(
+            user_id=user_id,
+            course_id=course_id,
+            defaults={"last_video_id": video_id, "last_video_index": 0},
+        )
+        obj.last_video_id = video_id
+        obj.last_accessed = timezone.now()
+        obj.save(update_fields=["last_video", "last_accessed"])
+        CourseVideoOpened.objects.update_or_create(
+            user_id=user_id,
+            video_id=video_id,
+            defaults={"course_id": course_id},
+        )
+
+    def _quiz(self, user_id, course_id, quiz_id, choices):
+        sub = QuizSubmission.objects.create(user_id=user_id, quiz_id=quiz_id, score=0, total=len(choices))
+        QuizAnswer.objects.bulk_create([
+            QuizAnswer(submission=sub, question_id=qid, selected_choice_id=random.choice(cids))
+            for qid, cids in choices.items()
+        ])
+        prog, _ = CourseProgress.objects.get_or_create(user_id=user_id, course_id=course_id)
+        prog.attempted_times = int(prog.attempted_times or 0) + 1
+        prog.save(update_fields=["attempted_times"])
+
+    def _read(self, user_id):
+        list(
+            CourseProgress.objects
+            .filter(user_id=user_id, course__is_published=True)
+            .select_related("course", "last_video")
+            .order_by("-last_accessed")[:3]
+        )
+
+    def _run(self, fixtures, opts):
+        deadline = time.perf_counter() + float(opts["seconds"])
+        lock = threading.Lock()
+        latencies = {"progress": [], "quiz": [], "read": []}
+        errors = {"locked": 0, "other": 0}
+
+        course_ids = list(fixtures["videos_by_course"].keys())
+
+        def worker(n):
+            rnd = random.Random(opts["seed"] + n)
+            local = {k: [] for k in latencies}
+            local_errors = {"locked": 0, "other": 0}
+            close_old_connections()
+            try:
+                while time.perf_counter() < deadline:
+                    user_id = rnd.choice(fixtures["user_ids"])
+                    course_id = rnd.choice(course_ids)
+                    roll = rnd.random()
+                    if roll < 0.8:
+                        op = "progress"
+                        fn = lambda: self._progress(user_id, course_id, rnd.choice(fixtures["videos_by_course"][course_id]))
+                    elif roll < 0.9:
+                        op = "quiz"
+                        quiz_id = fixtures["quiz_by_course"][course_id]
+                        fn = lambda: self._quiz(user_id, course_id, quiz_id, fixtures["choices_by_quiz"][quiz_id])
+                    else:
+                        op = "read"
+                        fn = lambda: self._read(user_id)
+
+                    t0 = time.perf_counter()
+                    try:
+                        fn()
+                    except OperationalError as e:
+                        if "locked" in str(e).lower():
+                            local_errors["locked"] += 1
+                        else:
+                            local_errors["other"] += 1
+                        continue
+                    except Exception:
+                        local_errors["other"] += 1
+                        continue
+                    local[op].append(time.perf_counter() - t0)
+            finally:
+                connection.close()
+
+            with lock:
+                for k, v in local.items():
+                    latencies[k].extend(v)
+                for k, v in local_errors.items():
+                    errors[k] += v
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(int(opts["threads"]))]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        return {"latencies": latencies, "errors": errors, "elapsed": elapsed}
+
+    # -----------------------------
+    # Report
+    # -----------------------------
+    def _report(self, vendor, opts, results):
+        elapsed = results["elapsed"] or 1.0
+        total_ops = sum(len(v) for v in results["latencies"].values())
+
+        self.stdout.write(
+            f"db={vendor} threads={opts['threads']} seconds={elapsed:.1f} "
+            f"ops={total_ops} ops/s={total_ops / elapsed:.1f} "
+            f"locked_errors={results['errors']['locked']} other_errors={results['errors']['other']}"
+        )
+        for op, values in results["latencies"].items():
+            if not values:
+                self.stdout.write(f"  {op:<8} n=0")
+                continue
+            self.stdout.write(
+                f"  {op:<8} n={len(values):<6} "
+                f"mean={statistics.mean(values) * 1000:.1f}ms "
+                f"p50={percentile(values, 50) * 1000:.1f}ms "
+                f"p95={percentile(values, 95) * 1000:.1f}ms "
+                f"p99={percentile(values, 99) * 1000:.1f}ms"
+            )
@@ -0,0 +1,140 @@
+# courses/management/commands/bench_stream.py
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from courses.streaming import fill_local_copy, item_meta, item_meta_cache, serve_item
+
+ETAG = '"{bench},1"'
+
+
+class _BlobHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.blob like Graph's /content endpoint (single byte ranges).
+    """
+
+    def do_GET(self):
+        blob = self.server.blob
+        start, end = 0, len(blob) - 1
+        status = 200
+        rng = self.headers.get("Range", "")
+        if rng.startswith("bytes="):
+            first, _, last = rng[6:].partition("-")
+            start, end, status = int(first), int(last or end), 206
+        self.send_response(status)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(blob)}")
+        self.end_headers()
+        self.wfile.write(memoryview(blob)[start:end + 1])
+
+    def log_message(self, *args):
+        pass
+
+
+class _LocalUpstream:
+    """
+    The SharePointStorage calls streaming uses, pointed at the local server.
+    """
+
+    def __init__(self, url, size):
+        self.url, self.size = url, size
+
+    def get_item_info(self, drive_id, item_id):
+        return {"size": self.size, "eTag": ETAG, "file": {"mimeType": "video/mp4"}}
+
+    def download_stream(self, drive_id, item_id, range_header=None):
+        headers = {"Range": range_header} if range_header else {}
+        return requests.get(self.url, headers=headers, stream=True, timeout=60)
+
+
+def _legacy(upstream, request):
+    """
+    video_stream before courses.streaming: re-yield iter_content(256KB).
+    """
+    r = upstream.download_stream("d", "i", range_header=request.headers.get("Range"))
+    for chunk in r.iter_content(chunk_size=1024 * 256):
+        if chunk:
+            yield chunk
+
+
+def _consume(response) -> int:
+    total = sum(len(chunk) for chunk in getattr(response, "streaming_content", response))
+    getattr(response, "close", lambda: None)()
+    return total
+
+
+class Command(BaseCommand):
+    """
+    Bytes forwarded per CPU-second by video_stream, before (iter_content
+    re-yield) and after (courses.streaming), against a local HTTP upstream.
+    CPU time is the serving thread's only; the upstream server runs on other
+    threads. The "local" mode serves a local copy (STREAM_CACHE_ROOT); under
+    a server with wsgi.file_wrapper that path is sendfile() and costs less
+    than measured here.
+
+      python manage.py bench_stream --mb 256 --repeat 5
+    """
+
+    help = "Benchmark video_stream forwarding (bytes per CPU-second)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mb", type=int, default=128)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--range", default="", help='Range header to send, e.g. "bytes=0-"')
+
+    def handle(self, *args, **opts):
+        size = opts["mb"] * 1024 * 1024
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _BlobHandler)
+        server.blob = os.urandom(size)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        upstream = _LocalUpstream(f"http://127.0.0.1:{server.server_port}/content", size)
+
+        headers = {"HTTP_RANGE": opts["range"]} if opts["range"] else {}
+        request = RequestFactory().get("/api/videos/1/stream/", **headers)
+
+        try:
+            with tempfile.TemporaryDirectory() as tmp, override_settings(STREAM_CACHE_ROOT=""):
+                item_meta_cache.clear()
+                modes = [
+                    ("legacy", lambda: _legacy(upstream, request)),
+                    ("streaming", lambda: serve_item(request, "d", "i", sp=upstream)),
+                ]
+                results = [self._measure(name, fn, opts["repeat"]) for name, fn in modes]
+
+                with override_settings(STREAM_CACHE_ROOT=tmp):
+                    fill_local_copy("d", "i", item_meta(upstream, "d", "i"), sp=upstream)
+                    results.append(self._measure("local", lambda: serve_item(request, "d", "i", sp=upstream), opts["repeat"]))
+        finally:
+            server.shutdown()
+            item_meta_cache.clear()
+
+        self._report(opts, size, results)
+
+    def _measure(self, name, make_response, repeat):
+        cpu = wall = 0.0
+        total = 0
+        for _ in range(repeat):
+            wall_start, cpu_start = time.perf_counter(), time.thread_time()
+            total += _consume(make_response())
+            cpu += time.thread_time() - cpu_start
+            wall += time.perf_counter() - wall_start
+        return name, total, cpu, wall
+
+    def _report(self, opts, size, results):
+        self.stdout.write(f"object={size // (1024 * 1024)}MB repeat={opts['repeat']} range={opts['range'] or '-'}")
+        baseline = None
+        for name, total, cpu, wall in results:
+            per_cpu = total / max(cpu, 1e-9) / 1024 ** 2
+            baseline = baseline or per_cpu
+            self.stdout.write(
+                f"  {name:<10} MB/cpu-s={per_cpu:9.1f} ({per_cpu / baseline:4.1f}x) "
+                f"MB/s={total / max(wall, 1e-9) / 1024 ** 2:8.1f} cpu={cpu:.2f}s"
+            )
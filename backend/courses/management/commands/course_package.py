@@ -0,0 +1,59 @@
+# courses/management/commands/course_package.py
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Course
+from courses.packages import PackageError, export_package_chunks, import_package
+
+
+class Command(BaseCommand):
+    """
+    Export a course as a package (courses.packages), or import one as a new
+    draft course. Same format as the creator package endpoints.
+    """
+
+    help = "Export a course package, or import one as a new draft course."
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="action", required=True)
+
+        exp = sub.add_parser("export")
+        exp.add_argument("course_id", type=int)
+        exp.add_argument("--output", "-o", default="-", help="File path, or - for stdout")
+
+        imp = sub.add_parser("import")
+        imp.add_argument("path")
+        imp.add_argument("--owner", required=True, help="Email of the user recorded as creator")
+
+    def handle(self, *args, **opts):
+        if opts["action"] == "export":
+            course = Course.objects.filter(id=opts["course_id"]).first()
+            if course is None:
+                raise CommandError(f"Course {opts['course_id']} not found")
+            out = sys.stdout if opts["output"] == "-" else open(opts["output"], "w", encoding="utf-8")
+            try:
+                for chunk in export_package_chunks(course):
+                    out.write(chunk)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            return
+
+        owner = get_user_model().objects.filter(email__iexact=opts["owner"]).first()
+        if owner is None:
+            raise CommandError(f"No user with email {opts['owner']}")
+        try:
+            with open(opts["path"], encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        try:
+            # run by an operator: media of any existing course may be reused
+            course = import_package(manifest, owner, Course.objects.all())
+        except PackageError as e:
+            raise CommandError(json.dumps(e.errors, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Created draft course {course.id}: {course.title}"))
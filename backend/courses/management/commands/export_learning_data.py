@@ -0,0 +1,57 @@
+# courses/management/commands/export_learning_data.py
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from courses.exports import CHUNK_SIZE, DATASETS, FORMATS, ExportError, export_stream
+
+
+class Command(BaseCommand):
+    """
+    Same streaming export as GET /api/creator/exports/<dataset>/, to a file or
+    stdout, for audits too large for the admin.
+    """
+
+    help = "Stream progress / opens / submissions / answers to CSV or Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", dest="fmt", choices=sorted(FORMATS), default="csv")
+        parser.add_argument("--from", dest="date_from", default=None, help="YYYY-MM-DD (inclusive)")
+        parser.add_argument("--to", dest="date_to", default=None, help="YYYY-MM-DD (inclusive)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--output", "-o", default="-", help="File path, or - for stdout")
+
+    def _date(self, raw):
+        if not raw:
+            return None
+        try:
+            d = parse_date(raw)
+        except ValueError:
+            d = None
+        if d is None:
+            raise CommandError(f"Invalid date {raw!r}; use YYYY-MM-DD")
+        return d
+
+    def handle(self, *args, **opts):
+        try:
+            chunks = export_stream(
+                opts["dataset"], opts["fmt"],
+                self._date(opts["date_from"]), self._date(opts["date_to"]),
+                chunk_size=opts["chunk_size"],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        if opts["output"] == "-":
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+            return
+
+        with open(opts["output"], "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        self.stderr.write(f"Wrote {opts['dataset']} to {opts['output']}")
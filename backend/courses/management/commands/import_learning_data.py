@@ -0,0 +1,49 @@
+# courses/management/commands/import_learning_data.py
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.imports import BATCH_SIZE, DATASETS, import_rows
+
+
+class Command(BaseCommand):
+    """
+    Bulk-load legacy progress / opens / quiz submissions from CSV
+    (courses.imports). Safe to re-run: existing rows are updated.
+
+    Columns: user_email or user_oid, plus
+      progress:    course_id, completed_at, [is_completed, completed_times, attempted_times]
+      opens:       video_id, [course_id, first_opened_at, last_opened_at]
+      submissions: course_id, submitted_at, score, total, [all_correct, ref]
+    """
+
+    help = "Bulk import learner progress, opens or quiz submissions from CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("path", help="CSV file with a header row")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Validate and resolve rows only")
+
+    def handle(self, *args, **opts):
+        def report(stats):
+            self.stdout.write(
+                f"{stats['rows']} rows, {stats['imported']} imported, {stats['skipped']} skipped "
+                f"({stats['rows_per_second']:.0f} rows/s)"
+            )
+
+        try:
+            with open(opts["path"], newline="", encoding="utf-8-sig") as f:
+                stats = import_rows(
+                    opts["dataset"], csv.DictReader(f),
+                    batch_size=opts["batch_size"], dry_run=opts["dry_run"], progress=report,
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for err in stats["errors"]:
+            self.stderr.write(err)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done{' (dry run)' if opts['dry_run'] else ''}: {stats['imported']} of {stats['rows']} rows "
+            f"in {stats['seconds']:.1f}s ({stats['rows_per_second']:.0f} rows/s)."
+        ))
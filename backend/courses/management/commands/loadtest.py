@@ -0,0 +1,433 @@
+# courses/management/commands/loadtest.py
+import asyncio
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import ExitStack
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection
+from django.test import AsyncClient, Client, override_settings
+
+from courses.benchmarking import percentile, seed_catalog, throwaway_database
+from courses.models import CourseQuiz, CourseVideo
+from users import graph as graph_client
+from users.authentication import issue_tokens
+from users.fake_graph import FakeGraph
+
+TRAINER_OID = "00000000-0000-0000-0000-00000000a001"
+TRAINERS_GROUP_ID = "00000000-0000-0000-0000-00000000g001"
+
+SEARCH_TERM = "safety"
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+# A scenario is a generator that yields ("sleep", seconds) or
+# (label, method, path, kwargs) and receives the response back, so the same
+# traffic mix can be driven by the sync (threads) and async (asyncio) runners.
+
+def learner_session(rnd, ctx, think):
+    yield ("dashboard:me", "get", "/api/me/", {})
+    yield ("dashboard:navigation", "get", "/api/navigation/", {})
+    yield ("dashboard:courses", "get", "/api/courses/", {})
+    yield ("dashboard:my_learning", "get", "/api/my-learning/", {})
+    yield ("sleep", think * 3)
+
+    # search-as-you-type, then the full search
+    for n in range(1, len(SEARCH_TERM) + 1):
+        yield ("search:suggestions", "get", "/api/search/suggestions/", {"data": {"q": SEARCH_TERM[:n]}})
+        yield ("sleep", think * 0.3)
+    yield ("search:results", "get", "/api/courses/search/", {"data": {"q": SEARCH_TERM}})
+
+    course_id = rnd.choice(ctx["quiz_course_ids"])
+    yield ("course:detail", "get", f"/api/courses/{course_id}/", {})
+    yield ("course:quiz_status", "get", f"/api/courses/{course_id}/quiz/status/", {})
+
+    # progress posts while "watching"
+    for idx, video_id in enumerate(ctx["videos_by_course"][course_id]):
+        yield ("sleep", think * 5)
+        yield (
+            "course:progress", "post", f"/api/courses/{course_id}/progress/",
+            {"data": {"video_id": video_id, "video_index": idx}, "content_type": "application/json"},
+        )
+
+    r = yield ("quiz:get", "get", f"/api/courses/{course_id}/quiz/", {})
+    questions = r.json().get("questions", []) if r.status_code == 200 else []
+    yield ("sleep", think * 10)
+    answers = [
+        {"question_id": q["id"], "choice_id": rnd.choice(q["choices"])["id"]}
+        for q in questions
+        if q.get("choices")
+    ]
+    yield (
+        "quiz:submit", "post", f"/api/courses/{course_id}/quiz/submit/",
+        {"data": {"answers": answers}, "content_type": "application/json"},
+    )
+
+
+def trainer_session(rnd, ctx, think):
+    r = yield (
+        "creator:course_create", "post", "/api/creator/courses/",
+        {
+            "data": {
+                "title": f"Load test course {rnd.randint(0, 10 ** 9)}",
+                "track": "office", "category": "office", "subcategory": "essentials",
+            },
+            "content_type": "application/json",
+        },
+    )
+    if r.status_code != 201:
+        return
+    course_id = r.json()["id"]
+
+    r = yield (
+        "creator:section_create", "post", f"/api/creator/courses/{course_id}/sections/",
+        {"data": {"title": "Section 1"}, "content_type": "application/json"},
+    )
+    if r.status_code != 201:
+        return
+    section_id = r.json()["id"]
+
+    for n in range(2):
+        yield ("sleep", think * 5)
+        upload = SimpleUploadedFile(f"clip-{n}.mp4", ctx["upload_bytes"], content_type="video/mp4")
+        yield (
+            "creator:video_upload", "post", f"/api/creator/sections/{section_id}/videos/upload/",
+            {"data": {"file": upload, "video_title": f"Clip {n}"}},
+        )
+
+    yield ("creator:course_detail", "get", f"/api/creator/courses/{course_id}/", {})
+
+
+# -----------------------------
+# Recording
+# -----------------------------
+
+_SERVER_TIMING_DB = re.compile(r"db;dur=([\d.]+)")
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.busy_errors = 0
+        self.server_errors = 0
+        self.lock_waits = []  # seconds, one per lock sample
+        self.lock_waiters = []  # sessions waiting on a lock, per sample (PostgreSQL)
+
+    def record(self, label, seconds, response):
+        m = _SERVER_TIMING_DB.search(response.headers.get("Server-Timing", "") or "")
+        db_ms = float(m.group(1)) if m else 0.0
+        with self._lock:
+            row = self.samples.setdefault(label, {"lat": [], "db": [], "status": {}})
+            row["lat"].append(seconds)
+            row["db"].append(db_ms)
+            row["status"][response.status_code] = row["status"].get(response.status_code, 0) + 1
+            if response.status_code >= 500:
+                self.server_errors += 1
+
+    def on_exception(self, sender, request=None, **kwargs):
+        # requests that gave up on a lock ("database is locked"), not lock waits
+        exc = sys.exc_info()[1]
+        if isinstance(exc, OperationalError) and "locked" in str(exc).lower():
+            with self._lock:
+                self.busy_errors += 1
+
+
+# -----------------------------
+# Lock waits
+# -----------------------------
+# Sampled from a separate thread/connection while the load runs:
+#   sqlite      time a probe BEGIN IMMEDIATE takes to get the write lock
+#   postgresql  sessions waiting on a lock (pg_stat_activity) and the age of
+#               the oldest such query
+
+_PG_LOCK_WAITS = """
+    SELECT count(*), coalesce(max(extract(epoch FROM clock_timestamp() - query_start)), 0)
+    FROM pg_stat_activity
+    WHERE wait_event_type = 'Lock' AND datname = current_database()
+"""
+
+
+def sample_lock_waits(vendor, recorder, stop, interval):
+    try:
+        while not stop.wait(interval):
+            if vendor == "sqlite":
+                t0 = time.perf_counter()
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("BEGIN IMMEDIATE")
+                        waited = time.perf_counter() - t0
+                        cursor.execute("ROLLBACK")
+                except OperationalError:  # gave up after the busy timeout
+                    waited = time.perf_counter() - t0
+                recorder.lock_waits.append(waited)
+            elif vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(_PG_LOCK_WAITS)
+                    waiters, oldest = cursor.fetchone()
+                recorder.lock_waiters.append(int(waiters))
+                recorder.lock_waits.append(float(oldest))
+            else:
+                return
+    finally:
+        connection.close()
+
+
+# -----------------------------
+# Command
+# -----------------------------
+
+class Command(BaseCommand):
+    """
+    Synthetic learner traffic through the real URLconf (config.urls).
+
+    Each virtual learner loads the dashboard, searches as they type, opens a
+    course, posts progress while "watching", then takes the quiz; trainers
+    create courses and upload videos. Graph/SharePoint are served by the
+    fake tenant (users.fake_graph) and everything runs on a throwaway database.
+    DB lock waits are sampled alongside (sample_lock_waits); db_busy_errors
+    counts requests that failed with "database is locked".
+
+    --graph patch  answers Graph calls in-process (compare DB profiles / --mode)
+    --graph http   serves the fake tenant over local HTTP with optional
+                   --graph-latency-ms / --graph-failure-rate, so outbound
+                   Graph cost shows up in the numbers
+    """
+
+    help = "Load-test the API with a synthetic learner/trainer traffic mix."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--learners", type=int, default=20, help="Concurrent virtual learners")
+        parser.add_argument("--trainers", type=int, default=1, help="Concurrent virtual trainers")
+        parser.add_argument("--seconds", type=float, default=30.0)
+        parser.add_argument("--mode", choices=["sync", "async"], default="sync",
+                            help="sync: WSGI handler, one thread per user; async: ASGI handler on one event loop")
+        parser.add_argument("--think-scale", type=float, default=0.05,
+                            help="Multiplier for think times (1.0 = real time, progress every ~5s)")
+        parser.add_argument("--courses", type=int, default=200)
+        parser.add_argument("--upload-kb", type=int, default=256)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--graph", choices=["patch", "http"], default="patch",
+                            help="How the fake Graph tenant is reached")
+        parser.add_argument("--graph-latency-ms", type=float, default=0.0)
+        parser.add_argument("--graph-failure-rate", type=float, default=0.0)
+        parser.add_argument("--lock-sample-ms", type=float, default=100.0,
+                            help="How often DB lock waits are sampled")
+
+    def handle(self, *args, **opts):
+        with throwaway_database() as vendor:
+            ctx = self._seed(opts)
+            graph = FakeGraph(
+                trainer_oids={TRAINER_OID},
+                latency_ms=opts["graph_latency_ms"],
+                failure_rate=opts["graph_failure_rate"],
+                seed=opts["seed"],
+            )
+            recorder = Recorder()
+            got_request_exception.connect(recorder.on_exception)
+            stop = threading.Event()
+            sampler = threading.Thread(
+                target=sample_lock_waits, args=(vendor, recorder, stop, opts["lock_sample_ms"] / 1000.0),
+            )
+            try:
+                with ExitStack() as stack:
+                    # Server-Timing for every client: the db column is read from it
+                    stack.enter_context(override_settings(
+                        DEBUG=False, LMS_TRAINERS_GROUP_ID=TRAINERS_GROUP_ID, REQUEST_METRICS_SERVER_TIMING=True,
+                    ))
+                    self._connect_graph(stack, graph, opts["graph"])
+                    sampler.start()
+                    started = time.perf_counter()
+                    if opts["mode"] == "async":
+                        asyncio.run(self._run_async(ctx, opts, recorder))
+                    else:
+                        self._run_sync(ctx, opts, recorder)
+                    elapsed = time.perf_counter() - started
+            finally:
+                stop.set()
+                if sampler.is_alive():
+                    sampler.join()
+                got_request_exception.disconnect(recorder.on_exception)
+
+        self._report(vendor, opts, recorder, elapsed, len(graph.calls))
+
+    @staticmethod
+    def _connect_graph(stack, graph, how):
+        if how == "patch":
+            stack.enter_context(graph)
+            return
+
+        server = graph.serve()
+        stack.callback(server.shutdown)
+        base = "http://%s:%s" % server.server_address[:2]
+        stack.enter_context(override_settings(
+            GRAPH_BASE_URL=f"{base}/v1.0",
+            AZURE_LOGIN_BASE_URL=base,
+            AZURE_AUTHORITY=f"{base}/loadtest-tenant",
+        ))
+        graph_client.reset_caches()
+        stack.callback(graph_client.reset_caches)
+
+    def _seed(self, opts):
+        User = get_user_model()
+        data = seed_catalog(courses=opts["courses"], learners=max(opts["learners"], 1))
+
+        trainers = []
+        for n in range(max(opts["trainers"], 0)):
+            trainers.append(User.objects.create(
+                email=f"trainer{n}@example.com", username=f"trainer{n}",
+                role="office", azure_oid=TRAINER_OID,
+            ))
+
+        videos_by_course = {}
+        for v in CourseVideo.objects.order_by("section__order", "order").values("id", "course_id"):
+            videos_by_course.setdefault(v["course_id"], []).append(v["id"])
+
+        return {
+            "learners": data["learners"],
+            "trainers": trainers,
+            "quiz_course_ids": list(CourseQuiz.objects.values_list("course_id", flat=True)),
+            "videos_by_course": videos_by_course,
+            "upload_bytes": b"\0" * (opts["upload_kb"] * 1024),
+        }
+
+    def _actors(self, ctx, opts):
+        actors = [(u, learner_session) for u in ctx["learners"][:opts["learners"]]]
+        actors += [(u, trainer_session) for u in ctx["trainers"]]
+        return actors
+
+    @staticmethod
+    def _auth_header(user):
+        # same tokens microsoft_login issues (with the "lms" claim)
+        return {"Authorization": f"Bearer {issue_tokens(user).access_token}"}
+
+    # -----------------------------
+    # Sync runner (threads + WSGI handler)
+    # -----------------------------
+    def _run_sync(self, ctx, opts, recorder):
+        deadline = time.perf_counter() + opts["seconds"]
+        think = opts["think_scale"]
+
+        def actor(n, user, scenario):
+            rnd = random.Random(opts["seed"] + n)
+            client = Client(raise_request_exception=False)
+            try:
+                while time.perf_counter() < deadline:
+                    headers = self._auth_header(user)
+                    gen = scenario(rnd, ctx, think)
+                    resp = None
+                    while time.perf_counter() < deadline:
+                        try:
+                            step = gen.send(resp)
+                        except StopIteration:
+                            break
+                        if step[0] == "sleep":
+                            time.sleep(step[1])
+                            resp = None
+                            continue
+                        label, method, path, kwargs = step
+                        t0 = time.perf_counter()
+                        resp = getattr(client, method)(path, headers=headers, **kwargs)
+                        recorder.record(label, time.perf_counter() - t0, resp)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=actor, args=(n, user, scenario))
+            for n, (user, scenario) in enumerate(self._actors(ctx, opts))
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    # -----------------------------
+    # Async runner (event loop + ASGI handler)
+    # -----------------------------
+    async def _run_async(self, ctx, opts, recorder):
+        from asgiref.sync import sync_to_async
+
+        deadline = time.perf_counter() + opts["seconds"]
+        think = opts["think_scale"]
+        auth_header = sync_to_async(self._auth_header)
+
+        async def actor(n, user, scenario):
+            rnd = random.Random(opts["seed"] + n)
+            client = AsyncClient(raise_request_exception=False)
+            while time.perf_counter() < deadline:
+                headers = await auth_header(user)
+                gen = scenario(rnd, ctx, think)
+                resp = None
+                while time.perf_counter() < deadline:
+                    try:
+                        step = gen.send(resp)
+                    except StopIteration:
+                        break
+                    if step[0] == "sleep":
+                        await asyncio.sleep(step[1])
+                        resp = None
+                        continue
+                    label, method, path, kwargs = step
+                    t0 = time.perf_counter()
+                    resp = await getattr(client, method)(path, headers=headers, **kwargs)
+                    recorder.record(label, time.perf_counter() - t0, resp)
+
+        await asyncio.gather(*[
+            actor(n, user, scenario)
+            for n, (user, scenario) in enumerate(self._actors(ctx, opts))
+        ])
+
+    # -----------------------------
+    # Report
+    # -----------------------------
+    def _report(self, vendor, opts, recorder, elapsed, graph_calls):
+        total = sum(len(row["lat"]) for row in recorder.samples.values())
+        elapsed = elapsed or 1.0
+
+        self.stdout.write(
+            f"db={vendor} mode={opts['mode']} learners={opts['learners']} trainers={opts['trainers']} "
+            f"graph={opts['graph']} seconds={elapsed:.1f} requests={total} req/s={total / elapsed:.1f} "
+            f"5xx={recorder.server_errors} db_busy_errors={recorder.busy_errors} graph_calls={graph_calls}"
+        )
+        self._report_lock_waits(vendor, recorder)
+        self.stdout.write(
+            f"  {'endpoint':<24} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'db p95':>9}  status"
+        )
+        for label in sorted(recorder.samples):
+            row = recorder.samples[label]
+            lat = row["lat"]
+            statuses = " ".join(f"{k}:{v}" for k, v in sorted(row["status"].items()))
+            self.stdout.write(
+                f"  {label:<24} {len(lat):>6} "
+                f"{percentile(lat, 50) * 1000:>7.1f}ms "
+                f"{percentile(lat, 95) * 1000:>7.1f}ms "
+                f"{percentile(lat, 99) * 1000:>7.1f}ms "
+                f"{percentile(row['db'], 95):>7.1f}ms  {statuses}"
+            )
+
+    def _report_lock_waits(self, vendor, recorder):
+        waits = recorder.lock_waits
+        if not waits:
+            self.stdout.write(f"  lock waits: not sampled on {vendor}")
+            return
+        if vendor == "sqlite":
+            self.stdout.write(
+                f"  lock waits (probe BEGIN IMMEDIATE, {len(waits)} samples): "
+                f"p50={percentile(waits, 50) * 1000:.1f}ms p95={percentile(waits, 95) * 1000:.1f}ms "
+                f"max={max(waits) * 1000:.1f}ms"
+            )
+            return
+        waiters = recorder.lock_waiters
+        self.stdout.write(
+            f"  lock waits (pg_stat_activity, {len(waits)} samples): "
+            f"waiting sessions avg={sum(waiters) / len(waiters):.2f} max={max(waiters)} "
+            f"oldest wait p95={percentile(waits, 95) * 1000:.1f}ms max={max(waits) * 1000:.1f}ms"
+        )
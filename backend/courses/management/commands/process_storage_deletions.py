@@ -0,0 +1,23 @@
+# courses/management/commands/process_storage_deletions.py
+from django.core.management.base import BaseCommand
+
+from courses.storage_cleanup import process_storage_deletions
+
+
+class Command(BaseCommand):
+    """
+    Apply queued SharePoint deletions (courses.storage_cleanup). Deletes
+    already kick this in the background; run it from cron to pick up retries.
+    """
+
+    help = "Delete SharePoint files of deleted courses, sections and content items."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument("--max-batches", type=int, default=None)
+
+    def handle(self, *args, **opts):
+        stats = process_storage_deletions(batch_size=opts["batch_size"], max_batches=opts["max_batches"])
+        self.stdout.write(
+            f"Deleted {stats['deleted']}, kept {stats['skipped']} still referenced, {stats['failed']} failed."
+        )
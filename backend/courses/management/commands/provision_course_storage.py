@@ -0,0 +1,34 @@
+# courses/management/commands/provision_course_storage.py
+from django.core.management.base import BaseCommand
+
+from courses.models import Course
+from courses.sharepoint import provision_course_storage
+
+
+class Command(BaseCommand):
+    """
+    Create the SharePoint folder tree for courses whose background
+    provisioning has not completed (e.g. Graph was down, or courses created
+    before provisioning existed). Safe to run from cron.
+    """
+
+    help = "Provision SharePoint folders for courses not yet provisioned."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", type=int, help="Only this course id")
+
+    def handle(self, *args, **opts):
+        qs = Course.objects.filter(storage_provisioned_at__isnull=True).order_by("id")
+        if opts["course"]:
+            qs = qs.filter(id=opts["course"])
+
+        done = failed = 0
+        for course_id in qs.values_list("id", flat=True):
+            try:
+                provision_course_storage(course_id)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Course {course_id}: {e}")
+
+        self.stdout.write(f"Provisioned {done} course(s), {failed} failed.")
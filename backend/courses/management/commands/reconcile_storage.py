@@ -0,0 +1,30 @@
+# courses/management/commands/reconcile_storage.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from courses.storage_cleanup import enqueue_orphans, find_orphans
+
+
+class Command(BaseCommand):
+    """
+    List SharePoint files under the storage roots that no course or content
+    item references (e.g. deleted before the cleanup outbox existed, or
+    replaced thumbnails). With --enqueue they are queued for deletion.
+    """
+
+    help = "Find (and optionally queue for deletion) orphaned SharePoint files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-age-hours", type=float, default=24.0)
+        parser.add_argument("--enqueue", action="store_true", help="Queue orphans for process_storage_deletions")
+
+    def handle(self, *args, **opts):
+        orphans = list(find_orphans(min_age=timedelta(hours=opts["min_age_hours"])))
+        for o in orphans:
+            self.stdout.write(f"{o['item_id']}\t{o['size']}\t{o['name']}")
+
+        total = sum(o["size"] for o in orphans)
+        self.stdout.write(f"{len(orphans)} orphaned file(s), {total / (1024 ** 3):.2f} GB.")
+        if opts["enqueue"]:
+            self.stdout.write(f"Queued {enqueue_orphans(orphans)} for deletion.")
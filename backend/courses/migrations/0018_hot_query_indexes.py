@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_coursevideonote_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='courseprogress',
+            index=models.Index(fields=['user', 'last_accessed'], name='courses_cou_user_id_d1c82f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='coursevideo',
+            index=models.Index(fields=['course', 'content_type'], name='courses_cou_course__be027b_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_quiz_item_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizsubmission',
+            name='import_ref',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_quizsubmission_import_ref'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursequiz',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0022_coursequiz_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='next_section_order',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='coursequiz',
+            name='next_question_order',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='coursesection',
+            name='next_video_order',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='coursesection',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='coursevideo',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
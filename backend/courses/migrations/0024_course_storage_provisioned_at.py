@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0023_optimistic_concurrency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='storage_provisioned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
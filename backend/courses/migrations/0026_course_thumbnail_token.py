@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0025_storage_deletion_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='thumbnail_token',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
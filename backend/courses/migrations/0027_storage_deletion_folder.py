@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0026_course_thumbnail_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storagedeletion',
+            name='folder',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='storagedeletion',
+            name='items',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='storagedeletion',
+            name='track',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
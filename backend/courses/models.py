@@ -5,6 +5,8 @@ from django.db import models
 from django.utils import timezone
 from urllib.parse import urlparse
 
+from .concurrency import conditional_update
+
 
 def validate_company_sharepoint_embed(url: str):
     """
@@ -84,6 +86,9 @@ class Course(models.Model):
     # ✅ NEW: fixed storage folder name created once (do not auto-rename on title change)
     storage_folder_name = models.CharField(max_length=255, blank=True, default="", db_index=True)
 
+    # ✅ NEW: set once the SharePoint folder tree exists (courses.sharepoint.provision_course_storage)
+    storage_provisioned_at = models.DateTimeField(null=True, blank=True)
+
     # -----------------------------
     # ✅ NEW: SharePoint thumbnail file references (for uploads)
     # -----------------------------
@@ -94,6 +99,9 @@ class Course(models.Model):
     thumb_sp_mime = models.CharField(max_length=255, blank=True, default="")
     thumb_sp_size = models.BigIntegerField(default=0)
 
+    # ✅ NEW: hash of the uploaded original; names the resized variants (courses.thumbnails)
+    thumbnail_token = models.CharField(max_length=32, blank=True, default="")
+
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
@@ -106,6 +114,12 @@ class Course(models.Model):
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="published", db_index=True)
 
+    # -----------------------------
+    # ✅ NEW: optimistic concurrency (courses.concurrency)
+    # -----------------------------
+    version = models.PositiveIntegerField(default=1)
+    next_section_order = models.PositiveIntegerField(default=1)
+
     def __str__(self):
         return self.title
 
@@ -115,6 +129,10 @@ class CourseSection(models.Model):
     title = models.CharField(max_length=255)
     order = models.PositiveIntegerField()
 
+    # ✅ NEW: optimistic concurrency (courses.concurrency)
+    version = models.PositiveIntegerField(default=1)
+    next_video_order = models.PositiveIntegerField(default=1)
+
     class Meta:
         ordering = ["order"]
         constraints = [
@@ -169,6 +187,9 @@ class CourseVideo(models.Model):
     sp_mime = models.CharField(max_length=255, blank=True, default="")
     sp_size = models.BigIntegerField(default=0)
 
+    # ✅ NEW: optimistic concurrency (courses.concurrency)
+    version = models.PositiveIntegerField(default=1)
+
     class Meta:
         ordering = ["order"]
         constraints = [
@@ -177,6 +198,10 @@ class CourseVideo(models.Model):
                 name="unique_video_order_per_section",
             ),
         ]
+        indexes = [
+            # quiz unlock counts required "video" items per course
+            models.Index(fields=["course", "content_type"]),
+        ]
 
     def clean(self):
         if self.course_id and self.section_id:
@@ -242,6 +267,10 @@ class CourseProgress(models.Model):
                 name="unique_progress_per_user_course",
             ),
         ]
+        indexes = [
+            # my_learning: a user's progress rows, most recently accessed first
+            models.Index(fields=["user", "last_accessed"]),
+        ]
 
     def __str__(self):
         return f"{getattr(self.user, 'email', self.user_id)} - {self.course.title}"
@@ -297,6 +326,21 @@ class CourseQuiz(models.Model):
     title = models.CharField(max_length=255, default="Course Quiz")
     is_published = models.BooleanField(default=True, db_index=True)
 
+    # ✅ NEW: bumped on every creator edit of the quiz or its questions/choices;
+    # clients holding an older version refetch the whole quiz
+    version = models.PositiveIntegerField(default=1)
+    next_question_order = models.PositiveIntegerField(default=1)
+
+    def bump_version(self, expected: int | None = None) -> int | None:
+        """
+        Increment version; with `expected`, only if it still matches
+        (returns None on conflict).
+        """
+        version = conditional_update(CourseQuiz, self.pk, expected)
+        if version is not None:
+            self.version = version
+        return version
+
     def __str__(self):
         return f"Quiz: {self.course.title}"
 
@@ -356,6 +400,9 @@ class QuizSubmission(models.Model):
     total = models.PositiveIntegerField(default=0)
     all_correct = models.BooleanField(default=False)
 
+    # ✅ NEW: set for rows loaded by `manage.py import_learning_data`, so re-runs update instead of duplicating
+    import_ref = models.CharField(max_length=255, null=True, blank=True, unique=True)
+
     class Meta:
         indexes = [
             models.Index(fields=["user", "quiz"]),
@@ -389,6 +436,37 @@ class QuizAnswer(models.Model):
         return f"Answer: {self.question_id} -> {self.selected_choice_id}"
 
 
+class QuizQuestionStats(models.Model):
+    """
+    Item-analysis counters, bumped inside quiz_submit's transaction
+    (courses.analytics.record_quiz_item_stats).
+    """
+    question = models.OneToOneField(
+        QuizQuestion,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    attempts = models.PositiveIntegerField(default=0)  # submissions that contained the question
+    answered = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats Q{self.question_id}: {self.answered}/{self.attempts}"
+
+
+class QuizChoiceStats(models.Model):
+    choice = models.OneToOneField(
+        QuizChoice,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    selected = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats choice {self.choice_id}: {self.selected}"
+
+
 # ============================================================
 # ✅ NEW: Per-user, per-video notes (saved + loaded)
 # ============================================================
@@ -421,3 +499,111 @@ class CourseVideoNote(models.Model):
 
     def __str__(self):
         return f"Note: {getattr(self.user, 'email', self.user_id)} - video {self.video_id}"
+
+
+# ============================================================
+# ✅ NEW: Learning analytics rollups (courses.analytics)
+# ============================================================
+
+class CourseLearner(models.Model):
+    """
+    One row per (user, course) the first time the user touches the course.
+    Dedupe table for the rollups: started/completed are counted once per learner.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="course_learner_rows",
+    )
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="learners")
+    started_on = models.DateField()
+    completed_on = models.DateField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "course"], name="unique_learner_per_user_course"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - course {self.course_id}"
+
+
+class CourseDailyStats(models.Model):
+    """
+    Per-course, per-day counters. Precomputed by `manage.py rollup_analytics`.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="daily_stats")
+    date = models.DateField()
+
+    learners_started = models.PositiveIntegerField(default=0)
+    learners_completed = models.PositiveIntegerField(default=0)
+    first_opens = models.PositiveIntegerField(default=0)
+    quiz_attempts = models.PositiveIntegerField(default=0)
+    quiz_passes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(fields=["course", "date"], name="unique_course_daily_stats"),
+        ]
+
+    def __str__(self):
+        return f"course {self.course_id} @ {self.date}"
+
+
+class VideoDailyStats(models.Model):
+    """
+    Per-content-item, per-day count of learners opening it for the first time.
+    """
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="video_daily_stats")
+    video = models.ForeignKey(CourseVideo, on_delete=models.CASCADE, related_name="daily_stats")
+    date = models.DateField()
+
+    viewers = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(fields=["video", "date"], name="unique_video_daily_stats"),
+        ]
+        indexes = [
+            models.Index(fields=["course", "date"]),
+        ]
+
+    def __str__(self):
+        return f"video {self.video_id} @ {self.date}"
+
+
+# ============================================================
+# ✅ NEW: SharePoint cleanup outbox (courses.storage_cleanup)
+# ============================================================
+
+class StorageDeletion(models.Model):
+    """
+    A SharePoint file or folder to delete, written in the same transaction
+    as the rows that referenced it and applied later by a worker. Either
+    (drive_id, item_id) or path is set. Rows are removed once applied.
+
+    A course folder row also keeps the course's track / folder name and its
+    files ([drive_id, item_id] pairs), so the worker can fall back to
+    per-file deletes if another course took the folder in the meantime.
+    """
+    drive_id = models.CharField(max_length=128, blank=True, default="")
+    item_id = models.CharField(max_length=256, blank=True, default="")
+    path = models.CharField(max_length=1024, blank=True, default="")
+    reason = models.CharField(max_length=64, blank=True, default="")
+
+    track = models.CharField(max_length=20, blank=True, default="")
+    folder = models.CharField(max_length=255, blank=True, default="")
+    items = models.JSONField(blank=True, default=list)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return self.path or f"{self.drive_id}/{self.item_id}"
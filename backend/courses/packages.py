@@ -0,0 +1,272 @@
+# courses/packages.py
+"""
+Course packages: a whole course (sections, content items, quiz) as one JSON
+manifest, so trainers can clone or move a course in a single request instead
+of one creator call per section / item / question / choice.
+
+    {
+      "format": "lms-course-package", "version": 1,
+      "course": {"title", "description", "track", "category", "subcategory", "thumbnail_url"},
+      "sections": [{"title", "items": [{"content_type", "video_title", "embed_url",
+                                        "guide_title", "guide_url", "media": {...}}]}],
+      "quiz": {"title", "is_published", "questions": [{"prompt", "choices": [{"text", "is_correct"}]}]}
+    }
+
+"media" optionally references an already uploaded SharePoint file (the sp_*
+fields without the prefix); files themselves are not copied. Only files
+already attached to a course the importer may edit are accepted, and their
+stored metadata wins over the manifest's. Order comes
+from list position. Import validates everything, then creates the tree in
+one transaction with one bulk insert per table.
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Course, CourseQuiz, CourseSection, CourseVideo, QuizChoice, QuizQuestion
+from .sharepoint import course_folder_name, schedule_course_storage_provisioning
+
+FORMAT = "lms-course-package"
+VERSION = 1
+
+COURSE_FIELDS = ["title", "description", "track", "category", "subcategory", "thumbnail_url"]
+ITEM_FIELDS = ["content_type", "video_title", "embed_url", "guide_title", "guide_url"]
+MEDIA_FIELDS = ["drive_id", "item_id", "web_url", "name", "mime", "size"]
+
+MAX_CHOICES_PER_QUESTION = 4
+
+
+class PackageError(ValueError):
+    """
+    Invalid manifest; .errors maps a path ("sections[0].items[2]") to messages.
+    """
+
+    def __init__(self, errors: dict):
+        super().__init__("Invalid course package")
+        self.errors = errors
+
+
+# -----------------------------
+# Export
+# -----------------------------
+
+def _item(v) -> dict:
+    item = {f: getattr(v, f) for f in ITEM_FIELDS}
+    if v.sp_item_id:
+        item["media"] = {f: getattr(v, f"sp_{f}") for f in MEDIA_FIELDS}
+    return item
+
+
+def export_package_chunks(course):
+    """
+    The manifest as JSON text chunks: header, then one chunk per section and
+    per quiz question, so large courses never sit in memory as one document.
+    """
+    head = {"format": FORMAT, "version": VERSION, "course": {f: getattr(course, f) for f in COURSE_FIELDS}}
+    yield json.dumps(head)[:-1] + ', "sections": ['
+
+    sections = CourseSection.objects.filter(course=course).order_by("order").prefetch_related("videos")
+    for i, s in enumerate(sections):
+        section = {"title": s.title, "items": [_item(v) for v in s.videos.all()]}
+        yield ("," if i else "") + json.dumps(section)
+    yield "]"
+
+    quiz = CourseQuiz.objects.filter(course=course).prefetch_related("questions__choices").first()
+    if quiz is None:
+        yield ', "quiz": null}'
+        return
+
+    yield ', "quiz": ' + json.dumps({"title": quiz.title, "is_published": quiz.is_published})[:-1]
+    yield ', "questions": ['
+    for i, q in enumerate(quiz.questions.all()):
+        question = {
+            "prompt": q.prompt,
+            "choices": [
+                {"text": c.text, "is_correct": c.is_correct}
+                for c in sorted(q.choices.all(), key=lambda c: c.id)
+            ],
+        }
+        yield ("," if i else "") + json.dumps(question)
+    yield "]}}"
+
+
+# -----------------------------
+# Import
+# -----------------------------
+
+def _messages(e: ValidationError):
+    return e.message_dict if hasattr(e, "error_dict") else {"__all__": e.messages}
+
+
+def _list(value, path, errors):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        errors[path] = ["must be a list"]
+        return []
+    return value
+
+
+def _dict(value, path, errors):
+    if not isinstance(value, dict):
+        errors[path] = ["must be an object"]
+        return {}
+    return value
+
+
+def _flag(data, field, default, path, errors):
+    value = data.get(field, default)
+    if not isinstance(value, bool):
+        errors[f"{path}.{field}"] = ["must be true or false"]
+        return default
+    return value
+
+
+def _check_media(media_items, media_courses, errors):
+    """
+    Reject media not already attached to one of media_courses, and copy the
+    stored sp_* fields over whatever the manifest claimed (one query).
+    """
+    if not media_items:
+        return
+    known = {
+        (row["sp_drive_id"], row["sp_item_id"]): row
+        for row in CourseVideo.objects.filter(
+            course__in=media_courses,
+            sp_item_id__in={v.sp_item_id for v, _ in media_items},
+        ).values(*[f"sp_{f}" for f in MEDIA_FIELDS])
+    }
+    for video, ipath in media_items:
+        row = known.get((video.sp_drive_id, video.sp_item_id))
+        if row is None:
+            errors[f"{ipath}.media"] = ["must reference a file already attached to a course you can edit"]
+            continue
+        for field, value in row.items():
+            setattr(video, field, value)
+
+
+def _build(manifest, owner, media_courses):
+    """
+    Unsaved objects for the whole tree, validated. Raises PackageError.
+    Media must already belong to one of `media_courses` (a Course queryset).
+    """
+    errors = {}
+    manifest = _dict(manifest, "$", errors)
+    if manifest.get("format") != FORMAT or manifest.get("version") != VERSION:
+        errors["format"] = [f'expected "format": "{FORMAT}", "version": {VERSION}']
+
+    data = _dict(manifest.get("course"), "course", errors)
+    course = Course(
+        **{f: data[f] for f in COURSE_FIELDS if data.get(f) is not None},
+        storage_folder_name=course_folder_name(data.get("title") or ""),
+        created_by=owner,
+        status="draft",
+        is_published=False,
+    )
+    try:
+        course.full_clean(exclude=["created_by"], validate_unique=False, validate_constraints=False)
+    except ValidationError as e:
+        errors["course"] = _messages(e)
+
+    tree, media_items = [], []
+    for si, s in enumerate(_list(manifest.get("sections"), "sections", errors)):
+        path = f"sections[{si}]"
+        s = _dict(s, path, errors)
+        section = CourseSection(course=course, title=(s.get("title") or "").strip(), order=si + 1)
+        if not section.title:
+            errors[f"{path}.title"] = ["This field cannot be blank."]
+
+        items = []
+        for vi, v in enumerate(_list(s.get("items"), f"{path}.items", errors)):
+            ipath = f"{path}.items[{vi}]"
+            v = _dict(v, ipath, errors)
+            media = _dict(v.get("media") or {}, f"{ipath}.media", errors)
+            video = CourseVideo(
+                course=course,
+                section=section,
+                order=vi + 1,
+                **{f: v[f] for f in ITEM_FIELDS if v.get(f) is not None},
+                **{f"sp_{f}": media[f] for f in MEDIA_FIELDS if media.get(f) is not None},
+            )
+            try:
+                # per-row unique checks would cost a query each; orders are unique by construction
+                video.full_clean(exclude=["course", "section"], validate_unique=False, validate_constraints=False)
+            except ValidationError as e:
+                errors[ipath] = _messages(e)
+            if video.sp_drive_id or video.sp_item_id:
+                media_items.append((video, ipath))
+            items.append(video)
+        tree.append((section, items))
+    _check_media(media_items, media_courses, errors)
+
+    quiz, questions = None, []
+    q_data = manifest.get("quiz")
+    if q_data is not None:
+        q_data = _dict(q_data, "quiz", errors)
+        quiz = CourseQuiz(
+            course=course,
+            title=(q_data.get("title") or "").strip() or "Course Quiz",
+            is_published=_flag(q_data, "is_published", True, "quiz", errors),
+        )
+        for qi, q in enumerate(_list(q_data.get("questions"), "quiz.questions", errors)):
+            qpath = f"quiz.questions[{qi}]"
+            q = _dict(q, qpath, errors)
+            question = QuizQuestion(quiz=quiz, prompt=(q.get("prompt") or "").strip(), order=qi + 1)
+            if not question.prompt:
+                errors[f"{qpath}.prompt"] = ["This field cannot be blank."]
+
+            choices = []
+            raw_choices = _list(q.get("choices"), f"{qpath}.choices", errors)
+            if len(raw_choices) > MAX_CHOICES_PER_QUESTION:
+                errors[f"{qpath}.choices"] = [
+                    f"Each question can have a maximum of {MAX_CHOICES_PER_QUESTION} options."
+                ]
+            for ci, c in enumerate(raw_choices):
+                cpath = f"{qpath}.choices[{ci}]"
+                c = _dict(c, cpath, errors)
+                choice = QuizChoice(
+                    question=question,
+                    text=(c.get("text") or "").strip(),
+                    is_correct=_flag(c, "is_correct", False, cpath, errors),
+                )
+                if not choice.text:
+                    errors[f"{cpath}.text"] = ["This field cannot be blank."]
+                choices.append(choice)
+            questions.append((question, choices))
+
+    if errors:
+        raise PackageError(errors)
+    return course, tree, quiz, questions
+
+
+def import_package(manifest, owner, media_courses) -> Course:
+    """
+    Create a draft course from a manifest (dict). Raises PackageError.
+    """
+    course, tree, quiz, questions = _build(manifest, owner, media_courses)
+
+    with transaction.atomic():
+        course.save()
+        schedule_course_storage_provisioning(course)
+
+        # bulk_create sets the pks (PostgreSQL / SQLite), so children can point at them
+        CourseSection.objects.bulk_create([s for s, _ in tree])
+        for section, items in tree:
+            for v in items:
+                v.course = course
+                v.section = section
+        CourseVideo.objects.bulk_create([v for _, items in tree for v in items])
+
+        if quiz is not None:
+            quiz.course = course
+            quiz.save()
+            for question, _ in questions:
+                question.quiz = quiz
+            QuizQuestion.objects.bulk_create([q for q, _ in questions])
+            for question, choices in questions:
+                for c in choices:
+                    c.question = question
+            QuizChoice.objects.bulk_create([c for _, choices in questions for c in choices])
+
+    return course
@@ -0,0 +1,120 @@
+# courses/playback.py
+"""
+Signed playback tokens for GET /api/videos/<id>/stream/?t=<token>.
+
+A token carries everything streaming needs (drive id, item id, mime) and is
+HMAC-signed, so video_stream validates it and streams without a database
+query; players issue dozens of range requests per video.
+
+Token: <kid>.<payload>.<signature>, base64url without padding. The payload
+is [video_id, expires, drive_id, item_id, mime] as compact JSON; the
+signature is HMAC-SHA256 over "<kid>.<payload>", truncated to 128 bits.
+
+Keys come from settings.VIDEO_STREAM_SIGNING_KEYS ("kid:secret,kid:secret"),
+not SECRET_KEY. The first key signs, every listed key verifies: to rotate,
+put the new key first and drop the old one once its URLs have expired
+(VIDEO_STREAM_SIGNED_URL_TTL_SECONDS).
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+SIGNATURE_BYTES = 16
+
+
+class InvalidPlaybackToken(ValueError):
+    pass
+
+
+class PlaybackTokenExpired(InvalidPlaybackToken):
+    pass
+
+
+@dataclass(frozen=True)
+class PlaybackGrant:
+    video_id: int
+    expires: int
+    drive_id: str
+    item_id: str
+    mime: str
+
+
+def signing_keys() -> list:
+    """
+    [(kid, secret bytes)] from settings; the first one signs.
+    """
+    keys = []
+    for entry in (getattr(settings, "VIDEO_STREAM_SIGNING_KEYS", "") or "").split(","):
+        kid, sep, secret = entry.strip().partition(":")
+        if sep and kid and secret and "." not in kid:
+            keys.append((kid, secret.encode("utf-8")))
+    if not keys:
+        raise ImproperlyConfigured("VIDEO_STREAM_SIGNING_KEYS must list at least one kid:secret")
+    return keys
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _signature(secret: bytes, kid: str, payload: str) -> bytes:
+    return hmac.new(secret, f"{kid}.{payload}".encode("ascii"), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def sign_playback(video, ttl: int | None = None) -> tuple[str, int]:
+    """
+    (token, expires) for streaming a CourseVideo's SharePoint file.
+    """
+    if ttl is None:
+        ttl = int(getattr(settings, "VIDEO_STREAM_SIGNED_URL_TTL_SECONDS", 900))
+    expires = int(time.time()) + ttl
+    body = [video.id, expires, video.sp_drive_id, video.sp_item_id, (video.sp_mime or "").strip()]
+    payload = _b64encode(json.dumps(body, separators=(",", ":")).encode("utf-8"))
+
+    kid, secret = signing_keys()[0]
+    return f"{kid}.{payload}.{_b64encode(_signature(secret, kid, payload))}", expires
+
+
+def verify_playback(token: str, video_id: int) -> PlaybackGrant:
+    """
+    The grant in a token for this video. Raises PlaybackTokenExpired or
+    InvalidPlaybackToken.
+    """
+    token = (token or "").strip()
+    parts = token.split(".")
+    if len(parts) != 3 or not token.isascii():
+        raise InvalidPlaybackToken("Malformed token")
+    kid, payload, sig = parts
+
+    secret = dict(signing_keys()).get(kid)
+    if secret is None:
+        raise InvalidPlaybackToken("Unknown key")
+    try:
+        sig = _b64decode(sig)
+    except (binascii.Error, ValueError):
+        raise InvalidPlaybackToken("Malformed token")
+    if not hmac.compare_digest(sig, _signature(secret, kid, payload)):
+        raise InvalidPlaybackToken("Bad signature")
+
+    try:
+        body = json.loads(_b64decode(payload))
+        grant = PlaybackGrant(int(body[0]), int(body[1]), str(body[2]), str(body[3]), str(body[4]))
+    except (binascii.Error, ValueError, TypeError, IndexError, KeyError):
+        raise InvalidPlaybackToken("Malformed token")
+
+    if grant.video_id != int(video_id) or not (grant.drive_id and grant.item_id):
+        raise InvalidPlaybackToken("Token is for another video")
+    if grant.expires < int(time.time()):
+        raise PlaybackTokenExpired("Expired")
+    return grant
@@ -164,12 +164,26 @@ class CreatorCourseSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
             "storage_folder_name",  # ✅ NEW visibility (read/write on create only in views)
+            "version",  # ✅ NEW: send back as If-Match on edits
         ]
-        read_only_fields = ["is_published", "status", "created_at", "updated_at"]
+        read_only_fields = ["is_published", "status", "created_at", "updated_at", "version"]
+
+
+class CreatorSectionDetailVideoSerializer(CourseVideoSerializer):
+    class Meta(CourseVideoSerializer.Meta):
+        fields = CourseVideoSerializer.Meta.fields + ["version"]
+
+
+class CreatorSectionDetailSerializer(serializers.ModelSerializer):
+    videos = CreatorSectionDetailVideoSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = CourseSection
+        fields = ["id", "title", "order", "version", "videos"]
 
 
 class CreatorCourseDetailSerializer(serializers.ModelSerializer):
-    sections = CourseSectionSerializer(many=True, read_only=True)
+    sections = CreatorSectionDetailSerializer(many=True, read_only=True)
 
     class Meta:
         model = Course
@@ -186,16 +200,17 @@ class CreatorCourseDetailSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
             "storage_folder_name",  # ✅ NEW
+            "version",  # ✅ NEW
             "sections",
         ]
-        read_only_fields = ["is_published", "status", "created_at", "updated_at", "sections"]
+        read_only_fields = ["is_published", "status", "created_at", "updated_at", "version", "sections"]
 
 
 class CreatorSectionCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = CourseSection
-        fields = ["id", "course", "title", "order"]
-        read_only_fields = ["id", "course", "order"]
+        fields = ["id", "course", "title", "order", "version"]
+        read_only_fields = ["id", "course", "order", "version"]
 
 
 class CreatorSectionUpdateSerializer(serializers.ModelSerializer):
@@ -221,8 +236,9 @@ class CreatorVideoCreateSerializer(serializers.ModelSerializer):
 
             # ✅ NEW
             "sp_drive_id", "sp_item_id", "sp_web_url", "sp_name", "sp_mime", "sp_size",
+            "version",
         ]
-        read_only_fields = ["id", "course", "section", "order"]
+        read_only_fields = ["id", "course", "section", "order", "version"]
 
 
 class CreatorVideoUpdateSerializer(serializers.ModelSerializer):
@@ -262,7 +278,7 @@ class CreatorCourseQuizSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CourseQuiz
-        fields = ["id", "title", "is_published", "questions"]
+        fields = ["id", "title", "is_published", "version", "questions"]
 
 
 # ============================================================
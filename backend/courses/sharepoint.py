@@ -5,8 +5,20 @@ from dataclasses import dataclass
 from urllib.parse import quote
 
 from django.conf import settings
+from django.utils import timezone
 
-from users.graph import get_graph_app_token
+from config import background
+from config.instrumentation import graph_timer
+from users.graph import get_graph_app_token, graph_url
+
+
+def _graph_request(method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Every outbound Graph/SharePoint call goes through here so it is timed
+    for the per-request metrics (see config.instrumentation).
+    """
+    with graph_timer():
+        return requests.request(method, url, **kwargs)
 
 
 def _graph_headers() -> dict:
@@ -14,7 +26,7 @@ def _graph_headers() -> dict:
 
 
 def _graph_url(path: str) -> str:
-    return f"https://graph.microsoft.com/v1.0{path}"
+    return graph_url(path)
 
 
 def _slug_folder_name(name: str) -> str:
@@ -40,6 +52,17 @@ def _slug_folder_name(name: str) -> str:
     return s or "Untitled Course"
 
 
+def course_folder_name(title: str) -> str:
+    """
+    Storage folder name for a new course (set on create, never renamed).
+    """
+    return _slug_folder_name(title)
+
+
+# Graph JSON batching accepts at most 20 requests per call
+GRAPH_BATCH_LIMIT = 20
+
+
 @dataclass
 class SharePointFileRef:
     drive_id: str
@@ -73,7 +96,7 @@ class SharePointStorage:
 
         # /sites/{hostname}:/sites/{sitePath}
         path = f"/sites/{self.host}:/sites/{quote(self.site_path, safe='')}"
-        r = requests.get(_graph_url(path), headers=_graph_headers(), timeout=20)
+        r = _graph_request("GET", _graph_url(path), headers=_graph_headers(), timeout=20)
         if r.status_code >= 400:
             raise RuntimeError(f"Graph site lookup failed: {r.status_code} {r.text}")
 
@@ -87,7 +110,7 @@ class SharePointStorage:
             return self._drive_id
 
         sid = self.site_id()
-        r = requests.get(_graph_url(f"/sites/{sid}/drives"), headers=_graph_headers(), timeout=20)
+        r = _graph_request("GET", _graph_url(f"/sites/{sid}/drives"), headers=_graph_headers(), timeout=20)
         if r.status_code >= 400:
             raise RuntimeError(f"Graph drives lookup failed: {r.status_code} {r.text}")
 
@@ -129,6 +152,27 @@ class SharePointStorage:
         course.save(update_fields=["storage_folder_name", "updated_at"])
         return safe
 
+    # -----------------------------
+    # ✅ NEW: course folder tree, created once in the background
+    # -----------------------------
+    def course_folder_path(self, course) -> str:
+        root = self.root_folder_for_track(getattr(course, "track", ""))
+        return f"{root}/{self.ensure_course_storage_folder_name(course)}"
+
+    def provision_course_folders(self, course) -> None:
+        """
+        Create <root>/<CourseFolder>/Sections and /Thumbnail.
+        """
+        base = self.course_folder_path(course)
+        self.ensure_folder(f"{base}/Sections")
+        self.ensure_folder(f"{base}/Thumbnail")
+
+    def _ensure_upload_folder(self, course, folder_path: str) -> None:
+        # Upload sessions create missing folders below the provisioned tree,
+        # so provisioned courses need no per-segment existence checks
+        if getattr(course, "storage_provisioned_at", None) is None:
+            self.ensure_folder(folder_path)
+
     def ensure_folder(self, folder_path: str) -> None:
         """
         Ensure folder path exists (relative to drive root).
@@ -145,7 +189,8 @@ class SharePointStorage:
             running = f"{running}/{part}" if running else part
 
             # Check existence
-            check = requests.get(
+            check = _graph_request(
+                "GET",
                 _graph_url(f"/drives/{drive_id}/root:/{quote(running, safe='/')}"),
                 headers=_graph_headers(),
                 timeout=20,
@@ -166,7 +211,8 @@ class SharePointStorage:
                 "@microsoft.graph.conflictBehavior": "fail",
             }
 
-            cr = requests.post(
+            cr = _graph_request(
+                "POST",
                 _graph_url(create_path),
                 headers={**_graph_headers(), "Content-Type": "application/json"},
                 json=body,
@@ -191,7 +237,8 @@ class SharePointStorage:
         )
         body = {"item": {"@microsoft.graph.conflictBehavior": "replace"}}
 
-        r = requests.post(
+        r = _graph_request(
+            "POST",
             url,
             headers={**_graph_headers(), "Content-Type": "application/json"},
             json=body,
@@ -222,7 +269,7 @@ class SharePointStorage:
                 "Content-Range": f"bytes {start}-{end}/{total}",
             }
 
-            r = requests.put(upload_url, headers=headers, data=chunk, timeout=120)
+            r = _graph_request("PUT", upload_url, headers=headers, data=chunk, timeout=120)
             if r.status_code in (200, 201):
                 return r.json()
             if r.status_code == 202:
@@ -265,11 +312,8 @@ class SharePointStorage:
           <root>/<CourseFolder>/Sections/<section.order>/Videos/<filename>
         """
         drive_id = self.drive_id()
-        root = self.root_folder_for_track(getattr(course, "track", ""))
-        course_folder = self.ensure_course_storage_folder_name(course)
-
-        folder_path = f"{root}/{course_folder}/Sections/{int(section.order)}/Videos"
-        self.ensure_folder(folder_path)
+        folder_path = f"{self.course_folder_path(course)}/Sections/{int(section.order)}/Videos"
+        self._ensure_upload_folder(course, folder_path)
 
         file_path = f"{folder_path}/{filename}"
         upload_url = self.create_upload_session(file_path)
@@ -290,11 +334,8 @@ class SharePointStorage:
         This is meant for course thumbnail images (png/jpg/webp).
         """
         drive_id = self.drive_id()
-        root = self.root_folder_for_track(getattr(course, "track", ""))
-        course_folder = self.ensure_course_storage_folder_name(course)
-
-        folder_path = f"{root}/{course_folder}/Thumbnail"
-        self.ensure_folder(folder_path)
+        folder_path = f"{self.course_folder_path(course)}/Thumbnail"
+        self._ensure_upload_folder(course, folder_path)
 
         file_path = f"{folder_path}/{filename}"
         upload_url = self.create_upload_session(file_path)
@@ -314,7 +355,7 @@ class SharePointStorage:
         if range_header:
             headers["Range"] = range_header
 
-        r = requests.get(url, headers=headers, stream=True, timeout=60)
+        r = _graph_request("GET", url, headers=headers, stream=True, timeout=60)
         return r
 
     # -----------------------------
@@ -338,7 +379,20 @@ class SharePointStorage:
             f"/drives/{quote(drive_id, safe='')}/items/{quote(item_id, safe='')}"
             "?$select=id,name,webUrl,sharepointIds"
         )
-        r = requests.get(url, headers=_graph_headers(), timeout=20)
+        r = _graph_request("GET", url, headers=_graph_headers(), timeout=20)
+        if r.status_code >= 400:
+            raise RuntimeError(f"Graph driveItem lookup failed: {r.status_code} {r.text}")
+        return r.json() or {}
+
+    def get_item_info(self, drive_id: str, item_id: str) -> dict:
+        """
+        size / eTag / file.mimeType of a driveItem (for range serving).
+        """
+        url = _graph_url(
+            f"/drives/{quote(drive_id, safe='')}/items/{quote(item_id, safe='')}"
+            "?$select=id,size,eTag,file"
+        )
+        r = _graph_request("GET", url, headers=_graph_headers(), timeout=20)
         if r.status_code >= 400:
             raise RuntimeError(f"Graph driveItem lookup failed: {r.status_code} {r.text}")
         return r.json() or {}
@@ -385,7 +439,7 @@ class SharePointStorage:
         """
         drive_id = self.drive_id()
         url = _graph_url(f"/drives/{drive_id}/root:/{quote(path_in_drive, safe='/')}")
-        r = requests.delete(url, headers=_graph_headers(), timeout=30)
+        r = _graph_request("DELETE", url, headers=_graph_headers(), timeout=30)
 
         # 204 deleted, 404 already gone -> OK
         if r.status_code in (204, 404):
@@ -393,6 +447,67 @@ class SharePointStorage:
         if r.status_code >= 400:
             raise RuntimeError(f"Graph delete failed for '{path_in_drive}': {r.status_code} {r.text}")
 
+    def delete_many(self, targets: dict) -> dict:
+        """
+        Delete several items through Graph JSON batching (GRAPH_BATCH_LIMIT
+        per call). targets maps a caller key to (drive_id, item_id) or a
+        path in the storage drive; returns {key: None (deleted / already
+        gone) or error text}.
+        """
+        results = {}
+        keys = list(targets)
+        for i in range(0, len(keys), GRAPH_BATCH_LIMIT):
+            requests_ = []
+            for n, key in enumerate(keys[i:i + GRAPH_BATCH_LIMIT]):
+                target = targets[key]
+                if isinstance(target, str):
+                    url = f"/drives/{self.drive_id()}/root:/{quote(target, safe='/')}"
+                else:
+                    url = f"/drives/{target[0]}/items/{quote(target[1], safe='')}"
+                requests_.append({"id": str(n), "method": "DELETE", "url": url, "_key": key})
+
+            r = _graph_request(
+                "POST",
+                _graph_url("/$batch"),
+                headers={**_graph_headers(), "Content-Type": "application/json"},
+                json={"requests": [{k: v for k, v in q.items() if k != "_key"} for q in requests_]},
+                timeout=60,
+            )
+            if r.status_code >= 400:
+                for q in requests_:
+                    results[q["_key"]] = f"Graph batch failed: {r.status_code}"
+                continue
+
+            by_id = {str(x.get("id")): x for x in (r.json() or {}).get("responses") or []}
+            for q in requests_:
+                sub = by_id.get(q["id"]) or {}
+                code = int(sub.get("status") or 0)
+                results[q["_key"]] = None if code in (204, 404) else f"{code} {sub.get('body') or ''}".strip()
+        return results
+
+    def iter_files(self, folder_path: str):
+        """
+        Every file (not folder) below folder_path, recursively, as driveItem dicts.
+        """
+        drive_id = self.drive_id()
+        pending = [folder_path.strip("/")]
+        while pending:
+            folder = pending.pop()
+            url = _graph_url(f"/drives/{drive_id}/root:/{quote(folder, safe='/')}:/children?$top=200")
+            while url:
+                r = _graph_request("GET", url, headers=_graph_headers(), timeout=30)
+                if r.status_code == 404:
+                    break
+                if r.status_code >= 400:
+                    raise RuntimeError(f"Graph list children failed for '{folder}': {r.status_code} {r.text}")
+                data = r.json() or {}
+                for item in data.get("value") or []:
+                    if "folder" in item:
+                        pending.append(f"{folder}/{item.get('name')}")
+                    else:
+                        yield item
+                url = data.get("@odata.nextLink")
+
     def delete_course_folder(self, course) -> None:
         """
         Delete the entire course folder:
@@ -405,3 +520,32 @@ class SharePointStorage:
             folder = self.ensure_course_storage_folder_name(course)
 
         self.delete_item_by_path(f"{root}/{folder}")
+
+
+# -----------------------------
+# ✅ NEW: background provisioning (config.background)
+# -----------------------------
+
+def provision_course_storage(course_id: int) -> bool:
+    """
+    Background job: create the course's folder tree and record it on the
+    course. Safe to re-run; returns True if the course is provisioned.
+    """
+    from .models import Course
+
+    course = Course.objects.filter(pk=course_id).first()
+    if course is None:
+        return False
+    if course.storage_provisioned_at is not None:
+        return True
+
+    SharePointStorage().provision_course_folders(course)
+    Course.objects.filter(pk=course_id).update(storage_provisioned_at=timezone.now())
+    return True
+
+
+def schedule_course_storage_provisioning(course) -> None:
+    """
+    Provision after the creating transaction commits; the request never waits on SharePoint.
+    """
+    background.submit_on_commit(provision_course_storage, course.pk)
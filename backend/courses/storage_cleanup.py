@@ -0,0 +1,264 @@
+# courses/storage_cleanup.py
+"""
+SharePoint cleanup for deleted courses, sections and content items.
+
+Deletes never call Graph inline. enqueue_storage_cleanup(obj) runs in the
+deleting transaction (before the rows go) and writes StorageDeletion
+outbox rows; process_storage_deletions() applies them in Graph batches,
+with exponential backoff on failures. It is kicked in the background after
+each delete and can be run from cron (`manage.py process_storage_deletions`).
+`manage.py reconcile_storage` finds files no row references any more.
+
+Packages may point several courses at the same uploaded file, so a file
+is only deleted while nothing references it. Likewise a course folder is
+only deleted while no other course uses it; the worker checks again before
+deleting, since a new course with the same title gets the same folder.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from config import background
+
+from .models import Course, CourseSection, CourseVideo, StorageDeletion
+from .sharepoint import SharePointStorage
+
+logger = logging.getLogger("lms.storage")
+
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 8
+LEASE = timedelta(minutes=5)
+MAX_BACKOFF = timedelta(hours=6)
+
+
+# -----------------------------
+# Enqueue (inside the deleting transaction)
+# -----------------------------
+
+def _video_items(videos):
+    return {
+        (d, i) for d, i in videos.exclude(sp_item_id="").values_list("sp_drive_id", "sp_item_id") if d and i
+    }
+
+
+def _shared_with_other_courses(items, course) -> bool:
+    ids = {i for _, i in items}
+    if not ids:
+        return False
+    return (
+        CourseVideo.objects.filter(sp_item_id__in=ids).exclude(course=course).exists()
+        or Course.objects.filter(thumb_sp_item_id__in=ids).exclude(pk=course.pk).exists()
+    )
+
+
+def _folder_shared_with_other_courses(track: str, folder: str, course=None) -> bool:
+    # folder names are slugs of titles, so two courses can share one
+    # (SharePoint names are case-insensitive)
+    qs = Course.objects.filter(track=track, storage_folder_name__iexact=folder)
+    if course is not None:
+        qs = qs.exclude(pk=course.pk)
+    return qs.exists()
+
+
+def enqueue_storage_cleanup(obj) -> int:
+    """
+    Queue the SharePoint files of a Course / CourseSection / CourseVideo
+    that is about to be deleted. Returns the number of outbox rows.
+    """
+    rows = []
+    if isinstance(obj, Course):
+        items = _video_items(CourseVideo.objects.filter(course=obj))
+        if obj.thumb_sp_drive_id and obj.thumb_sp_item_id:
+            items.add((obj.thumb_sp_drive_id, obj.thumb_sp_item_id))
+        folder = (obj.storage_folder_name or "").strip()
+
+        if folder and not _shared_with_other_courses(items, obj) \
+                and not _folder_shared_with_other_courses(obj.track, folder, obj):
+            # the course folder holds all of its files: one delete
+            root = SharePointStorage().root_folder_for_track(obj.track)
+            rows.append(StorageDeletion(
+                path=f"{root}/{folder}", reason=f"course:{obj.pk}",
+                track=obj.track, folder=folder, items=sorted([d, i] for d, i in items),
+            ))
+        else:
+            rows += [StorageDeletion(drive_id=d, item_id=i, reason=f"course:{obj.pk}") for d, i in items]
+
+    elif isinstance(obj, CourseSection):
+        items = _video_items(CourseVideo.objects.filter(section=obj))
+        rows += [StorageDeletion(drive_id=d, item_id=i, reason=f"section:{obj.pk}") for d, i in items]
+
+    elif isinstance(obj, CourseVideo):
+        if obj.sp_drive_id and obj.sp_item_id:
+            rows.append(StorageDeletion(drive_id=obj.sp_drive_id, item_id=obj.sp_item_id, reason=f"video:{obj.pk}"))
+
+    return _enqueue(rows)
+
+
+def enqueue_file_cleanup(drive_id: str, item_id: str, reason: str) -> int:
+    """
+    Queue one replaced file (e.g. an old course thumbnail).
+    """
+    if not (drive_id and item_id):
+        return 0
+    return _enqueue([StorageDeletion(drive_id=drive_id, item_id=item_id, reason=reason)])
+
+
+def _enqueue(rows) -> int:
+    if rows:
+        StorageDeletion.objects.bulk_create(rows)
+        background.submit_on_commit(_process_in_background)
+    return len(rows)
+
+
+def _process_in_background():
+    background.submit_once("storage-deletions", process_storage_deletions)
+
+
+# -----------------------------
+# Worker
+# -----------------------------
+
+def _claim(limit: int) -> list:
+    """
+    Due rows, leased for LEASE so concurrent workers skip them.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            StorageDeletion.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now, attempts__lt=MAX_ATTEMPTS)
+            .order_by("next_attempt_at", "id")[:limit]
+        )
+        StorageDeletion.objects.filter(pk__in=[r.pk for r in rows]).update(next_attempt_at=now + LEASE)
+    return rows
+
+
+def _still_referenced(rows) -> set:
+    ids = {r.item_id for r in rows if r.item_id}
+    if not ids:
+        return set()
+    return set(
+        CourseVideo.objects.filter(sp_item_id__in=ids).values_list("sp_item_id", flat=True)
+    ) | set(
+        Course.objects.filter(thumb_sp_item_id__in=ids).values_list("thumb_sp_item_id", flat=True)
+    )
+
+
+def _split_shared_folders(rows) -> list:
+    """
+    Folder rows whose folder another course uses by now become per-file rows
+    (processed in a later batch). Returns the rows still to apply here.
+    """
+    keep, split = [], []
+    for r in rows:
+        if r.path and r.folder and _folder_shared_with_other_courses(r.track, r.folder):
+            split.append(r)
+        else:
+            keep.append(r)
+    if split:
+        with transaction.atomic():
+            StorageDeletion.objects.bulk_create([
+                StorageDeletion(drive_id=d, item_id=i, reason=r.reason)
+                for r in split for d, i in r.items
+            ])
+            StorageDeletion.objects.filter(pk__in=[r.pk for r in split]).delete()
+        logger.info("Course folder(s) now shared, deleting files instead: %s", [r.path for r in split])
+    return keep
+
+
+def process_storage_deletions(batch_size: int = BATCH_SIZE, max_batches: int | None = None) -> dict:
+    """
+    Apply due outbox rows until none are left (or max_batches).
+    Returns {"deleted", "skipped", "failed"}.
+    """
+    stats = {"deleted": 0, "skipped": 0, "failed": 0}
+    sp = None
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = _claim(batch_size)
+        if not rows:
+            break
+        batches += 1
+
+        # a folder another course moved into in the meantime stays
+        rows = _split_shared_folders(rows)
+        if not rows:
+            continue
+
+        # a file re-used by another course (packages) stays
+        referenced = _still_referenced(rows)
+        skipped = [r.pk for r in rows if r.item_id and r.item_id in referenced]
+        targets = {
+            r.pk: r.path if r.path else (r.drive_id, r.item_id)
+            for r in rows if r.pk not in skipped
+        }
+
+        sp = sp or SharePointStorage()
+        try:
+            results = sp.delete_many(targets) if targets else {}
+        except Exception as e:
+            results = {pk: str(e) for pk in targets}
+
+        done = skipped + [pk for pk, err in results.items() if err is None]
+        StorageDeletion.objects.filter(pk__in=done).delete()
+        stats["deleted"] += len(done) - len(skipped)
+        stats["skipped"] += len(skipped)
+
+        now = timezone.now()
+        failed = [r for r in rows if results.get(r.pk)]
+        for r in failed:
+            r.attempts += 1
+            r.last_error = results[r.pk][:2000]
+            r.next_attempt_at = now + min(timedelta(minutes=2 ** r.attempts), MAX_BACKOFF)
+            if r.attempts >= MAX_ATTEMPTS:
+                logger.error("Giving up on SharePoint delete %s: %s", r, r.last_error)
+        StorageDeletion.objects.bulk_update(failed, ["attempts", "last_error", "next_attempt_at"])
+        stats["failed"] += len(failed)
+    return stats
+
+
+# -----------------------------
+# Reconciliation
+# -----------------------------
+
+def find_orphans(min_age: timedelta = timedelta(hours=24)):
+    """
+    Files in the storage roots that no course or content item references.
+    Files younger than min_age are left alone (an upload's row is written
+    after the file lands).
+    """
+    referenced = set(
+        CourseVideo.objects.exclude(sp_item_id="").values_list("sp_item_id", flat=True)
+    ) | set(
+        Course.objects.exclude(thumb_sp_item_id="").values_list("thumb_sp_item_id", flat=True)
+    )
+    queued = set(StorageDeletion.objects.exclude(item_id="").values_list("item_id", flat=True))
+
+    sp = SharePointStorage()
+    drive_id = sp.drive_id()
+    cutoff = timezone.now() - min_age
+    for root in {sp.office_root, sp.field_root}:
+        for item in sp.iter_files(root):
+            if item.get("id") in referenced or item.get("id") in queued:
+                continue
+            modified = item.get("lastModifiedDateTime") or ""
+            try:
+                modified_at = datetime.fromisoformat(modified.replace("Z", "+00:00"))
+            except ValueError:
+                modified_at = None
+            if modified_at and modified_at > cutoff:
+                continue
+            yield {
+                "drive_id": (item.get("parentReference") or {}).get("driveId") or drive_id,
+                "item_id": item["id"],
+                "name": item.get("name") or "",
+                "size": int(item.get("size") or 0),
+            }
+
+
+def enqueue_orphans(orphans) -> int:
+    rows = [StorageDeletion(drive_id=o["drive_id"], item_id=o["item_id"], reason="orphan") for o in orphans]
+    StorageDeletion.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
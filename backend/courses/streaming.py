@@ -0,0 +1,513 @@
+# courses/streaming.py
+"""
+Range serving for SharePoint-backed media (GET /api/videos/<id>/stream/).
+
+Item size, mime type and eTag are cached per (drive_id, item_id), so Range
+headers are validated and normalised locally: unsatisfiable ranges get a
+416 without calling Graph, If-Range is checked against the cached eTag,
+and only the exact bytes needed are requested upstream. Multiple ranges
+are answered as multipart/byteranges.
+
+Upstream bodies are read from the underlying http.client response where
+they are not content-encoded, each chunk straight into the bytes object the
+WSGI server writes, with the read size following the measured throughput
+(ChunkSizer). Copies to disk go through one preallocated buffer.
+
+With STREAM_CACHE_ROOT set, items are also copied to local disk in the
+background; later requests are served from that file, through the
+server's wsgi.file_wrapper (sendfile) when the range runs to the end.
+"""
+import hashlib
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from urllib3.response import HTTPResponse
+
+from config import background
+
+from .sharepoint import SharePointStorage
+
+logger = logging.getLogger("lms.storage")
+
+
+@dataclass(frozen=True)
+class ItemMeta:
+    size: int
+    mime: str
+    etag: str
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+class ItemMetaCache:
+    """
+    Bounded LRU of (drive_id, item_id) -> (ItemMeta, expires_at).
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, meta: ItemMeta) -> None:
+        ttl = int(getattr(settings, "STREAM_META_TTL_SECONDS", 300))
+        max_size = int(getattr(settings, "STREAM_META_CACHE_SIZE", 5000))
+        with self._lock:
+            self._entries[key] = (meta, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+item_meta_cache = ItemMetaCache()
+
+
+def item_meta(sp: SharePointStorage, drive_id: str, item_id: str, mime: str = "") -> ItemMeta:
+    key = (drive_id, item_id)
+    meta = item_meta_cache.get(key)
+    if meta is None:
+        info = sp.get_item_info(drive_id, item_id)
+        meta = ItemMeta(
+            size=int(info.get("size") or 0),
+            mime=((info.get("file") or {}).get("mimeType") or ""),
+            etag=info.get("eTag") or "",
+        )
+        item_meta_cache.put(key, meta)
+    if mime and mime != meta.mime:
+        meta = ItemMeta(size=meta.size, mime=mime, etag=meta.etag)
+    return meta
+
+
+# -----------------------------
+# Range parsing (RFC 9110 section 14)
+# -----------------------------
+
+def parse_range(header: str | None, size: int):
+    """
+    Normalised [(start, end)] (inclusive, sorted, overlapping ranges merged)
+    for a Range header, or None to serve the whole body (no header, another
+    unit, bad syntax, too many ranges). Raises RangeNotSatisfiable if no
+    range overlaps the body.
+    """
+    header = (header or "").strip()
+    if not header.lower().startswith("bytes="):
+        return None
+
+    specs = [s.strip() for s in header[6:].split(",") if s.strip()]
+    if not specs or len(specs) > int(getattr(settings, "STREAM_MAX_RANGES", 16)):
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, sep, last = (part.strip() for part in spec.partition("-"))
+        if not sep or not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # suffix: the last N bytes
+            n = int(last)
+            if n == 0 or size == 0:
+                continue
+            ranges.append((max(0, size - n), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        end = int(last) if last else size - 1
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        prev_start, prev_end = merged[-1]
+        if start <= prev_end + 1:
+            merged[-1] = (prev_start, max(prev_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(request, meta: ItemMeta) -> bool:
+    """
+    False if If-Range is present and does not name the current
+    representation (then the whole body is served).
+    """
+    value = (request.headers.get("If-Range") or "").strip()
+    if not value:
+        return True
+    # Only strong eTags qualify; dates cannot be checked (no Last-Modified is sent)
+    return bool(meta.etag) and not value.startswith("W/") and value == meta.etag
+
+
+# -----------------------------
+# Chunked reads
+# -----------------------------
+
+class ChunkSizer:
+    """
+    Read size that follows the measured throughput: about TARGET_SECONDS of
+    data per chunk, as a power of two between STREAM_CHUNK_MIN_BYTES and
+    STREAM_CHUNK_MAX_BYTES. Starts small so the first bytes go out quickly.
+    """
+
+    TARGET_SECONDS = 0.05
+
+    def __init__(self):
+        self.minimum = int(getattr(settings, "STREAM_CHUNK_MIN_BYTES", 64 * 1024))
+        self.maximum = max(self.minimum, int(getattr(settings, "STREAM_CHUNK_MAX_BYTES", 1024 * 1024)))
+        self.size = self.minimum
+        self._rate = None  # bytes/second, smoothed
+
+    def record(self, nbytes: int, seconds: float) -> None:
+        rate = nbytes / max(seconds, 1e-6)
+        self._rate = rate if self._rate is None else 0.7 * self._rate + 0.3 * rate
+        want = self._rate * self.TARGET_SECONDS
+        size = self.minimum
+        while size < self.maximum and size * 2 <= want:
+            size *= 2
+        self.size = size
+
+
+class _UrllibBody(io.RawIOBase):
+    """
+    A urllib3 response body as a file, through its public read(): bodies
+    that are not content-encoded skip the decoder (decode_content=False).
+    """
+
+    def __init__(self, raw, decode: bool):
+        self._raw = raw
+        self._decode = decode
+
+    def readable(self):
+        return True
+
+    def read(self, n=-1):
+        return self._raw.read(None if n is None or n < 0 else n, decode_content=self._decode)
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _reader(r):
+    """
+    The raw upstream body as a file (None: fall back to iter_content).
+    """
+    raw = getattr(r, "raw", None)
+    if isinstance(raw, HTTPResponse):
+        encoding = (r.headers.get("Content-Encoding") or "identity").strip().lower()
+        return _UrllibBody(raw, decode=encoding != "identity")
+    return raw if hasattr(raw, "readinto") else None
+
+
+def _discard(f, n: int, buf: memoryview) -> bool:
+    while n > 0:
+        got = f.readinto(buf[:min(n, len(buf))])
+        if not got:
+            return False
+        n -= got
+    return True
+
+
+def read_chunks(f, length: int, skip: int = 0):
+    """
+    Yield `length` bytes from f after discarding `skip`. Each chunk is read
+    straight into the bytes object the WSGI server writes out (Django passes
+    bytes through untouched but copies anything else), sized by ChunkSizer.
+    """
+    sizer = ChunkSizer()
+    if skip and not _discard(f, skip, memoryview(bytearray(sizer.maximum))):
+        return
+    while length > 0:
+        started = time.perf_counter()
+        chunk = f.read(min(sizer.size, length))
+        if not chunk:
+            return
+        sizer.record(len(chunk), time.perf_counter() - started)
+        length -= len(chunk)
+        yield chunk
+
+
+def copy_into(f, out, length: int, skip: int = 0) -> int:
+    """
+    Copy `length` bytes of f to the file `out` through one preallocated
+    buffer (readinto / write of a memoryview: no per-chunk objects).
+    Returns the bytes written.
+    """
+    sizer = ChunkSizer()
+    buf = memoryview(bytearray(sizer.maximum))
+    if skip and not _discard(f, skip, buf):
+        return 0
+    written = 0
+    while written < length:
+        n = f.readinto(buf[:min(len(buf), length - written)])
+        if not n:
+            break
+        out.write(buf[:n])
+        written += n
+    return written
+
+
+def _iter_content(r, length: int, skip: int):
+    # requests.Response without a raw stream: plain iteration
+    for chunk in r.iter_content(chunk_size=ChunkSizer().maximum):
+        if skip:
+            if len(chunk) <= skip:
+                skip -= len(chunk)
+                continue
+            chunk, skip = chunk[skip:], 0
+        if len(chunk) >= length:
+            yield chunk[:length]
+            return
+        length -= len(chunk)
+        yield chunk
+
+
+def _open_upstream(sp, drive_id, item_id, start, end):
+    """
+    (response, skip) for bytes start..end of the item; skip > 0 if Graph
+    ignored the Range and answered 200 with the whole body.
+    """
+    r = sp.download_stream(drive_id, item_id, range_header=f"bytes={start}-{end}")
+    if r.status_code == 416:
+        r.close()
+        item_meta_cache.discard((drive_id, item_id))
+        raise RangeNotSatisfiable()
+    if r.status_code >= 400:
+        r.close()
+        raise RuntimeError(f"Upstream error: {r.status_code}")
+    return r, (start if r.status_code == 200 else 0)
+
+
+def _upstream_bytes(sp, drive_id, item_id, start, end):
+    """
+    Bytes start..end (inclusive) of the item, trimmed to the window.
+    """
+    r, skip = _open_upstream(sp, drive_id, item_id, start, end)
+    f = _reader(r)
+    try:
+        if f is None:
+            yield from _iter_content(r, end - start + 1, skip)
+        else:
+            yield from read_chunks(f, end - start + 1, skip)
+    finally:
+        r.close()
+
+
+def _local_bytes(path, start, end):
+    with open(path, "rb", buffering=0) as f:
+        f.seek(start)
+        yield from read_chunks(f, end - start + 1)
+
+
+def _multipart(read, ranges, meta, boundary):
+    for start, end in ranges:
+        yield _part_header(boundary, meta, start, end)
+        yield from read(start, end)
+    yield f"\r\n--{boundary}--\r\n".encode("ascii")
+
+
+def _part_header(boundary, meta, start, end) -> bytes:
+    return (
+        f"\r\n--{boundary}\r\n"
+        f"Content-Type: {meta.mime or 'application/octet-stream'}\r\n"
+        f"Content-Range: bytes {start}-{end}/{meta.size}\r\n\r\n"
+    ).encode("ascii")
+
+
+# -----------------------------
+# Local copies (STREAM_CACHE_ROOT)
+# -----------------------------
+
+def cache_path(drive_id: str, item_id: str, meta: ItemMeta) -> Path | None:
+    root = (getattr(settings, "STREAM_CACHE_ROOT", "") or "").strip()
+    if not root:
+        return None
+    key = hashlib.sha256(f"{drive_id}:{item_id}:{meta.etag}".encode("utf-8")).hexdigest()[:32]
+    return Path(root) / f"{key}.bin"
+
+
+def local_copy(drive_id: str, item_id: str, meta: ItemMeta) -> Path | None:
+    """
+    Path of the complete local copy of this item version, scheduling a
+    background download on a miss. None while there is none.
+    """
+    path = cache_path(drive_id, item_id, meta)
+    if path is None:
+        return None
+    try:
+        if path.stat().st_size == meta.size:
+            os.utime(path)  # eviction is oldest-mtime first
+            return path
+    except FileNotFoundError:
+        pass
+    if 0 < meta.size <= int(getattr(settings, "STREAM_CACHE_MAX_FILE_BYTES", 1024 ** 3)):
+        background.submit_once(f"stream-cache:{path.name}", fill_local_copy, drive_id, item_id, meta)
+    return None
+
+
+def fill_local_copy(drive_id: str, item_id: str, meta: ItemMeta, sp: SharePointStorage | None = None) -> None:
+    path = cache_path(drive_id, item_id, meta)
+    if path is None or path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        r, skip = _open_upstream(sp or SharePointStorage(), drive_id, item_id, 0, meta.size - 1)
+        with os.fdopen(fd, "wb") as out:
+            try:
+                src = _reader(r)
+                if src is None:
+                    for chunk in _iter_content(r, meta.size, skip):
+                        out.write(chunk)
+                else:
+                    copy_into(src, out, meta.size, skip)
+            finally:
+                r.close()
+        if os.path.getsize(tmp) != meta.size:
+            raise RuntimeError(f"Short download of {item_id}")
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    _evict(path.parent, int(getattr(settings, "STREAM_CACHE_MAX_BYTES", 20 * 1024 ** 3)))
+
+
+def _evict(root: Path, max_bytes: int) -> None:
+    files = []
+    for p in root.glob("*.bin"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _, size, _ in files)
+    for _, size, p in sorted(files, key=lambda f: f[0]):
+        if total <= max_bytes:
+            break
+        p.unlink(missing_ok=True)
+        total -= size
+
+
+def _not_satisfiable(meta: ItemMeta) -> HttpResponse:
+    resp = HttpResponse(status=416)
+    resp["Content-Range"] = f"bytes */{meta.size}"
+    resp["Accept-Ranges"] = "bytes"
+    return resp
+
+
+def serve_item(request, drive_id: str, item_id: str, mime: str = "", sp: SharePointStorage | None = None):
+    """
+    Response for a GET of the SharePoint item honouring Range / If-Range.
+    """
+    sp = sp or SharePointStorage()
+    try:
+        meta = item_meta(sp, drive_id, item_id, mime)
+    except RuntimeError as e:
+        return HttpResponse(f"Upstream error: {e}", status=502)
+
+    ranges = None
+    if if_range_matches(request, meta):
+        try:
+            ranges = parse_range(request.headers.get("Range"), meta.size)
+        except RangeNotSatisfiable:
+            return _not_satisfiable(meta)
+
+    if ranges is None:
+        ranges = [(0, meta.size - 1)] if meta.size else []
+        partial = False
+    else:
+        partial = True
+
+    local = local_copy(drive_id, item_id, meta) if ranges else None
+    if local is not None:
+        def read(start, end):
+            return _local_bytes(local, start, end)
+    else:
+        def read(start, end):
+            return _upstream_bytes(sp, drive_id, item_id, start, end)
+
+    if len(ranges) > 1:
+        boundary = uuid.uuid4().hex
+        body = _multipart(read, ranges, meta, boundary)
+        length = sum(
+            len(_part_header(boundary, meta, s, e)) + (e - s + 1) for s, e in ranges
+        ) + len(f"\r\n--{boundary}--\r\n")
+        resp = StreamingHttpResponse(body, status=206, content_type=f"multipart/byteranges; boundary={boundary}")
+    else:
+        if ranges and local is not None and ranges[0][1] == meta.size - 1:
+            # runs to EOF: the server may sendfile() it (wsgi.file_wrapper)
+            start, end = ranges[0]
+            f = open(local, "rb")
+            f.seek(start)
+            resp = FileResponse(f, status=206 if partial else 200, content_type=meta.mime or "application/octet-stream")
+            resp.block_size = ChunkSizer().maximum
+            resp.headers.pop("Content-Disposition", None)
+            length = end - start + 1
+        else:
+            if ranges:
+                start, end = ranges[0]
+                # pull the first chunk now so upstream errors still become a status code
+                body = read(start, end)
+                try:
+                    first = next(body, b"")
+                except RangeNotSatisfiable:
+                    return _not_satisfiable(item_meta(sp, drive_id, item_id, mime))
+                except RuntimeError as e:
+                    return HttpResponse(str(e), status=502)
+                body = _prepend(first, body)
+                length = end - start + 1
+            else:
+                body, length = iter(()), 0
+            resp = StreamingHttpResponse(body, status=206 if partial else 200)
+            resp["Content-Type"] = meta.mime or "application/octet-stream"
+
+        if partial:
+            resp["Content-Range"] = f"bytes {ranges[0][0]}-{ranges[0][1]}/{meta.size}"
+
+    resp["Content-Length"] = str(length)
+    resp["Accept-Ranges"] = "bytes"
+    if meta.etag:
+        resp["ETag"] = meta.etag
+    return resp
+
+
+def _prepend(first, rest):
+    if first:
+        yield first
+    yield from rest
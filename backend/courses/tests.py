@@ -1,3 +1,1045 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import FileResponse
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+import requests
+from rest_framework.test import APIClient
+from urllib3.response import HTTPResponse
+
+from config.startup import check_configuration
+from users import graph as graph_client
+from users.fake_graph import FakeGraph
+
+from .analytics import rollup_course_analytics
+from .benchmarking import seed_catalog
+from .checks import check_playback_signing_keys
+from .exports import export_stream, parquet_available
+from .playback import sign_playback
+from .streaming import ChunkSizer, _reader, item_meta_cache, parse_range, RangeNotSatisfiable, read_chunks
+from .thumbnails import PLACEHOLDER_WEBP, render_variants, ThumbnailError, variant_path, variants_available
+from .models import (
+    Course, CourseDailyStats, CourseLearner, CourseSection, StorageDeletion, CourseVideoOpened, CourseVideo, CourseProgress, CourseQuiz, QuizQuestion,
+    QuizChoice, QuizChoiceStats, QuizQuestionStats, QuizSubmission, QuizAnswer,
+)
+
+
+class QueryBudgetMixin:
+    """
+    Query budgets are maximums; they must hold regardless of table size.
+    """
+
+    def assertMaxQueries(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            result = func(*args, **kwargs)
+        self.assertLessEqual(
+            len(ctx.captured_queries),
+            budget,
+            f"{len(ctx.captured_queries)} queries (budget {budget}):\n"
+            + "\n".join(q["sql"] for q in ctx.captured_queries),
+        )
+        return result
+
+
+def create_trainer():
+    return get_user_model().objects.create(email="t@example.com", username="t", role="office", is_staff=True)
+
+
+class TrainerClientMixin:
+    """
+    A staff trainer (self.trainer) and self.client authenticated as them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.trainer = create_trainer()
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.trainer)
+
+
+class FakeGraphMixin:
+    """
+    A patched FakeGraph tenant (self.graph) behind a local-memory cache; the
+    Graph client's process caches are reset around every test.
+    """
+
+    graph_options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        graph_settings = override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": cls.__name__}},
+            AZURE_AUTHORITY="https://login.example.test/tenant",
+        )
+        graph_settings.enable()
+        cls.addClassCleanup(graph_settings.disable)
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        self.graph = FakeGraph(**self.graph_options).patch()
+        self.addCleanup(self.graph.unpatch)
+        graph_client.reset_caches()
+        self.addCleanup(graph_client.reset_caches)
+
+
+class LearnerQueryBudgetTests(FakeGraphMixin, QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        data = seed_catalog()
+        cls.learner = data["learners"][0]
+        cls.course = data["courses"][0]
+        cls.video = CourseVideo.objects.filter(course=cls.course).order_by("section__order", "order").first()
+        cls.quiz = CourseQuiz.objects.get(course=cls.course)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.learner)
+
+    def tearDown(self):
+        self.assertEqual(self.graph.calls, [], "learner endpoints must not call Graph")
+
+    def test_course_list(self):
+        r = self.assertMaxQueries(3, self.client.get, "/api/courses/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json()), 200)
+
+    def test_course_detail(self):
+        r = self.assertMaxQueries(8, self.client.get, f"/api/courses/{self.course.id}/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json()["sections"]), 2)
+
+    def test_course_search(self):
+        r = self.assertMaxQueries(5, self.client.get, "/api/courses/search/", {"q": "safety"})
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.json())
+
+    def test_search_suggestions(self):
+        r = self.assertMaxQueries(3, self.client.get, "/api/search/suggestions/", {"q": "Video 1"})
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.json())
+
+    def test_quiz_get(self):
+        r = self.assertMaxQueries(6, self.client.get, f"/api/courses/{self.course.id}/quiz/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json()["questions"]), 10)
+
+    def test_quiz_submit(self):
+        questions = QuizQuestion.objects.filter(quiz=self.quiz).prefetch_related("choices")
+        answers = [
+            {"question_id": q.id, "choice_id": next(c.id for c in q.choices.all() if c.is_correct)}
+            for q in questions
+        ]
+        # 4 of these maintain the item-analysis counters
+        r = self.assertMaxQueries(
+            16,
+            self.client.post,
+            f"/api/courses/{self.course.id}/quiz/submit/",
+            {"answers": answers},
+            format="json",
+        )
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.json()["all_correct"])
+        sub = QuizSubmission.objects.get(user=self.learner, quiz=self.quiz)
+        self.assertEqual(QuizAnswer.objects.filter(submission=sub).count(), 10)
+        self.assertTrue(CourseProgress.objects.get(user=self.learner, course=self.course).is_completed)
+
+    def test_quiz_submit_ignores_foreign_choices(self):
+        first, second = list(QuizQuestion.objects.filter(quiz=self.quiz).order_by("order")[:2])
+        foreign = QuizChoice.objects.filter(question=second).first()
+        r = self.client.post(
+            f"/api/courses/{self.course.id}/quiz/submit/",
+            {"answers": [{"question_id": first.id, "choice_id": foreign.id}]},
+            format="json",
+        )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["score"], 0)
+        self.assertFalse(QuizAnswer.objects.filter(question=first, submission__user=self.learner).exists())
+
+    def test_update_progress(self):
+        r = self.assertMaxQueries(
+            8,
+            self.client.post,
+            f"/api/courses/{self.course.id}/progress/",
+            {"video_id": self.video.id, "video_index": 1},
+            format="json",
+        )
+        self.assertEqual(r.status_code, 200)
+        p = CourseProgress.objects.get(user=self.learner, course=self.course)
+        self.assertEqual(p.last_video_id, self.video.id)
+
+
+@override_settings(ROLLUP_SAFETY_LAG_SECONDS=0)
+class CourseAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # the hot course is fully opened by everyone; the second one starts cold
+        data = seed_catalog(courses=2, learners=3, hot_courses=1)
+        cls.hot_course, cls.course = data["courses"]
+        cls.learners = data["learners"]
+        cls.quiz = CourseQuiz.objects.create(course=cls.course)
+        cls.videos = list(CourseVideo.objects.filter(course=cls.course).order_by("section__order", "order"))
+
+    def open(self, user, videos):
+        for v in videos:
+            CourseVideoOpened.objects.create(user=user, course=self.course, video=v)
+
+    def submit(self, user, passed):
+        QuizSubmission.objects.create(user=user, quiz=self.quiz, score=2 if passed else 0, total=2, all_correct=passed)
+
+    def test_rollup_is_incremental_and_report_reads_rollups(self):
+        a, b, c = self.learners
+        self.open(a, self.videos)
+        self.open(b, self.videos[:5])  # drops off after the first section
+        self.submit(a, False)
+        self.submit(a, True)
+        self.assertEqual(rollup_course_analytics(), {"opens": 30 + 15, "submissions": 2})
+        self.assertEqual(rollup_course_analytics(), {"opens": 0, "submissions": 0})
+        with override_settings(ROLLUP_SAFETY_LAG_SECONDS=300):
+            self.submit(b, False)  # too fresh: its id could still be committing elsewhere
+            self.assertEqual(rollup_course_analytics(), {"opens": 0, "submissions": 0})
+        QuizSubmission.objects.filter(user=b).update(submitted_at=timezone.now() - timedelta(minutes=10))
+
+        self.open(c, self.videos[:1])
+        self.submit(a, True)  # a second pass is an attempt, not a new completion
+        rollup_course_analytics()
+
+        self.assertEqual(CourseDailyStats.objects.get(course=self.hot_course).learners_started, 3)
+        row = CourseDailyStats.objects.get(course=self.course)
+        self.assertEqual((row.learners_started, row.learners_completed), (3, 1))
+        self.assertEqual((row.quiz_attempts, row.quiz_passes), (4, 2))
+        self.assertEqual(CourseLearner.objects.filter(course=self.course).count(), 3)
+
+        client = APIClient()
+        client.force_authenticate(create_trainer())
+        with CaptureQueriesContext(connection) as ctx:
+            r = client.get(f"/api/creator/courses/{self.course.id}/analytics/")
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(any("courses_quizsubmission" in q["sql"] for q in ctx.captured_queries))
+
+        body = r.json()
+        self.assertEqual(body["totals"]["completion_rate"], round(1 / 3, 4))
+        self.assertEqual([s["learners"] for s in body["sections"]], [3, 1])
+        self.assertEqual(body["videos"][0]["viewers"], 3)
+
+        r = client.get(f"/api/creator/courses/{self.course.id}/analytics/", {"from": "nope"})
+        self.assertEqual(r.status_code, 400)
+
+    def test_item_analysis_counters_and_backfill(self):
+        hot_quiz = CourseQuiz.objects.get(course=self.hot_course)
+        first, second = list(QuizQuestion.objects.filter(quiz=hot_quiz).order_by("order")[:2])
+        right = first.choices.get(is_correct=True)
+        wrong = first.choices.filter(is_correct=False).first()
+
+        for user, choice in zip(self.learners, (right, right, wrong)):
+            client = APIClient()
+            client.force_authenticate(user)
+            r = client.post(
+                f"/api/courses/{self.hot_course.id}/quiz/submit/",
+                {"answers": [{"question_id": first.id, "choice_id": choice.id}]},
+                format="json",
+            )
+            self.assertEqual(r.status_code, 200)
+
+        client = APIClient()
+        client.force_authenticate(create_trainer())
+
+        def analysis():
+            r = client.get(f"/api/creator/courses/{self.hot_course.id}/quiz/analysis/")
+            self.assertEqual(r.status_code, 200)
+            return {q["question_id"]: q for q in r.json()["questions"]}
+
+        before = analysis()
+        self.assertEqual((before[first.id]["attempts"], before[first.id]["answered"]), (3, 3))
+        self.assertEqual(before[first.id]["difficulty"], round(2 / 3, 4))
+        self.assertEqual(before[second.id]["answered"], 0)
+        shares = {c["choice_id"]: c["selected"] for c in before[first.id]["choices"]}
+        self.assertEqual((shares[right.id], shares[wrong.id]), (2, 1))
+
+        QuizQuestionStats.objects.all().delete()
+        QuizChoiceStats.objects.all().delete()
+        call_command("backfill_quiz_item_stats", stdout=StringIO())
+        self.assertEqual(analysis(), before)
+
+
+class LearningDataExportTests(TrainerClientMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        data = seed_catalog(courses=2, learners=3, hot_courses=1)
+        cls.course = data["courses"][0]
+        # one old open, outside the date range below
+        CourseVideoOpened.objects.filter(pk=CourseVideoOpened.objects.order_by("id").first().pk).update(
+            first_opened_at=timezone.now() - timedelta(days=30),
+        )
+
+    def test_csv_export_streams_with_date_range(self):
+        today = timezone.localdate()
+        r = self.client.get("/api/creator/exports/opens/", {"from": (today - timedelta(days=1)).isoformat()})
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.streaming)
+        rows = list(csv.DictReader(io.StringIO(b"".join(r.streaming_content).decode())))
+        self.assertEqual(len(rows), 3 * 10 - 1)
+        self.assertEqual(rows[0]["course_title"], self.course.title)
+
+        r = self.client.get("/api/creator/exports/nope/")
+        self.assertEqual(r.status_code, 400)
+
+    @override_settings(LMS_TRAINERS_GROUP_ID="trainers")
+    def test_trainers_without_staff_cannot_export(self):
+        trainer = get_user_model().objects.create(email="g@example.com", username="g", role="office", azure_oid="oid-g")
+        self.client.force_authenticate(trainer)
+        with mock.patch("training.permissions.is_user_in_group", return_value=True):
+            self.assertEqual(self.client.get("/api/creator/courses/").status_code, 200)  # still a trainer
+            self.assertEqual(self.client.get("/api/creator/exports/answers/").status_code, 403)
+
+    def test_rows_are_written_chunk_by_chunk(self):
+        chunks = list(export_stream("opens", "csv", chunk_size=7))
+        self.assertEqual(len(chunks), 30 // 7 + 1)
+        self.assertEqual(sum(c.count(b"\n") for c in chunks), 30 + 1)
+
+    @skipUnless(parquet_available(), "needs pyarrow")
+    def test_parquet_types_come_from_the_models_not_the_first_chunk(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # the first chunk has no completion at all, a later one does
+        first, *rest = CourseProgress.objects.order_by("id")
+        CourseProgress.objects.filter(pk=first.pk).update(is_completed=False, completed_at=None)
+        CourseProgress.objects.filter(pk=rest[-1].pk).update(is_completed=True, completed_at=timezone.now())
+
+        table = pq.read_table(io.BytesIO(b"".join(export_stream("progress", "parquet", chunk_size=1))))
+        self.assertEqual(table.num_rows, len(rest) + 1)
+        self.assertEqual(table.schema.field("completed_at").type, pa.timestamp("us", tz="UTC"))
+        self.assertEqual(table.schema.field("is_completed").type, pa.bool_())
+        self.assertEqual(table.schema.field("user_email").type, pa.string())
+        self.assertIsNotNone(table.column("completed_at").to_pylist()[-1])
+
+        table = pq.read_table(io.BytesIO(b"".join(export_stream("answers", "parquet", chunk_size=50))))
+        self.assertEqual(table.schema.field("choice_id").type, pa.int64())
+
+
+class ImportLearningDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        data = seed_catalog(courses=2, learners=2, hot_courses=1)
+        cls.hot, cls.cold = data["courses"]
+        cls.learners = data["learners"]
+        cls.learners[1].azure_oid = "oid-1"
+        cls.learners[1].save(update_fields=["azure_oid"])
+        cls.cold_video = CourseVideo.objects.filter(course=cls.cold).first()
+
+    def run_import(self, dataset, rows):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        self.addCleanup(os.unlink, path)
+        with os.fdopen(fd, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=sorted({k for r in rows for k in r}))
+            writer.writeheader()
+            writer.writerows(rows)
+        out, err = StringIO(), StringIO()
+        call_command("import_learning_data", dataset, path, "--batch-size", "2", stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_progress_opens_and_submissions(self):
+        a, b = self.learners
+        out, err = self.run_import("progress", [
+            {"user_email": a.email.upper(), "course_id": self.cold.id, "completed_at": "2024-03-01T10:00:00Z"},
+            {"user_oid": "oid-1", "course_id": self.hot.id, "completed_at": "2024-03-02"},
+            {"user_email": "nobody@example.com", "course_id": self.cold.id},
+            {"user_email": a.email, "course_id": 999999},
+        ])
+        self.assertIn("2 of 4 rows", out)
+        self.assertIn("line 4: unknown user", err)
+        p = CourseProgress.objects.get(user=a, course=self.cold)
+        self.assertTrue(p.is_completed)
+        self.assertEqual(p.completed_at.year, 2024)
+        self.assertEqual(CourseProgress.objects.get(user=b, course=self.hot).completed_times, 1)
+
+        rows = [{"user_email": a.email, "video_id": self.cold_video.id, "first_opened_at": "2023-05-05T08:00:00Z"}]
+        self.run_import("opens", rows)
+        self.run_import("opens", rows)  # re-run updates instead of duplicating
+        opened = CourseVideoOpened.objects.get(user=a, video=self.cold_video)
+        self.assertEqual(opened.first_opened_at.year, 2023)
+
+        QuizSubmission.objects.all().delete()
+        rows = [{"user_email": b.email, "course_id": self.hot.id, "submitted_at": "2024-01-01T09:00:00Z",
+                 "score": "10", "total": "10"}]
+        self.run_import("submissions", rows)
+        self.run_import("submissions", rows)
+        sub = QuizSubmission.objects.get(user=b)
+        self.assertTrue(sub.all_correct)
+        self.assertEqual(sub.submitted_at.year, 2024)
+
+    def test_legacy_progress_merges_with_newer_live_progress(self):
+        a, _ = self.learners
+        live = timezone.now()
+        CourseProgress.objects.update_or_create(
+            user=a, course=self.cold,
+            defaults={"is_completed": True, "completed_at": live, "completed_times": 3, "attempted_times": 5},
+        )
+        out, _ = self.run_import("progress", [
+            {"user_email": a.email, "course_id": self.cold.id, "is_completed": "false",
+             "completed_times": "1", "attempted_times": "2", "completed_at": "2024-03-01T10:00:00Z"},
+            {"user_email": a.email, "course_id": self.cold.id, "is_completed": "false",
+             "completed_times": "0", "attempted_times": "7"},
+        ])
+        self.assertIn("1 of 2 rows", out)  # both rows are one progress row
+
+        p = CourseProgress.objects.get(user=a, course=self.cold)
+        self.assertEqual(
+            (p.is_completed, p.completed_times, p.attempted_times, p.completed_at.year),
+            (True, 3, 7, 2024),
+        )
+
+
+class CoursePackageTests(TrainerClientMixin, QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        data = seed_catalog(courses=1, learners=1, hot_courses=1, questions=3)
+        cls.course = data["courses"][0]
+
+    def export(self, course_id):
+        r = self.client.get(f"/api/creator/courses/{course_id}/package/")
+        self.assertEqual(r.status_code, 200)
+        return json.loads(b"".join(r.streaming_content))
+
+    def test_round_trip_in_one_request(self):
+        manifest = self.export(self.course.id)
+        self.assertEqual(len(manifest["sections"]), 2)
+        self.assertEqual(len(manifest["quiz"]["questions"]), 3)
+
+        # one insert per table regardless of course size
+        r = self.assertMaxQueries(16, self.client.post, "/api/creator/courses/import/", manifest, format="json")
+        self.assertEqual(r.status_code, 201)
+        copy = r.json()
+        self.assertEqual(copy["status"], "draft")
+
+        again = self.export(copy["id"])
+        self.assertEqual({k: v for k, v in again.items() if k != "course"},
+                         {k: v for k, v in manifest.items() if k != "course"})
+
+    def test_invalid_package_creates_nothing(self):
+        manifest = self.export(self.course.id)
+        manifest["sections"][1]["items"][0] = {"content_type": "video", "video_title": "No source"}
+        manifest["quiz"]["questions"][0]["choices"] *= 2
+
+        before = CourseVideo.objects.count()
+        r = self.client.post("/api/creator/courses/import/", manifest, format="json")
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(
+            set(r.json()["errors"]),
+            {"sections[1].items[0]", "quiz.questions[0].choices"},
+        )
+        self.assertEqual(CourseVideo.objects.count(), before)
+
+    def test_media_must_already_belong_to_an_editable_course(self):
+        manifest = self.export(self.course.id)
+        manifest["sections"][0]["items"][0]["media"].update(drive_id="other-drive", item_id="secret-item")
+        manifest["sections"][0]["items"][1]["media"]["web_url"] = "https://evil.example.com/x"
+        manifest["quiz"]["is_published"] = "false"
+        manifest["quiz"]["questions"][0]["choices"][0]["is_correct"] = 1
+
+        r = self.client.post("/api/creator/courses/import/", manifest, format="json")
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(
+            set(r.json()["errors"]),
+            {"sections[0].items[0].media", "quiz.is_published", "quiz.questions[0].choices[0].is_correct"},
+        )
+
+        # known files import with their stored metadata, not the manifest's
+        manifest = self.export(self.course.id)
+        original = manifest["sections"][0]["items"][1]["media"]["web_url"]
+        manifest["sections"][0]["items"][1]["media"]["web_url"] = "https://evil.example.com/x"
+        r = self.client.post("/api/creator/courses/import/", manifest, format="json")
+        self.assertEqual(r.status_code, 201)
+        copy = self.export(r.json()["id"])
+        self.assertEqual(copy["sections"][0]["items"][1]["media"]["web_url"], original)
+
+
+class CreatorBatchTests(TrainerClientMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        data = seed_catalog(courses=1, learners=1, hot_courses=0)
+        cls.course = data["courses"][0]
+
+    def batch(self, operations):
+        return self.client.post(
+            f"/api/creator/courses/{self.course.id}/batch/", {"operations": operations}, format="json",
+        )
+
+    def test_operations_apply_in_order_and_return_one_snapshot(self):
+        first, second = CourseSection.objects.filter(course=self.course).order_by("order")
+        r = self.batch([
+            {"op": "section.create", "ref": "s", "title": "New"},
+            {"op": "video.create", "section": "$s", "video_title": "Intro",
+             "embed_url": "https://aspectmaint.sharepoint.com/sites/lms/video.mp4"},
+            {"op": "sections.reorder", "ids": ["$s", second.id, first.id]},  # includes a swap
+            {"op": "question.create", "ref": "q", "prompt": "Ready?"},
+            {"op": "choice.create", "question": "$q", "text": "Yes", "is_correct": True},
+            {"op": "choice.create", "question": "$q", "text": "No"},
+        ])
+        self.assertEqual(r.status_code, 200, r.content)
+        body = r.json()
+        self.assertEqual([s["title"] for s in body["course"]["sections"]], ["New", "Section 2", "Section 1"])
+        self.assertEqual(body["course"]["sections"][0]["videos"][0]["video_title"], "Intro")
+        self.assertEqual(len(body["quiz"]["questions"][0]["choices"]), 2)
+
+    def test_failing_operation_rolls_back_the_batch(self):
+        before = CourseSection.objects.filter(course=self.course).count()
+        r = self.batch([
+            {"op": "section.create", "title": "Kept?"},
+            {"op": "video.delete", "id": 999999},
+        ])
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(r.json()["index"], 1)
+        self.assertEqual(CourseSection.objects.filter(course=self.course).count(), before)
+
+    def test_malformed_fields_are_batch_errors(self):
+        for operations in (
+            [{"op": "section.create", "title": "Ok"}, {"op": "section.create", "title": 5}],
+            [{"op": "section.create", "title": "Ok"}, {"op": "sections.reorder", "ids": 5}],
+            [{"op": "section.create", "title": "Ok"}, {"op": "quiz.update", "is_published": "false"}],
+        ):
+            r = self.batch(operations)
+            self.assertEqual(r.status_code, 400, operations)
+            self.assertEqual(r.json()["index"], 1)
+
+    def test_quiz_version_moves_only_when_quiz_rows_change(self):
+        quiz = CourseQuiz.objects.create(course=self.course, title="Check")
+        before = quiz.version
+
+        r = self.batch([
+            {"op": "section.create", "title": "No quiz here"},
+            {"op": "quiz.update", "title": quiz.title, "is_published": quiz.is_published},
+        ])
+        self.assertEqual(r.status_code, 200)
+        quiz.refresh_from_db()
+        self.assertEqual(quiz.version, before)
+
+        r = self.batch([{"op": "quiz.update", "title": "Renamed"}])
+        self.assertEqual(r.status_code, 200)
+        quiz.refresh_from_db()
+        self.assertEqual(quiz.version, before + 1)
+
+    def test_question_and_choice_ops_reject_a_stale_quiz_version(self):
+        quiz = CourseQuiz.objects.create(course=self.course, title="Check")
+        question = QuizQuestion.objects.create(quiz=quiz, prompt="Q", order=1)
+        choice = QuizChoice.objects.create(question=question, text="A")
+        seen = quiz.version
+
+        # one versioned batch claims the version once, however many ops carry it
+        r = self.batch([
+            {"op": "question.update", "id": question.id, "prompt": "Q2", "version": seen},
+            {"op": "choice.update", "id": choice.id, "text": "A2", "version": seen},
+        ])
+        self.assertEqual(r.status_code, 200)
+        quiz.refresh_from_db()
+        self.assertEqual(quiz.version, seen + 1)
+
+        for op in (
+            {"op": "question.update", "id": question.id, "prompt": "Stale"},
+            {"op": "question.delete", "id": question.id},
+            {"op": "choice.update", "id": choice.id, "text": "Stale"},
+            {"op": "choice.delete", "id": choice.id},
+        ):
+            r = self.batch([{"op": "section.create", "title": "S"}, {**op, "version": seen}])
+            self.assertEqual((r.status_code, r.json()["index"]), (400, 1), op)
+        question.refresh_from_db()
+        choice.refresh_from_db()
+        self.assertEqual((question.prompt, choice.text), ("Q2", "A2"))
+
+
+class CreatorQuizDeltaTests(TrainerClientMixin, QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        data = seed_catalog(courses=1, learners=1, hot_courses=1, questions=50)
+        cls.quiz = CourseQuiz.objects.get(course=data["courses"][0])
+
+    def test_delta_returns_changed_entity_and_version(self):
+        question = QuizQuestion.objects.filter(quiz=self.quiz).order_by("order").first()
+
+        r = self.assertMaxQueries(
+            8, self.client.post, f"/api/creator/questions/{question.id}/choices/?response=delta",
+            {"text": "Maybe"}, format="json",
+        )
+        self.assertEqual(r.status_code, 400)  # seeded questions already have 4 choices
+
+        choice = question.choices.first()
+        r = self.assertMaxQueries(
+            8, self.client.patch, f"/api/creator/choices/{choice.id}/?response=delta",
+            {"text": "Edited"}, format="json",
+        )
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json(), {
+            "quiz_id": self.quiz.id,
+            "version": 2,
+            "changed": {"type": "choice", "question_id": question.id,
+                        "data": {"id": choice.id, "text": "Edited", "is_correct": choice.is_correct}},
+        })
+
+        r = self.client.delete(f"/api/creator/questions/{question.id}/?response=delta")
+        self.assertEqual(r.json()["deleted"], {"type": "question", "id": question.id})
+        self.assertEqual(r.json()["version"], 3)
+
+        # default mode still returns the whole quiz, now with its version
+        r = self.client.post(f"/api/creator/quizzes/{self.quiz.id}/questions/", {"prompt": "New"}, format="json")
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual((r.json()["quiz"]["version"], len(r.json()["quiz"]["questions"])), (4, 50))
+
+
+class CreatorConcurrencyTests(TrainerClientMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        data = seed_catalog(courses=1, learners=1, hot_courses=1, questions=3)
+        cls.course = data["courses"][0]
+        cls.quiz = CourseQuiz.objects.get(course=cls.course)
+
+    def test_stale_if_match_is_rejected(self):
+        url = f"/api/creator/courses/{self.course.id}/"
+        r = self.client.get(url)
+        self.assertEqual(r["ETag"], '"1"')
+
+        r = self.client.patch(url, {"title": "First"}, format="json", HTTP_IF_MATCH='"1"')
+        self.assertEqual((r.status_code, r["ETag"], r.json()["version"]), (200, '"2"', 2))
+
+        # a second trainer still holding version 1 loses, and nothing is written
+        r = self.client.patch(url, {"description": "Second"}, format="json", HTTP_IF_MATCH='"1"')
+        self.assertEqual((r.status_code, r.json()["version"]), (412, 2))
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.title, self.course.description == "Second"), ("First", False))
+
+        # without a precondition edits still go through (old clients)
+        self.assertEqual(self.client.patch(url, {"description": "Third"}, format="json").status_code, 200)
+
+        question = QuizQuestion.objects.filter(quiz=self.quiz).first()
+        r = self.client.patch(f"/api/creator/questions/{question.id}/", {"prompt": "Stale", "version": 99}, format="json")
+        self.assertEqual(r.status_code, 412)
+        question.refresh_from_db()
+        self.assertNotEqual(question.prompt, "Stale")
+
+    def test_malformed_if_match_is_a_400_not_an_unconditional_write(self):
+        url = f"/api/creator/courses/{self.course.id}/"
+        r = self.client.patch(url, {"title": "Garbled"}, format="json", HTTP_IF_MATCH='"abc"')
+        self.assertEqual(r.status_code, 400)
+        question = QuizQuestion.objects.filter(quiz=self.quiz).first()
+        r = self.client.patch(f"/api/creator/questions/{question.id}/", {"prompt": "Garbled", "version": "x"}, format="json")
+        self.assertEqual(r.status_code, 400)
+
+        self.course.refresh_from_db()
+        question.refresh_from_db()
+        self.assertEqual((self.course.title == "Garbled", question.prompt == "Garbled"), (False, False))
+        self.assertEqual(CourseQuiz.objects.get(pk=self.quiz.pk).version, self.quiz.version)
+
+    def test_orders_are_allocated_past_existing_rows(self):
+        # seeded rows were bulk-created without touching the counters
+        section = CourseSection.objects.filter(course=self.course).order_by("order").last()
+        orders = []
+        for title in ("A", "B"):
+            r = self.client.post(f"/api/creator/courses/{self.course.id}/sections/", {"title": title}, format="json")
+            self.assertEqual(r.status_code, 201)
+            orders.append(r.json()["order"])
+        self.assertEqual(orders, [section.order + 1, section.order + 2])
+
+        last_video = CourseVideo.objects.filter(section=section).order_by("order").last()
+        CourseVideo.objects.filter(pk=last_video.pk).update(order=last_video.order + 10)  # e.g. a reorder
+        r = self.client.post(
+            f"/api/creator/sections/{section.id}/videos/",
+            {"video_title": "Notes", "embed_url": "https://aspectmaint.sharepoint.com/sites/lms/notes.mp4"},
+            format="json",
+        )
+        self.assertEqual((r.status_code, r.json()["order"]), (201, last_video.order + 11))
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CourseStorageProvisioningTests(FakeGraphMixin, TrainerClientMixin, TestCase):
+    def test_create_does_not_wait_and_uploads_skip_folder_checks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post("/api/creator/courses/", {
+                "title": "Boiler: Basics?", "track": "office", "category": "office", "subcategory": "essentials",
+            }, format="json")
+            self.assertEqual(r.status_code, 201)
+            self.assertEqual(r.json()["storage_folder_name"], "Boiler Basics")
+            self.assertEqual(self.graph.calls, [])
+
+        course = Course.objects.get(id=r.json()["id"])
+        self.assertIsNotNone(course.storage_provisioned_at)
+        self.assertTrue({"office/Boiler Basics/Sections", "office/Boiler Basics/Thumbnail"} <= set(self.graph.paths()))
+
+        section = CourseSection.objects.create(course=course, title="One", order=1)
+        self.graph.calls.clear()
+        r = self.client.post(
+            f"/api/creator/sections/{section.id}/videos/upload/",
+            {"file": SimpleUploadedFile("clip.mp4", b"x" * 1024, content_type="video/mp4")},
+            format="multipart",
+        )
+        self.assertEqual(r.status_code, 201, r.content)
+        self.assertIn("office/Boiler Basics/Sections/1/Videos/clip.mp4", self.graph.paths())
+        # no per-segment existence checks / folder creates before the upload session
+        self.assertFalse([url for method, url in self.graph.calls if method == "GET" and "/root:/" in url])
+        self.assertFalse([url for method, url in self.graph.calls if url.endswith("/children")])
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class StorageCleanupTests(FakeGraphMixin, TrainerClientMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.create(
+            title="Pumps", track="office", category="office", subcategory="essentials", storage_folder_name="Pumps",
+        )
+        section = CourseSection.objects.create(course=self.course, title="One", order=1)
+        self.videos = []
+        for n in (1, 2):
+            item = self.graph.add_file(f"office/Pumps/Sections/1/Videos/v{n}.mp4", b"x" * 100)
+            self.videos.append(CourseVideo.objects.create(
+                course=self.course, section=section, order=n, video_title=f"v{n}",
+                sp_drive_id=self.graph.drive_id, sp_item_id=item["id"],
+            ))
+
+    def test_video_delete_queues_cleanup_applied_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.delete(f"/api/creator/videos/{self.videos[0].id}/")
+            self.assertEqual(r.status_code, 204)
+            self.assertEqual(self.graph.calls, [])  # nothing inline
+            self.assertEqual(StorageDeletion.objects.count(), 1)
+
+        self.assertFalse(StorageDeletion.objects.exists())
+        self.assertNotIn("office/Pumps/Sections/1/Videos/v1.mp4", self.graph.paths())
+        self.assertIn("office/Pumps/Sections/1/Videos/v2.mp4", self.graph.paths())
+
+        # failures are kept for a later retry
+        self.graph.fail_paths = re.compile(r"batch")
+        self.graph.failure_rate = 1.0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/creator/courses/{self.course.id}/")
+        row = StorageDeletion.objects.get()
+        self.assertEqual((row.path, row.attempts), ("office/Pumps", 1))
+        self.assertGreater(row.next_attempt_at, timezone.now())
+
+        self.graph.failure_rate = 0.0
+        StorageDeletion.objects.update(next_attempt_at=timezone.now())
+        call_command("process_storage_deletions", stdout=StringIO())
+        self.assertFalse([p for p in self.graph.paths() if p.startswith("office/Pumps")])
+
+    def test_course_delete_keeps_folder_shared_by_same_title(self):
+        twin = Course.objects.create(
+            title="Pumps", track="office", category="office", subcategory="essentials", storage_folder_name="Pumps",
+        )
+        section = CourseSection.objects.create(course=twin, title="One", order=1)
+        item = self.graph.add_file("office/Pumps/Sections/1/Videos/twin.mp4", b"y" * 100)
+        CourseVideo.objects.create(
+            course=twin, section=section, order=1, video_title="twin",
+            sp_drive_id=self.graph.drive_id, sp_item_id=item["id"],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f"/api/creator/courses/{self.course.id}/")
+            self.assertEqual(StorageDeletion.objects.filter(path="").count(), 2)  # per item, not the folder
+
+        paths = self.graph.paths()
+        self.assertIn("office/Pumps/Sections/1/Videos/twin.mp4", paths)
+        self.assertFalse({"office/Pumps/Sections/1/Videos/v1.mp4", "office/Pumps/Sections/1/Videos/v2.mp4"} & set(paths))
+
+    def test_folder_taken_by_a_new_course_before_the_worker_runs(self):
+        self.client.delete(f"/api/creator/courses/{self.course.id}/")  # on-commit worker not run
+        row = StorageDeletion.objects.get()
+        self.assertEqual((row.path, row.folder, len(row.items)), ("office/Pumps", "Pumps", 2))
+
+        twin = Course.objects.create(
+            title="Pumps", track="office", category="office", subcategory="essentials", storage_folder_name="pumps",
+        )
+        section = CourseSection.objects.create(course=twin, title="One", order=1)
+        item = self.graph.add_file("office/Pumps/Sections/1/Videos/twin.mp4", b"y" * 100)
+        CourseVideo.objects.create(
+            course=twin, section=section, order=1, video_title="twin",
+            sp_drive_id=self.graph.drive_id, sp_item_id=item["id"],
+        )
+
+        call_command("process_storage_deletions", stdout=StringIO())
+        self.assertFalse(StorageDeletion.objects.exists())
+        paths = self.graph.paths()
+        self.assertIn("office/Pumps/Sections/1/Videos/twin.mp4", paths)
+        self.assertFalse({"office/Pumps/Sections/1/Videos/v1.mp4", "office/Pumps/Sections/1/Videos/v2.mp4"} & set(paths))
+
+    def test_reconcile_finds_unreferenced_files(self):
+        self.graph.add_file("office/Pumps/Thumbnail/old.png", b"png")
+        out = StringIO()
+        call_command("reconcile_storage", "--min-age-hours", "0", "--enqueue", stdout=out)
+        self.assertIn("1 orphaned file(s)", out.getvalue())
+        self.assertEqual(StorageDeletion.objects.get().reason, "orphan")
+
+        call_command("process_storage_deletions", stdout=StringIO())
+        self.assertNotIn("office/Pumps/Thumbnail/old.png", self.graph.paths())
+        self.assertEqual(len([p for p in self.graph.paths() if p.endswith(".mp4")]), 2)
+
+
+class CourseThumbnailTests(FakeGraphMixin, TrainerClientMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.course = Course.objects.create(
+            title="Pumps", track="office", category="office", subcategory="essentials", storage_folder_name="Pumps",
+        )
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = override_settings(THUMBNAIL_ROOT=tmp.name, BACKGROUND_TASKS_EAGER=True)
+        root.enable()
+        self.addCleanup(root.disable)
+
+    def test_cached_variant_is_served_with_long_lived_headers(self):
+        Course.objects.filter(pk=self.course.pk).update(
+            thumbnail_token="abc123", thumb_sp_drive_id="d", thumb_sp_item_id="i",
+        )
+        path = variant_path(self.course.id, "card", "abc123")
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"RIFF-webp")
+
+        client = APIClient()  # anonymous: <img> tags send no token
+        url = f"/api/courses/{self.course.id}/thumbnail/card/"
+        r = client.get(url + "?v=abc123")
+        self.assertEqual((r.status_code, r["Content-Type"], b"".join(r.streaming_content)), (200, "image/webp", b"RIFF-webp"))
+        self.assertIn("immutable", r["Cache-Control"])
+
+        r = client.get(url, HTTP_IF_NONE_MATCH=r["ETag"])
+        self.assertEqual(r.status_code, 304)
+
+        # a stale bearer token left in the client does not block a public image
+        client.credentials(HTTP_AUTHORIZATION="Bearer expired.or.garbage")
+        self.assertEqual(client.get(url + "?v=abc123").status_code, 200)
+        self.assertEqual(client.get(f"/api/courses/{self.course.id}/thumbnail/huge/").status_code, 404)
+
+    def test_misses_serve_placeholder_and_failures_are_remembered(self):
+        graph = self.graph
+        bad = graph.add_file("office/Pumps/Thumbnail/bad.png", b"not an image")
+        Course.objects.filter(pk=self.course.pk).update(
+            thumbnail_token="bad1", thumb_sp_drive_id=graph.drive_id, thumb_sp_item_id=bad["id"],
+        )
+        url = f"/api/courses/{self.course.id}/thumbnail/card/"
+        downloads = lambda: len([u for _, u in graph.calls if u.endswith("/content")])  # noqa: E731
+
+        for _ in range(2):
+            r = APIClient().get(url)
+            self.assertEqual((r.status_code, r.content, r["Cache-Control"]), (200, PLACEHOLDER_WEBP, "no-store"))
+        self.assertEqual(downloads(), 1)  # the failure is not retried on every hit
+
+        # drafts never render inside the request
+        Course.objects.filter(pk=self.course.pk).update(is_published=False, thumbnail_token="bad2")
+        with mock.patch("courses.thumbnails.background.submit_once") as submit:
+            r = APIClient().get(url)
+        self.assertEqual((r.content, downloads()), (PLACEHOLDER_WEBP, 1))
+        submit.assert_called_once()
+
+    @skipUnless(variants_available(), "needs Pillow")
+    def test_decompression_bombs_are_rejected(self):
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.new("RGB", (300, 200), "red").save(buf, "PNG")
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000), self.assertRaises(ThumbnailError):
+            render_variants(buf.getvalue())
+
+    @skipUnless(variants_available(), "needs Pillow")
+    def test_upload_renders_small_webp_variants(self):
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.new("RGB", (3000, 2000), "red").save(buf, "PNG")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.client.post(
+                f"/api/creator/courses/{self.course.id}/thumbnail/upload/",
+                {"file": SimpleUploadedFile("t.png", buf.getvalue(), content_type="image/png")},
+                format="multipart",
+            )
+        self.assertEqual(r.status_code, 200, r.content)
+        self.course.refresh_from_db()
+        self.assertTrue(r.json()["thumbnail_url"].endswith(f"/thumbnail/card/?v={self.course.thumbnail_token}"))
+
+        card = variant_path(self.course.id, "card", self.course.thumbnail_token)
+        with Image.open(card) as img:
+            self.assertEqual((img.format, img.size), ("WEBP", (480, 270)))
+        self.assertLess(card.stat().st_size, 20 * 1024)
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ThumbnailReplaceTests(FakeGraphMixin, TransactionTestCase):
+    """
+    Real commits: on_commit jobs run as soon as the view's writes commit.
+    """
+
+    def test_replacing_thumbnail_deletes_old_original(self):
+        graph = self.graph
+        old = graph.add_file("office/Pumps/Thumbnail/old.png", b"old")
+        course = Course.objects.create(
+            title="Pumps", track="office", category="office", subcategory="essentials", storage_folder_name="Pumps",
+            thumb_sp_drive_id=graph.drive_id, thumb_sp_item_id=old["id"],
+        )
+        client = APIClient()
+        client.force_authenticate(create_trainer())
+
+        r = client.post(
+            f"/api/creator/courses/{course.id}/thumbnail/upload/",
+            {"file": SimpleUploadedFile("new.png", b"not really a png", content_type="image/png")},
+            format="multipart",
+        )
+        self.assertEqual(r.status_code, 200, r.content)
+        self.assertNotIn("office/Pumps/Thumbnail/old.png", graph.paths())
+        self.assertFalse(StorageDeletion.objects.exists())
+
+
+class VideoStreamRangeTests(FakeGraphMixin, TestCase):
+    DATA = bytes(range(256)) * 40  # 10240 bytes
+
+    def setUp(self):
+        super().setUp()
+        item_meta_cache.clear()
+        self.addCleanup(item_meta_cache.clear)
+
+        course = Course.objects.create(title="Pumps", track="office", category="office", subcategory="essentials")
+        section = CourseSection.objects.create(course=course, title="One", order=1)
+        item = self.graph.add_file("office/Pumps/Sections/1/Videos/v.mp4", self.DATA, mime="video/mp4")
+        self.etag = item["eTag"]
+        self.video = CourseVideo.objects.create(
+            course=course, section=section, order=1, video_title="v",
+            sp_drive_id=self.graph.drive_id, sp_item_id=item["id"],
+        )
+        self.url = f"/api/videos/{self.video.id}/stream/?t={sign_playback(self.video)[0]}"
+        self.client = APIClient()
+
+    def _get(self, **headers):
+        r = self.client.get(self.url, **headers)
+        return r, b"".join(r.streaming_content) if r.streaming else r.content
+
+    def test_parse_range_normalises(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range("items=0-1", 100))
+        self.assertIsNone(parse_range("bytes=5-2", 100))
+        self.assertEqual(parse_range("bytes=0-9, 5-20,-10", 100), [(0, 20), (90, 99)])
+        self.assertEqual(parse_range("bytes=90-500", 100), [(90, 99)])
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range("bytes=100-", 100)
+
+    def test_full_single_and_multi_range(self):
+        r, body = self._get()
+        self.assertEqual((r.status_code, body, r["Content-Length"]), (200, self.DATA, str(len(self.DATA))))
+        self.assertEqual((r["Content-Type"], r["Accept-Ranges"], r["ETag"]), ("video/mp4", "bytes", self.etag))
+
+        r, body = self._get(HTTP_RANGE="bytes=100-199")
+        self.assertEqual((r.status_code, r["Content-Range"], body), (206, "bytes 100-199/10240", self.DATA[100:200]))
+
+        r, body = self._get(HTTP_RANGE="bytes=0-1,-2")
+        self.assertEqual(r.status_code, 206)
+        self.assertTrue(r["Content-Type"].startswith("multipart/byteranges; boundary="))
+        self.assertEqual(int(r["Content-Length"]), len(body))
+        self.assertIn(b"Content-Range: bytes 0-1/10240\r\n\r\n" + self.DATA[:2], body)
+        self.assertIn(b"Content-Range: bytes 10238-10239/10240\r\n\r\n" + self.DATA[-2:], body)
+
+        # item metadata was looked up once for all of the above
+        lookups = [u for m, u in self.graph.calls if m == "GET" and "/content" not in u and "/items/" in u]
+        self.assertEqual(len(lookups), 1)
+
+    def test_unsatisfiable_range_and_if_range(self):
+        self._get(HTTP_RANGE="bytes=0-0")
+        calls = len(self.graph.calls)
+        r, _ = self._get(HTTP_RANGE="bytes=20000-")
+        self.assertEqual((r.status_code, r["Content-Range"]), (416, "bytes */10240"))
+        self.assertEqual(len(self.graph.calls), calls)  # answered locally
+
+        r, body = self._get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=self.etag)
+        self.assertEqual((r.status_code, body), (206, self.DATA[:10]))
+        r, body = self._get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual((r.status_code, body), (200, self.DATA))
+
+    def test_chunk_size_follows_throughput(self):
+        sizer = ChunkSizer()
+        sizer.record(sizer.size, 1.0)  # slow upstream: stay small
+        self.assertEqual(sizer.size, sizer.minimum)
+        for _ in range(5):
+            sizer.record(sizer.size, 1e-4)
+        self.assertEqual(sizer.size, sizer.maximum)
+
+    def test_urllib3_bodies_are_read_through_the_public_api(self):
+        def response(body, **headers):
+            r = requests.Response()
+            r.headers.update(headers)
+            r.raw = HTTPResponse(body=io.BytesIO(body), headers=headers, preload_content=False, decode_content=False)
+            return r
+
+        self.assertEqual(list(read_chunks(_reader(response(self.DATA)), 100, skip=10)), [self.DATA[10:110]])
+        gzipped = response(gzip.compress(self.DATA), **{"Content-Encoding": "gzip"})
+        self.assertEqual(b"".join(read_chunks(_reader(gzipped), len(self.DATA))), self.DATA)
+
+    def test_local_copy_is_filled_in_background_and_served_from_disk(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with override_settings(STREAM_CACHE_ROOT=tmp.name, BACKGROUND_TASKS_EAGER=True):
+            r, body = self._get(HTTP_RANGE="bytes=0-9")
+            self.assertEqual((r.status_code, body), (206, self.DATA[:10]))
+            self.assertEqual(len(os.listdir(tmp.name)), 1)
+
+            calls = len(self.graph.calls)
+            r = self.client.get(self.url, HTTP_RANGE="bytes=100-")
+            self.assertIsInstance(r, FileResponse)  # wsgi.file_wrapper / sendfile
+            self.assertEqual((r.status_code, r["Content-Range"], r["Content-Length"]), (206, "bytes 100-10239/10240", "10140"))
+            self.assertEqual(b"".join(r.streaming_content), self.DATA[100:])
+            r.close()
+
+            r, body = self._get(HTTP_RANGE="bytes=5-9,20-29")
+            self.assertIn(self.DATA[5:10], body)
+            self.assertEqual(len(self.graph.calls), calls)  # no upstream reads
+
+    def test_token_streams_without_db_and_survives_key_rotation(self):
+        with self.assertNumQueries(0):
+            r, body = self._get(HTTP_RANGE="bytes=0-9")
+        self.assertEqual((r.status_code, body), (206, self.DATA[:10]))
+
+        base = f"/api/videos/{self.video.id}/stream/?t="
+        with override_settings(VIDEO_STREAM_SIGNING_KEYS="k1:old-secret"):
+            old = sign_playback(self.video)[0]
+            expired = sign_playback(self.video, ttl=-1)[0]
+        with override_settings(VIDEO_STREAM_SIGNING_KEYS="k2:new-secret,k1:old-secret"):
+            self.assertEqual(self.client.get(base + old, HTTP_RANGE="bytes=0-0").status_code, 206)
+            self.assertTrue(sign_playback(self.video)[0].startswith("k2."))
+            self.assertEqual(self.client.get(base + expired).content, b"Expired")
+
+            kid, payload, sig = old.split(".")
+            other = CourseVideo.objects.create(course=self.video.course, section=self.video.section, order=2, video_title="o", sp_drive_id="d", sp_item_id="x")
+            for bad in (f"{kid}.{payload}.{sig[:-2]}AA", "k1.e30.AAAA", "nope", "k1.é.AAAA", f"k1.{payload}.é"):
+                self.assertEqual(self.client.get(base + bad).status_code, 403)
+            self.assertEqual(self.client.get(f"/api/videos/{other.id}/stream/?t={old}").status_code, 403)
+        with override_settings(VIDEO_STREAM_SIGNING_KEYS="k2:new-secret"):
+            self.assertEqual(self.client.get(base + old).status_code, 403)
+
+    def test_missing_signing_keys_fail_the_startup_checks(self):
+        self.assertEqual(check_playback_signing_keys(), [])
+        with override_settings(VIDEO_STREAM_SIGNING_KEYS=""):
+            self.assertEqual([e.id for e in check_playback_signing_keys()], ["courses.E001"])
+            with self.assertRaises(ImproperlyConfigured):
+                check_configuration()
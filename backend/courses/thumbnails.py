@@ -0,0 +1,170 @@
+# courses/thumbnails.py
+"""
+Course thumbnail variants: fixed-size WebP renditions of the uploaded
+image, kept in a local cache (settings.THUMBNAIL_ROOT) and served by
+GET /api/courses/<id>/thumbnail/<size>/.
+
+The original stays in SharePoint (Course.thumb_sp_*). Upload renders the
+variants in the background (config.background). On a cache miss (new
+worker host, wiped cache) a published course's variant is rendered again from
+the original inside the request; drafts, and originals that failed to render
+within THUMBNAIL_FAILURE_SECONDS, get PLACEHOLDER_WEBP and a background
+re-render instead, so the public endpoint cannot be used to make the server
+download and decode arbitrary images on every hit. File names carry
+Course.thumbnail_token (a hash of the original), so URLs change with the
+image and responses can be cached for a year.
+
+Needs Pillow (optional dependency).
+"""
+import hashlib
+import io
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+
+from config import background
+
+from .models import Course
+from .sharepoint import SharePointStorage
+
+# size -> (width, height); images are centre-cropped to fill
+VARIANTS = {
+    "card": (480, 270),
+    "hero": (1280, 720),
+}
+WEBP_QUALITY = 80
+
+# 16x9 light grey, lossless
+PLACEHOLDER_WEBP = (
+    b"RIFF\x1e\x00\x00\x00WEBPVP8L\x11\x00\x00\x00/\x0f\x00\x02\x00\x07P\xf4\x8a\x17\xbe\xff\x81\x88\xe8\x7f\x00\x00"
+)
+
+
+class ThumbnailError(RuntimeError):
+    pass
+
+
+def variants_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def thumbnail_token(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def thumbnail_url(course, size: str = "card") -> str:
+    return f"/api/courses/{course.id}/thumbnail/{size}/?v={course.thumbnail_token}"
+
+
+def variant_path(course_id: int, size: str, token: str) -> Path:
+    return Path(settings.THUMBNAIL_ROOT) / str(course_id) / f"{size}-{token}.webp"
+
+
+def render_variants(data: bytes) -> dict:
+    """
+    {size: webp bytes} for every entry in VARIANTS.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise ThumbnailError("Thumbnail variants need Pillow installed")
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+            out = {}
+            for size, dims in VARIANTS.items():
+                buf = io.BytesIO()
+                ImageOps.fit(img, dims, Image.LANCZOS).save(buf, "WEBP", quality=WEBP_QUALITY, method=4)
+                out[size] = buf.getvalue()
+            return out
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f"Unreadable image: {e}")
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def store_variants(course_id: int, token: str, data: bytes) -> dict:
+    """
+    Render and cache all variants for one original; older tokens' files are removed.
+    Returns {size: path}.
+    """
+    paths = {}
+    for size, webp in render_variants(data).items():
+        paths[size] = variant_path(course_id, size, token)
+        _write_atomic(paths[size], webp)
+
+    for old in (Path(settings.THUMBNAIL_ROOT) / str(course_id)).glob("*.webp"):
+        if not old.name.endswith(f"-{token}.webp"):
+            old.unlink(missing_ok=True)
+    return paths
+
+
+def generate_course_thumbnails(course_id: int, token: str, data: bytes) -> None:
+    """
+    Background job after an upload. Skipped if a newer image replaced this one.
+    """
+    if Course.objects.filter(pk=course_id, thumbnail_token=token).exists():
+        store_variants(course_id, token, data)
+
+
+def _failure_key(course_id: int, token: str) -> str:
+    return f"lms:thumbnail-failed:{course_id}:{token}"
+
+
+def recently_failed(course) -> bool:
+    return bool(cache.get(_failure_key(course.id, course.thumbnail_token)))
+
+
+def ensure_variant(course, size: str) -> Path | None:
+    """
+    Path of the cached variant, rendering it from the SharePoint original on
+    a miss. None if the course has no uploaded thumbnail. A failure is
+    remembered for THUMBNAIL_FAILURE_SECONDS (see recently_failed).
+    """
+    if not (course.thumbnail_token and course.thumb_sp_drive_id and course.thumb_sp_item_id):
+        return None
+
+    path = variant_path(course.id, size, course.thumbnail_token)
+    if path.exists():
+        return path
+
+    try:
+        r = SharePointStorage().download_stream(course.thumb_sp_drive_id, course.thumb_sp_item_id)
+        if r.status_code >= 400:
+            raise ThumbnailError(f"Original unavailable: {r.status_code}")
+        return store_variants(course.id, course.thumbnail_token, r.content)[size]
+    except ThumbnailError:
+        ttl = int(getattr(settings, "THUMBNAIL_FAILURE_SECONDS", 600))
+        cache.set(_failure_key(course.id, course.thumbnail_token), True, timeout=ttl)
+        raise
+
+
+def _rerender(course_id: int, token: str) -> None:
+    course = Course.objects.filter(pk=course_id, thumbnail_token=token).first()
+    if course is not None:
+        ensure_variant(course, next(iter(VARIANTS)))
+
+
+def schedule_rerender(course) -> None:
+    """
+    Render a missing variant in the background (once per image at a time).
+    """
+    if course.thumbnail_token and not recently_failed(course):
+        background.submit_once(
+            f"thumbnail:{course.id}:{course.thumbnail_token}", _rerender, course.id, course.thumbnail_token,
+        )
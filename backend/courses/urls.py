@@ -29,6 +29,11 @@ urlpatterns = [
     path("creator/courses/", views.creator_course_list_create),
     path("creator/courses/<int:course_id>/", views.creator_course_detail_update_delete),
     path("creator/courses/<int:course_id>/publish/", views.creator_course_publish),
+    path("creator/courses/<int:course_id>/batch/", views.creator_course_batch),
+    path("creator/courses/import/", views.creator_course_package_import),
+    path("creator/courses/<int:course_id>/package/", views.creator_course_package_export),
+    path("creator/courses/<int:course_id>/analytics/", views.creator_course_analytics),
+    path("creator/exports/<str:dataset>/", views.creator_export),
 
     path("creator/courses/<int:course_id>/sections/", views.creator_section_create),
     path("creator/courses/<int:course_id>/sections/reorder/", views.creator_sections_reorder),
@@ -48,6 +53,8 @@ urlpatterns = [
         "creator/courses/<int:course_id>/thumbnail/upload/",
         views.creator_course_thumbnail_upload,
     ),
+    # ✅ NEW: resized thumbnail variants (card / hero), public + long-cached
+    path("courses/<int:course_id>/thumbnail/<str:size>/", views.course_thumbnail, name="course_thumbnail"),
 
     # -----------------------------
     # Video streaming
@@ -59,6 +66,7 @@ urlpatterns = [
     # ✅ NEW: Creator quiz builder APIs (trainer-only)
     # ============================================================
     path("creator/courses/<int:course_id>/quiz/", views.creator_quiz_get_create_update_delete),
+    path("creator/courses/<int:course_id>/quiz/analysis/", views.creator_quiz_item_analysis),
 
     path("creator/quizzes/<int:quiz_id>/questions/", views.creator_question_create),
     path("creator/questions/<int:question_id>/", views.creator_question_update_delete),
@@ -1,21 +1,22 @@
 # courses/views.py
 from django.utils import timezone
-from django.db.models import Count, Q, Max
+from django.utils.dateparse import parse_date
+from django.db import transaction
+from django.db.models import Count, Q
+from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-from django.http import StreamingHttpResponse, HttpResponse
+from django.http import FileResponse, StreamingHttpResponse, HttpResponse
 from django.urls import reverse
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
-import hashlib
-import hmac
-import time
 from urllib.parse import urlencode
 
+from config import background
 from training.permissions import IsTrainer
 
 from .models import (
@@ -33,12 +34,24 @@ from .serializers import (
     CreatorVideoCreateSerializer, CreatorVideoUpdateSerializer,
 
     # ✅ NEW
-    CreatorCourseQuizSerializer,
+    CreatorCourseQuizSerializer, CreatorQuizQuestionSerializer, CreatorQuizChoiceSerializer,
 
     # ✅ NEW (Notes)
     CourseVideoNoteSerializer,
 )
-from .sharepoint import SharePointStorage
+from .sharepoint import SharePointStorage, course_folder_name, schedule_course_storage_provisioning
+from .analytics import course_report, quiz_item_analysis, record_quiz_item_stats
+from .exports import FORMATS, ExportError, export_stream
+from .packages import PackageError, export_package_chunks, import_package
+from .batch import BatchError, CourseBatch
+from .concurrency import allocate_order, conditional_update, expected_version
+from .storage_cleanup import enqueue_file_cleanup, enqueue_storage_cleanup
+from .playback import InvalidPlaybackToken, PlaybackTokenExpired, sign_playback, verify_playback
+from .streaming import serve_item
+from .thumbnails import (
+    PLACEHOLDER_WEBP, VARIANTS, ThumbnailError, ensure_variant, generate_course_thumbnails, recently_failed,
+    schedule_rerender, thumbnail_token, thumbnail_url, variant_path, variants_available,
+)
 
 
 # -----------------------------
@@ -378,10 +391,13 @@ def quiz_submit(request, course_id):
     if total == 0:
         return Response({"detail": "Quiz has no questions"}, status=status.HTTP_400_BAD_REQUEST)
 
+    # choices are prefetched above; no per-question queries
     correct = {}
+    valid_choices = {}
     for q in questions:
-        correct_ids = set(q.choices.filter(is_correct=True).values_list("id", flat=True))
-        correct[q.id] = correct_ids
+        choices = list(q.choices.all())
+        correct[q.id] = {c.id for c in choices if c.is_correct}
+        valid_choices[q.id] = {c.id for c in choices}
 
     submitted_map = {}
     for a in answers:
@@ -400,35 +416,35 @@ def quiz_submit(request, course_id):
 
     all_correct = (score == total)
 
-    sub = QuizSubmission.objects.create(
-        user=request.user,
-        quiz=quiz,
-        score=score,
-        total=total,
-        all_correct=all_correct,
-    )
-
-    for q in questions:
-        chosen = submitted_map.get(q.id)
-        if not chosen:
-            continue
-        if not QuizChoice.objects.filter(id=chosen, question=q).exists():
-            continue
-        QuizAnswer.objects.create(
-            submission=sub,
-            question=q,
-            selected_choice_id=chosen,
+    with transaction.atomic():
+        sub = QuizSubmission.objects.create(
+            user=request.user,
+            quiz=quiz,
+            score=score,
+            total=total,
+            all_correct=all_correct,
         )
 
-    prog, _ = CourseProgress.objects.get_or_create(user=request.user, course=course)
-    prog.attempted_times = int(prog.attempted_times or 0) + 1
+        selected = {
+            q.id: submitted_map[q.id]
+            for q in questions
+            if submitted_map.get(q.id) in valid_choices[q.id]
+        }
+        QuizAnswer.objects.bulk_create([
+            QuizAnswer(submission=sub, question_id=qid, selected_choice_id=cid)
+            for qid, cid in selected.items()
+        ])
+        record_quiz_item_stats(correct.keys(), selected)
+
+        prog, _ = CourseProgress.objects.get_or_create(user=request.user, course=course)
+        prog.attempted_times = int(prog.attempted_times or 0) + 1
 
-    if all_correct:
-        prog.completed_times = int(prog.completed_times or 0) + 1
-        prog.is_completed = True
-        prog.completed_at = timezone.now()
+        if all_correct:
+            prog.completed_times = int(prog.completed_times or 0) + 1
+            prog.is_completed = True
+            prog.completed_at = timezone.now()
 
-    prog.save(update_fields=["attempted_times", "completed_times", "is_completed", "completed_at"])
+        prog.save(update_fields=["attempted_times", "completed_times", "is_completed", "completed_at"])
 
     return Response({
         "score": score,
@@ -663,6 +679,48 @@ def _get_creator_course_or_404(user, course_id):
     return course
 
 
+# -----------------------------
+# ✅ NEW: optimistic concurrency (If-Match / "version", see courses.concurrency)
+# -----------------------------
+
+def _version_conflict(model, pk):
+    current = model.objects.filter(pk=pk).values_list("version", flat=True).first()
+    if current is None:
+        return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+    resp = Response(
+        {"detail": "This item was changed by someone else. Reload and try again.", "version": current},
+        status=status.HTTP_412_PRECONDITION_FAILED,
+    )
+    resp["ETag"] = f'"{current}"'
+    return resp
+
+
+def _versioned(resp, version):
+    resp["ETag"] = f'"{version}"'
+    return resp
+
+
+def _conditional_delete(request, obj):
+    """
+    Delete obj; with If-Match only while its version still matches. Its
+    SharePoint files are queued for cleanup in the same transaction.
+    """
+    model = type(obj)
+    qs = model.objects.select_for_update().filter(pk=obj.pk)
+    expected = expected_version(request)
+    if expected is not None:
+        qs = qs.filter(version=expected)
+
+    with transaction.atomic():
+        locked = list(qs.values_list("pk", flat=True))
+        if locked:
+            enqueue_storage_cleanup(obj)
+            obj.delete()
+    if not locked:
+        return _version_conflict(model, obj.pk)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 @api_view(["GET", "POST"])
 @permission_classes([IsAuthenticated])
 def creator_course_list_create(request):
@@ -691,14 +749,15 @@ def creator_course_list_create(request):
         category=ser.validated_data["category"],
         subcategory=ser.validated_data["subcategory"],
         thumbnail_url=ser.validated_data.get("thumbnail_url", ""),
+        storage_folder_name=course_folder_name(ser.validated_data["title"]),
         created_by=request.user,
         status="draft",
         is_published=False,
     )
 
-    if not (course.storage_folder_name or "").strip():
-        sp = SharePointStorage()
-        sp.ensure_course_storage_folder_name(course)
+    # ✅ folder tree is created in the background; uploads fall back to
+    # ensure_folder until it is recorded on the course
+    schedule_course_storage_provisioning(course)
 
     return Response(
         CreatorCourseDetailSerializer(course, context={"request": request}).data,
@@ -725,23 +784,192 @@ def creator_course_detail_update_delete(request, course_id):
 
     if request.method == "GET":
         course = Course.objects.prefetch_related("sections__videos").get(id=course.id)
-        return Response(CreatorCourseDetailSerializer(course, context={"request": request}).data)
+        return _versioned(Response(CreatorCourseDetailSerializer(course, context={"request": request}).data), course.version)
 
     if request.method == "PATCH":
         ser = CreatorCourseSerializer(course, data=request.data, partial=True, context={"request": request})
         if not ser.is_valid():
             return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        for field in ["title", "description", "track", "category", "subcategory", "thumbnail_url"]:
-            if field in ser.validated_data:
-                setattr(course, field, ser.validated_data[field])
+        # ✅ only the edited columns, and only if nobody saved in between
+        changed = {
+            field: ser.validated_data[field]
+            for field in ["title", "description", "track", "category", "subcategory", "thumbnail_url"]
+            if field in ser.validated_data
+        }
+        version = conditional_update(
+            Course, course.id, expected_version(request), updated_at=timezone.now(), **changed,
+        )
+        if version is None:
+            return _version_conflict(Course, course.id)
 
-        course.save()
         course = Course.objects.prefetch_related("sections__videos").get(id=course.id)
-        return Response(CreatorCourseDetailSerializer(course, context={"request": request}).data)
+        return _versioned(Response(CreatorCourseDetailSerializer(course, context={"request": request}).data), version)
 
-    course.delete()
-    return Response(status=status.HTTP_204_NO_CONTENT)
+    return _conditional_delete(request, course)
+
+
+# -----------------------------
+# ✅ NEW: Creator analytics (precomputed by `manage.py rollup_analytics`) + exports
+# -----------------------------
+
+def _date_range_params(request):
+    """
+    ?from= / ?to= (YYYY-MM-DD, optional) -> ({"from": date|None, "to": date|None}, error response)
+    """
+    dates = {}
+    for name in ("from", "to"):
+        raw = (request.query_params.get(name) or "").strip()
+        try:
+            dates[name] = parse_date(raw) if raw else None
+        except ValueError:
+            dates[name] = None
+        if raw and dates[name] is None:
+            return None, Response({"detail": f"{name} must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+    return dates, None
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def creator_course_analytics(request, course_id):
+    ok, resp = _enforce_creator_ready(request.user)
+    if not ok:
+        return resp
+
+    ok, resp = _require_trainer_group(request)
+    if not ok:
+        return resp
+
+    try:
+        course = _get_creator_course_or_404(request.user, course_id)
+    except Course.DoesNotExist:
+        return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    dates, resp = _date_range_params(request)
+    if resp:
+        return resp
+
+    return Response(course_report(course, dates["from"], dates["to"]))
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def creator_export(request, dataset):
+    """
+    ✅ Streams progress / opens / submissions / answers as CSV (or Parquet)
+    for audits. ?type=csv|parquet&from=YYYY-MM-DD&to=YYYY-MM-DD
+
+    Staff only: rows hold every learner's email and answers across all
+    courses (it replaces the admin pages, not a trainer tool).
+    """
+    if not _is_privileged(request.user):
+        return Response({"detail": "Exports are limited to LMS administrators."}, status=status.HTTP_403_FORBIDDEN)
+
+    dates, resp = _date_range_params(request)
+    if resp:
+        return resp
+
+    # "format" is taken by DRF's content negotiation
+    fmt = (request.query_params.get("type") or "csv").strip().lower()
+    try:
+        chunks = export_stream(dataset, fmt, dates["from"], dates["to"])
+    except ExportError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    content_type, ext = FORMATS[fmt]
+    resp = StreamingHttpResponse(chunks, content_type=content_type)
+    resp["Content-Disposition"] = f'attachment; filename="{dataset}.{ext}"'
+    return resp
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def creator_course_batch(request, course_id):
+    """
+    ✅ Apply an ordered list of edits atomically (courses.batch); one auth
+    check, one final snapshot of the course and quiz.
+    """
+    ok, resp = _enforce_creator_ready(request.user)
+    if not ok:
+        return resp
+
+    ok, resp = _require_trainer_group(request)
+    if not ok:
+        return resp
+
+    try:
+        course = _get_creator_course_or_404(request.user, course_id)
+    except Course.DoesNotExist:
+        return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        results = CourseBatch(course).apply(request.data.get("operations"))
+    except BatchError as e:
+        return Response({"detail": e.detail, "index": e.index}, status=status.HTTP_400_BAD_REQUEST)
+
+    course = Course.objects.prefetch_related("sections__videos").get(id=course.id)
+    quiz = CourseQuiz.objects.filter(course=course).prefetch_related("questions__choices").first()
+    return Response({
+        "results": results,
+        "course": CreatorCourseDetailSerializer(course, context={"request": request}).data,
+        "quiz": CreatorCourseQuizSerializer(quiz).data if quiz else None,
+    })
+
+
+# -----------------------------
+# ✅ NEW: Course packages (whole course tree as one JSON manifest)
+# -----------------------------
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def creator_course_package_import(request):
+    ok, resp = _enforce_creator_ready(request.user)
+    if not ok:
+        return resp
+
+    ok, resp = _require_trainer_group(request)
+    if not ok:
+        return resp
+
+    try:
+        # media may only point at files of courses this user can already edit
+        if _is_privileged(request.user) or _is_trainer(request.user):
+            media_courses = Course.objects.all()
+        else:
+            media_courses = Course.objects.filter(created_by=request.user)
+        course = import_package(request.data, request.user, media_courses)
+    except PackageError as e:
+        return Response({"detail": str(e), "errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    course = Course.objects.prefetch_related("sections__videos").get(id=course.id)
+    return Response(
+        CreatorCourseDetailSerializer(course, context={"request": request}).data,
+        status=status.HTTP_201_CREATED,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def creator_course_package_export(request, course_id):
+    ok, resp = _enforce_creator_ready(request.user)
+    if not ok:
+        return resp
+
+    ok, resp = _require_trainer_group(request)
+    if not ok:
+        return resp
+
+    try:
+        course = _get_creator_course_or_404(request.user, course_id)
+    except Course.DoesNotExist:
+        return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    resp = StreamingHttpResponse(
+        (chunk.encode("utf-8") for chunk in export_package_chunks(course)),
+        content_type="application/json",
+    )
+    resp["Content-Disposition"] = f'attachment; filename="course-{course.id}.json"'
+    return resp
 
 
 @api_view(["POST"])
@@ -795,8 +1023,8 @@ def creator_section_create(request, course_id):
     if not title:
         return Response({"detail": "title is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-    max_order = CourseSection.objects.filter(course=course).aggregate(m=Max("order")).get("m") or 0
-    section = CourseSection.objects.create(course=course, title=title, order=max_order + 1)
+    order = allocate_order(Course, course.id, "next_section_order", CourseSection.objects.filter(course=course))
+    section = CourseSection.objects.create(course=course, title=title, order=order)
 
     return Response(
         CreatorSectionCreateSerializer(section, context={"request": request}).data,
@@ -826,14 +1054,15 @@ def creator_section_update_delete(request, section_id):
         if not ser.is_valid():
             return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        if "title" in ser.validated_data:
-            section.title = ser.validated_data["title"]
-        section.save()
+        changed = {"title": ser.validated_data["title"]} if "title" in ser.validated_data else {}
+        version = conditional_update(CourseSection, section.id, expected_version(request), **changed)
+        if version is None:
+            return _version_conflict(CourseSection, section.id)
 
-        return Response(CreatorSectionCreateSerializer(section, context={"request": request}).data)
+        section.refresh_from_db()
+        return _versioned(Response(CreatorSectionCreateSerializer(section, context={"request": request}).data), version)
 
-    section.delete()
-    return Response(status=status.HTTP_204_NO_CONTENT)
+    return _conditional_delete(request, section)
 
 
 @api_view(["POST"])
@@ -887,12 +1116,12 @@ def creator_video_create(request, section_id):
     if not ser.is_valid():
         return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    max_order = CourseVideo.objects.filter(section=section).aggregate(m=Max("order")).get("m") or 0
+    order = allocate_order(CourseSection, section.id, "next_video_order", CourseVideo.objects.filter(section=section))
 
     video = CourseVideo(
         course=section.course,
         section=section,
-        order=max_order + 1,
+        order=order,
         content_type=ser.validated_data.get("content_type", "video"),
         video_title=ser.validated_data.get("video_title", ""),
         embed_url=ser.validated_data.get("embed_url", "") or "",
@@ -929,15 +1158,26 @@ def creator_video_update_delete(request, video_id):
         if not ser.is_valid():
             return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        for field in ["content_type", "video_title", "embed_url", "guide_title", "guide_url"]:
-            if field in ser.validated_data:
-                setattr(video, field, ser.validated_data[field])
+        changed = {
+            field: ser.validated_data[field]
+            for field in ["content_type", "video_title", "embed_url", "guide_title", "guide_url"]
+            if field in ser.validated_data
+        }
+        for field, value in changed.items():
+            setattr(video, field, value)
+        try:
+            video.full_clean()
+        except ValidationError as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
 
-        video.save()
-        return Response(CreatorVideoCreateSerializer(video, context={"request": request}).data)
+        version = conditional_update(CourseVideo, video.id, expected_version(request), **changed)
+        if version is None:
+            return _version_conflict(CourseVideo, video.id)
 
-    video.delete()
-    return Response(status=status.HTTP_204_NO_CONTENT)
+        video.refresh_from_db()
+        return _versioned(Response(CreatorVideoCreateSerializer(video, context={"request": request}).data), version)
+
+    return _conditional_delete(request, video)
 
 
 @api_view(["POST"])
@@ -986,12 +1226,6 @@ def _require_trainer_group(request):
     return True, None
 
 
-def _sign_stream_params(video_id: int, exp: int) -> str:
-    msg = f"{video_id}:{exp}".encode("utf-8")
-    key = settings.SECRET_KEY.encode("utf-8")
-    return hmac.new(key, msg, hashlib.sha256).hexdigest()
-
-
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def creator_course_thumbnail_upload(request, course_id):
@@ -1032,21 +1266,95 @@ def creator_course_thumbnail_upload(request, course_id):
         else:
             filename += ".png"
 
+    data = up.read()
+    up.seek(0)
+
     try:
         sp = SharePointStorage()
-        sp.ensure_course_storage_folder_name(course)
         ref = sp.upload_course_thumbnail(course=course, filename=filename, django_file=up)
-
-        course.thumbnail_url = ref.web_url
-        course.save(update_fields=["thumbnail_url", "updated_at"])
-
     except Exception as e:
         return Response({"detail": f"Upload failed: {e}"}, status=status.HTTP_400_BAD_REQUEST)
 
+    old_drive_id, old_item_id = course.thumb_sp_drive_id, course.thumb_sp_item_id
+
+    # ✅ original stays in SharePoint; cards load small WebP variants from
+    # /api/courses/<id>/thumbnail/<size>/, rendered in the background
+    # (without Pillow: the original's web_url, as before)
+    course.thumb_sp_drive_id = ref.drive_id
+    course.thumb_sp_item_id = ref.item_id
+    course.thumb_sp_web_url = ref.web_url
+    course.thumb_sp_name = ref.name
+    course.thumb_sp_mime = ref.mime
+    course.thumb_sp_size = int(ref.size or 0)
+    if variants_available():
+        course.thumbnail_token = thumbnail_token(data)
+        course.thumbnail_url = thumbnail_url(course)
+    else:
+        course.thumbnail_token = ""
+        course.thumbnail_url = ref.web_url
+    with transaction.atomic():
+        course.save(update_fields=[
+            "thumb_sp_drive_id", "thumb_sp_item_id", "thumb_sp_web_url", "thumb_sp_name", "thumb_sp_mime",
+            "thumb_sp_size", "thumbnail_token", "thumbnail_url", "updated_at",
+        ])
+        # queued after the save, so the cleanup worker no longer sees the old original referenced
+        if old_item_id and old_item_id != ref.item_id:
+            enqueue_file_cleanup(old_drive_id, old_item_id, f"thumbnail:{course.id}")
+    if course.thumbnail_token:
+        background.submit_on_commit(generate_course_thumbnails, course.id, course.thumbnail_token, data)
+
     course = Course.objects.prefetch_related("sections__videos").get(id=course.id)
     return Response(CreatorCourseDetailSerializer(course, context={"request": request}).data, status=status.HTTP_200_OK)
 
 
+@api_view(["GET"])
+@authentication_classes([])  # public images, loaded by <img> (no JWT, no token decode)
+@permission_classes([])
+def course_thumbnail(request, course_id, size):
+    """
+    ✅ Resized WebP course thumbnail (size: card / hero). URLs carry ?v=<token>
+    of the current image, so responses are cacheable for a long time.
+    """
+    if size not in VARIANTS:
+        return HttpResponse("Not found", status=404)
+
+    course = get_object_or_404(
+        Course.objects.only("id", "is_published", "thumbnail_token", "thumb_sp_drive_id", "thumb_sp_item_id"),
+        id=course_id,
+    )
+    if not (course.thumbnail_token and course.thumb_sp_drive_id and course.thumb_sp_item_id):
+        return HttpResponse("Not found", status=404)
+
+    etag = f'"{course.thumbnail_token}-{size}"'
+    if request.headers.get("If-None-Match") == etag:
+        resp = HttpResponse(status=304)
+    else:
+        path = variant_path(course.id, size, course.thumbnail_token)
+        if not path.exists():
+            path = None
+            # ✅ rendered inline only for published courses that have not just failed
+            if course.is_published and not recently_failed(course):
+                try:
+                    path = ensure_variant(course, size)
+                except ThumbnailError:
+                    path = None
+            else:
+                schedule_rerender(course)
+        if path is None:
+            resp = HttpResponse(PLACEHOLDER_WEBP, content_type="image/webp")
+            resp["Cache-Control"] = "no-store"
+            return resp
+        resp = FileResponse(open(path, "rb"), content_type="image/webp")
+
+    resp["ETag"] = etag
+    if request.query_params.get("v") == course.thumbnail_token:
+        resp["Cache-Control"] = f"public, max-age={settings.THUMBNAIL_CACHE_SECONDS}, immutable"
+    else:
+        # unversioned URL: revalidate so a new upload shows up
+        resp["Cache-Control"] = "public, max-age=300"
+    return resp
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def creator_video_upload(request, section_id):
@@ -1072,13 +1380,8 @@ def creator_video_upload(request, section_id):
     title = (request.data.get("video_title") or "").strip() or getattr(up, "name", "Uploaded video")
     filename = getattr(up, "name", "uploaded.mp4")
 
-    max_order = CourseVideo.objects.filter(section=section).aggregate(m=Max("order")).get("m") or 0
-    order = max_order + 1
-
     try:
         sp = SharePointStorage()
-        sp.ensure_course_storage_folder_name(course)
-
         ref = sp.upload_course_section_video(course=course, section=section, filename=filename, django_file=up)
 
         # ✅ NEW: build SharePoint embed SRC (Option A) and store it in embed_url
@@ -1088,6 +1391,9 @@ def creator_video_upload(request, section_id):
         except Exception:
             embed_src = ""
 
+        # allocated after the (slow) upload, so uploads running side by side
+        # never pick the same order
+        order = allocate_order(CourseSection, section.id, "next_video_order", CourseVideo.objects.filter(section=section))
         video = CourseVideo.objects.create(
             course=course,
             section=section,
@@ -1121,67 +1427,57 @@ def video_playback_url(request, video_id):
     if not ((video.sp_drive_id or "").strip() and (video.sp_item_id or "").strip()):
         return Response({"detail": "Video is not an uploaded SharePoint file."}, status=status.HTTP_400_BAD_REQUEST)
 
-    ttl = int(getattr(settings, "VIDEO_STREAM_SIGNED_URL_TTL_SECONDS", 900))
-    exp = int(time.time()) + ttl
-    sig = _sign_stream_params(video.id, exp)
+    # ✅ token carries drive/item/mime so video_stream needs no DB lookup (courses.playback)
+    token, expires = sign_playback(video)
 
     base = request.build_absolute_uri(reverse("video_stream", kwargs={"video_id": video.id}))
-    qs = urlencode({"exp": exp, "sig": sig})
-    return Response({"url": f"{base}?{qs}"})
+    qs = urlencode({"t": token})
+    return Response({"url": f"{base}?{qs}", "expires": expires})
 
 
 @api_view(["GET"])
-@permission_classes([])  # signed access only (no JWT)
+@authentication_classes([])  # signed access only (no JWT, no user lookup)
+@permission_classes([])
 def video_stream(request, video_id):
     try:
-        exp = int(request.query_params.get("exp") or "0")
-    except Exception:
-        exp = 0
-    sig = (request.query_params.get("sig") or "").strip()
-
-    if exp <= 0 or exp < int(time.time()):
+        grant = verify_playback(request.query_params.get("t") or "", video_id)
+    except PlaybackTokenExpired:
         return HttpResponse("Expired", status=403)
-
-    expected = _sign_stream_params(int(video_id), int(exp))
-    if not sig or not hmac.compare_digest(sig, expected):
+    except InvalidPlaybackToken:
         return HttpResponse("Forbidden", status=403)
 
-    video = get_object_or_404(CourseVideo.objects.select_related("course"), id=video_id)
-
-    if not ((video.sp_drive_id or "").strip() and (video.sp_item_id or "").strip()):
-        return HttpResponse("Not found", status=404)
-
-    range_header = request.headers.get("Range")
-    sp = SharePointStorage()
-    r = sp.download_stream(video.sp_drive_id, video.sp_item_id, range_header=range_header)
+    # ✅ Range / If-Range / 416 handled locally against cached item metadata (courses.streaming)
+    return serve_item(request, grant.drive_id, grant.item_id, mime=grant.mime)
 
-    if r.status_code >= 400:
-        return HttpResponse(f"Upstream error: {r.status_code}", status=502)
 
-    def _iter():
-        for chunk in r.iter_content(chunk_size=1024 * 256):
-            if chunk:
-                yield chunk
+# ============================================================
+# ✅ NEW: Creator Quiz Builder Endpoints (trainer-only)
+#    - Does NOT affect learner quiz behavior
+# ============================================================
 
-    status_code = 206 if range_header else 200
-    resp = StreamingHttpResponse(_iter(), status=status_code)
+def _quiz_edit_response(request, quiz, http_status, **delta):
+    """
+    ✅ Response after a quiz edit. Default: the whole quiz (as before).
+    With ?response=delta: only the changed/deleted entity plus the quiz version;
+    clients refetch the full quiz when the version is not the one they expect.
+    """
+    if (request.query_params.get("response") or "").lower() == "delta":
+        return _versioned(Response({"quiz_id": quiz.id, "version": quiz.version, **delta}, status=http_status), quiz.version)
 
-    ctype = (video.sp_mime or "").strip() or r.headers.get("Content-Type") or "application/octet-stream"
-    resp["Content-Type"] = ctype
-    resp["Accept-Ranges"] = "bytes"
+    quiz = CourseQuiz.objects.prefetch_related("questions__choices").get(id=quiz.id)
+    return _versioned(Response({"quiz": CreatorCourseQuizSerializer(quiz).data}, status=http_status), quiz.version)
 
-    if "Content-Range" in r.headers:
-        resp["Content-Range"] = r.headers["Content-Range"]
-    if "Content-Length" in r.headers:
-        resp["Content-Length"] = r.headers["Content-Length"]
-
-    return resp
 
+def _claim_quiz_version(request, quiz):
+    """
+    ✅ First step of a quiz edit, inside its transaction.atomic(): steps the
+    quiz version (row stays locked until commit), or returns a 412 when the
+    client's If-Match / "version" is stale.
+    """
+    if quiz.bump_version(expected_version(request)) is None:
+        return _version_conflict(CourseQuiz, quiz.id)
+    return None
 
-# ============================================================
-# ✅ NEW: Creator Quiz Builder Endpoints (trainer-only)
-#    - Does NOT affect learner quiz behavior
-# ============================================================
 
 @api_view(["GET", "POST", "PATCH", "DELETE"])
 @permission_classes([IsAuthenticated])
@@ -1238,16 +1534,48 @@ def creator_quiz_get_create_update_delete(request, course_id):
             changed.add("is_published")
 
         if changed:
-            quiz.save(update_fields=list(changed))
-
-        quiz = CourseQuiz.objects.prefetch_related("questions__choices").get(id=quiz.id)
-        return Response({"quiz": CreatorCourseQuizSerializer(quiz).data}, status=status.HTTP_200_OK)
+            with transaction.atomic():
+                resp = _claim_quiz_version(request, quiz)
+                if resp:
+                    return resp
+                quiz.save(update_fields=list(changed))
+
+        return _quiz_edit_response(
+            request, quiz, status.HTTP_200_OK,
+            changed={"type": "quiz", "data": {"id": quiz.id, "title": quiz.title, "is_published": quiz.is_published}},
+        )
 
     # DELETE
     quiz.delete()
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def creator_quiz_item_analysis(request, course_id):
+    """
+    ✅ Per-question difficulty + per-choice selection counts (maintained by quiz_submit).
+    """
+    ok, resp = _enforce_creator_ready(request.user)
+    if not ok:
+        return resp
+
+    ok, resp = _require_trainer_group(request)
+    if not ok:
+        return resp
+
+    try:
+        course = _get_creator_course_or_404(request.user, course_id)
+    except Course.DoesNotExist:
+        return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    quiz = CourseQuiz.objects.filter(course=course).first()
+    if not quiz:
+        return Response({"detail": "Quiz not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response(quiz_item_analysis(quiz), status=status.HTTP_200_OK)
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def creator_question_create(request, quiz_id):
@@ -1271,11 +1599,17 @@ def creator_question_create(request, quiz_id):
     if not prompt:
         return Response({"detail": "prompt is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-    max_order = QuizQuestion.objects.filter(quiz=quiz).aggregate(m=Max("order")).get("m") or 0
-    q = QuizQuestion.objects.create(quiz=quiz, prompt=prompt, order=max_order + 1)
+    with transaction.atomic():
+        resp = _claim_quiz_version(request, quiz)
+        if resp:
+            return resp
+        order = allocate_order(CourseQuiz, quiz.id, "next_question_order", QuizQuestion.objects.filter(quiz=quiz))
+        q = QuizQuestion.objects.create(quiz=quiz, prompt=prompt, order=order)
 
-    quiz = CourseQuiz.objects.prefetch_related("questions__choices").get(id=quiz.id)
-    return Response({"quiz": CreatorCourseQuizSerializer(quiz).data}, status=status.HTTP_201_CREATED)
+    return _quiz_edit_response(
+        request, quiz, status.HTTP_201_CREATED,
+        changed={"type": "question", "data": {"id": q.id, "order": q.order, "prompt": q.prompt, "choices": []}},
+    )
 
 
 @api_view(["PATCH", "DELETE"])
@@ -1302,19 +1636,28 @@ def creator_question_update_delete(request, question_id):
             return Response({"detail": "prompt cannot be empty"}, status=status.HTTP_400_BAD_REQUEST)
 
         if "prompt" in request.data:
-            q.prompt = prompt
-            q.save(update_fields=["prompt"])
-
-        quiz = CourseQuiz.objects.prefetch_related("questions__choices").get(id=q.quiz_id)
-        return Response({"quiz": CreatorCourseQuizSerializer(quiz).data}, status=status.HTTP_200_OK)
+            with transaction.atomic():
+                resp = _claim_quiz_version(request, q.quiz)
+                if resp:
+                    return resp
+                q.prompt = prompt
+                q.save(update_fields=["prompt"])
+
+        return _quiz_edit_response(
+            request, q.quiz, status.HTTP_200_OK,
+            changed={"type": "question", "data": CreatorQuizQuestionSerializer(q).data},
+        )
 
     # DELETE
-    quiz_id = q.quiz_id
-    q.delete()
-    quiz = CourseQuiz.objects.filter(id=quiz_id).prefetch_related("questions__choices").first()
-    if not quiz:
-        return Response(status=status.HTTP_204_NO_CONTENT)
-    return Response({"quiz": CreatorCourseQuizSerializer(quiz).data}, status=status.HTTP_200_OK)
+    deleted_id = q.id
+    with transaction.atomic():
+        resp = _claim_quiz_version(request, q.quiz)
+        if resp:
+            return resp
+        q.delete()
+    return _quiz_edit_response(
+        request, q.quiz, status.HTTP_200_OK, deleted={"type": "question", "id": deleted_id},
+    )
 
 
 @api_view(["POST"])
@@ -1346,14 +1689,20 @@ def creator_choice_create(request, question_id):
 
     is_correct = bool(request.data.get("is_correct", False))
 
-    QuizChoice.objects.create(
-        question=q,
-        text=text,
-        is_correct=is_correct,
-    )
+    with transaction.atomic():
+        resp = _claim_quiz_version(request, q.quiz)
+        if resp:
+            return resp
+        ch = QuizChoice.objects.create(
+            question=q,
+            text=text,
+            is_correct=is_correct,
+        )
 
-    quiz = CourseQuiz.objects.prefetch_related("questions__choices").get(id=q.quiz_id)
-    return Response({"quiz": CreatorCourseQuizSerializer(quiz).data}, status=status.HTTP_201_CREATED)
+    return _quiz_edit_response(
+        request, q.quiz, status.HTTP_201_CREATED,
+        changed={"type": "choice", "question_id": q.id, "data": CreatorQuizChoiceSerializer(ch).data},
+    )
 
 
 @api_view(["PATCH", "DELETE"])
@@ -1389,15 +1738,25 @@ def creator_choice_update_delete(request, choice_id):
             changed.add("is_correct")
 
         if changed:
-            ch.save(update_fields=list(changed))
-
-        quiz = CourseQuiz.objects.prefetch_related("questions__choices").get(id=ch.question.quiz_id)
-        return Response({"quiz": CreatorCourseQuizSerializer(quiz).data}, status=status.HTTP_200_OK)
+            with transaction.atomic():
+                resp = _claim_quiz_version(request, ch.question.quiz)
+                if resp:
+                    return resp
+                ch.save(update_fields=list(changed))
+
+        return _quiz_edit_response(
+            request, ch.question.quiz, status.HTTP_200_OK,
+            changed={"type": "choice", "question_id": ch.question_id, "data": CreatorQuizChoiceSerializer(ch).data},
+        )
 
     # DELETE
-    quiz_id = ch.question.quiz_id
-    ch.delete()
-    quiz = CourseQuiz.objects.filter(id=quiz_id).prefetch_related("questions__choices").first()
-    if not quiz:
-        return Response(status=status.HTTP_204_NO_CONTENT)
-    return Response({"quiz": CreatorCourseQuizSerializer(quiz).data}, status=status.HTTP_200_OK)
+    deleted_id = ch.id
+    with transaction.atomic():
+        resp = _claim_quiz_version(request, ch.question.quiz)
+        if resp:
+            return resp
+        ch.delete()
+    return _quiz_edit_response(
+        request, ch.question.quiz, status.HTTP_200_OK,
+        deleted={"type": "choice", "question_id": ch.question_id, "id": deleted_id},
+    )
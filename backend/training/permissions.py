@@ -4,6 +4,7 @@ from django.http import JsonResponse
 from django.conf import settings
 from rest_framework.permissions import BasePermission
 
+from users.authentication import trainer_from_claims
 from users.graph import is_user_in_group
 
 
@@ -40,6 +41,11 @@ def is_trainer_user(user) -> bool:
     if getattr(user, "is_staff", False) or getattr(user, "is_superuser", False):
         return True
 
+    # ✅ Trainer flag stamped in the app JWT (users.authentication), while valid
+    stamped = trainer_from_claims(user)
+    if stamped is not None:
+        return stamped
+
     group_id = getattr(settings, "LMS_TRAINERS_GROUP_ID", "") or ""
     oid = getattr(user, "azure_oid", None)
 
@@ -0,0 +1,149 @@
+# users/activity.py
+"""
+DAU / WAU / MAU from the append-only LoginEvent table.
+
+microsoft_login only inserts a LoginEvent. rollup_logins (run it from cron via
+`python manage.py rollup_logins`) folds events past the watermark into the
+UserDailyLogin / UserMonthlyLogin dedupe tables and recomputes the aggregates
+of the days they touch, so no request ever updates a shared counter row.
+
+Ids are allocated at insert but become visible at commit, so a lower id can
+appear after a higher one was folded (Postgres). Rollups therefore stop at
+the first row younger than ROLLUP_SAFETY_LAG_SECONDS (see settled_rows): the
+watermark only passes ids whose transactions have had that long to commit.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    DailyActiveUsers, LoginEvent, MonthlyActiveUsers, RollupWatermark, UserDailyLogin, UserMonthlyLogin,
+)
+
+WATERMARK = "login_events"
+
+
+def record_login(user) -> None:
+    LoginEvent.objects.create(user=user)
+
+
+def settled_rows(rows, at_index: int) -> list:
+    """
+    The leading rows (ordered by id) older than the safety lag. Any lower id
+    still uncommitted was allocated before them, so it is at least that old.
+    """
+    cutoff = timezone.now() - timedelta(seconds=int(getattr(settings, "ROLLUP_SAFETY_LAG_SECONDS", 300)))
+    for n, row in enumerate(rows):
+        if row[at_index] >= cutoff:
+            return rows[:n]
+    return rows
+
+
+def _active_users(first_day, last_day) -> int:
+    return (
+        UserDailyLogin.objects
+        .filter(date__gte=first_day, date__lte=last_day)
+        .values("user_id").distinct().count()
+    )
+
+
+def _recompute(day) -> None:
+    month_start = day.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+
+    dau = UserDailyLogin.objects.filter(date=day).count()
+    wau = _active_users(day - timedelta(days=6), day)
+    mau = _active_users(month_start, day)  # month to date, like wau ends on `day`
+
+    DailyActiveUsers.objects.update_or_create(date=day, defaults={"dau": dau, "wau": wau, "mau": mau})
+    MonthlyActiveUsers.objects.update_or_create(
+        year=day.year, month=day.month,
+        defaults={"active_users": _active_users(month_start, next_month - timedelta(days=1))},
+    )
+
+
+def _record_monthly_logins(rows) -> None:
+    """
+    One UserMonthlyLogin per (user, month) in rows, holding the earliest
+    event time; an event folded late (lower id, older) moves it back.
+    """
+    first = {}
+    for _, user_id, at in rows:
+        d = timezone.localdate(at)
+        key = (user_id, d.year, d.month)
+        if key not in first or at < first[key]:
+            first[key] = at
+
+    UserMonthlyLogin.objects.bulk_create(
+        [UserMonthlyLogin(user_id=u, year=y, month=m, first_login_at=at) for (u, y, m), at in first.items()],
+        ignore_conflicts=True,
+    )
+    existing = UserMonthlyLogin.objects.filter(
+        user_id__in={u for u, _, _ in first},
+        year__in={y for _, y, _ in first},
+        month__in={m for _, _, m in first},
+    )
+    later = []
+    for row in existing:
+        at = first.get((row.user_id, row.year, row.month))
+        if at is not None and at < row.first_login_at:
+            row.first_login_at = at
+            later.append(row)
+    UserMonthlyLogin.objects.bulk_update(later, ["first_login_at"])
+
+
+def rollup_logins(batch_size: int = 5000) -> dict:
+    """
+    Fold new LoginEvents into the dedupe tables and aggregates.
+    Idempotent; safe to run concurrently (the watermark row is locked).
+    """
+    events = 0
+    touched = set()
+
+    while True:
+        with transaction.atomic():
+            wm, _ = RollupWatermark.objects.get_or_create(name=WATERMARK)
+            wm = RollupWatermark.objects.select_for_update().get(pk=wm.pk)
+
+            rows = settled_rows(list(
+                LoginEvent.objects
+                .filter(id__gt=wm.position)
+                .order_by("id")
+                .values_list("id", "user_id", "at")[:batch_size]
+            ), 2)
+            if not rows:
+                break
+
+            daily = {(user_id, timezone.localdate(at)) for _, user_id, at in rows}
+            UserDailyLogin.objects.bulk_create(
+                [UserDailyLogin(user_id=u, date=d) for u, d in daily], ignore_conflicts=True,
+            )
+            _record_monthly_logins(rows)
+
+            wm.position = rows[-1][0]
+            wm.save(update_fields=["position", "updated_at"])
+
+            events += len(rows)
+            touched.update(d for _, d in daily)
+
+    # A login on day D also moves WAU of the following six days
+    today = timezone.localdate()
+    days = {d + timedelta(days=n) for d in touched for n in range(7)}
+    for day in sorted(d for d in days if d <= today):
+        _recompute(day)
+
+    return {"events": events, "days": len(days)}
+
+
+def prune_login_events(older_than_days: int) -> int:
+    """
+    Delete already-rolled-up events older than N days.
+    """
+    wm = RollupWatermark.objects.filter(name=WATERMARK).first()
+    if not wm:
+        return 0
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = LoginEvent.objects.filter(id__lte=wm.position, at__lt=cutoff).delete()
+    return deleted
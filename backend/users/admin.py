@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
-from .models import MonthlyActiveUsers, UserMonthlyLogin
+from .models import DailyActiveUsers, MonthlyActiveUsers, UserMonthlyLogin
 
 User = get_user_model()
 
@@ -36,3 +36,11 @@ class UserMonthlyLoginAdmin(admin.ModelAdmin):
     ordering = ("-first_login_at",)
     list_filter = ("year", "month")
     search_fields = ("user__email",)
+
+
+@admin.register(DailyActiveUsers)
+class DailyActiveUsersAdmin(admin.ModelAdmin):
+    # Precomputed by `manage.py rollup_logins`
+    list_display = ("date", "dau", "wau", "mau", "computed_at")
+    ordering = ("-date",)
+    date_hierarchy = "date"
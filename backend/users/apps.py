@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .authentication import user_deleted, user_saved
+
+        # ✅ deactivation / deletion revokes claim-based access tokens at once
+        post_save.connect(user_saved, sender=self.get_model("CustomUser"))
+        post_delete.connect(user_deleted, sender=self.get_model("CustomUser"))
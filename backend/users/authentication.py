@@ -0,0 +1,182 @@
+# users/authentication.py
+"""
+App-issued JWTs that carry the authorization-relevant user fields.
+
+microsoft_login (and token refresh) stamp an "lms" claim with role, the
+staff/superuser flags, azure_oid and the trainer flag (with its own, shorter
+expiry). ClaimsJWTAuthentication builds request.user from that claim without
+a query; every other field is deferred and the first access loads them all in
+one query (CustomUser.refresh_from_db). Tokens without the claim are handled
+exactly like SimpleJWT's JWTAuthentication.
+
+The claim carries is_active, and deactivating or deleting a user marks them
+revoked in the cache for one access-token lifetime (revoke_user), so
+claim-based tokens stop working at once instead of when they expire.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+CLAIM = "lms"
+
+
+def _claims_enabled() -> bool:
+    return bool(getattr(settings, "JWT_USER_CLAIMS_ENABLED", True))
+
+
+def _revoked_key(user_id) -> str:
+    return f"lms:user-revoked:{user_id}"
+
+
+def revoke_user(user_id) -> None:
+    """
+    Reject claim-based tokens of this user until they have all expired.
+    """
+    ttl = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()) + 60
+    cache.set(_revoked_key(user_id), True, timeout=ttl)
+
+
+def user_saved(sender, instance, **kwargs) -> None:
+    # post_save of the user model (users.apps)
+    if instance.is_active:
+        cache.delete(_revoked_key(instance.pk))
+    else:
+        revoke_user(instance.pk)
+
+
+def user_deleted(sender, instance, **kwargs) -> None:
+    revoke_user(instance.pk)
+
+
+def check_trainer(user) -> bool | None:
+    """
+    Live trainer-group check. None when it cannot be decided (Graph error),
+    so no claim is stamped and views fall back to their own check.
+    """
+    # imported here: DRF imports this module while loading its settings,
+    # before users.graph's dependencies are ready
+    from .graph import is_user_in_group
+
+    if user.is_staff or user.is_superuser:
+        return True
+
+    group_id = getattr(settings, "LMS_TRAINERS_GROUP_ID", "") or ""
+    if not group_id or not user.azure_oid:
+        return False
+
+    try:
+        return bool(is_user_in_group(user.azure_oid, group_id))
+    except Exception:
+        return None
+
+
+def build_claims(user, *, previous: dict | None = None) -> dict:
+    """
+    The "lms" claim for `user`. The trainer flag is reused from `previous`
+    while it is still valid, otherwise checked live.
+    """
+    now = int(time.time())
+    ttl = int(getattr(settings, "LMS_TRAINER_CLAIM_TTL_SECONDS", 900))
+
+    if previous and previous.get("trn") is not None and int(previous.get("trn_exp") or 0) > now:
+        trainer, trainer_exp = previous["trn"], previous["trn_exp"]
+    else:
+        trainer = check_trainer(user)
+        trainer_exp = now + ttl if trainer is not None else 0
+
+    return {
+        "role": user.role,
+        "staff": bool(user.is_staff),
+        "su": bool(user.is_superuser),
+        "oid": user.azure_oid,
+        "trn": trainer,
+        "trn_exp": trainer_exp,
+        "act": bool(user.is_active),
+    }
+
+
+def issue_tokens(user) -> RefreshToken:
+    """
+    Refresh/access pair for microsoft_login. The claim is put on the refresh
+    token so the access token derived from it carries it too.
+    """
+    refresh = RefreshToken.for_user(user)
+    if _claims_enabled():
+        refresh[CLAIM] = build_claims(user)
+    return refresh
+
+
+def trainer_from_claims(user) -> bool | None:
+    """
+    The trainer flag from the request's token, or None when absent/expired.
+    """
+    claims = getattr(user, "lms_claims", None)
+    if not claims or claims.get("trn") is None:
+        return None
+    if int(claims.get("trn_exp") or 0) <= time.time():
+        return None
+    return bool(claims["trn"])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves request.user from the "lms" claim
+    (no query) when the token has one.
+    """
+
+    def get_user(self, validated_token):
+        claims = validated_token.get(CLAIM)
+        if not claims or "act" not in claims or not _claims_enabled():
+            # no claim, or one stamped before is_active was: check the row
+            return super().get_user(validated_token)
+
+        User = get_user_model()
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if not claims["act"] or cache.get(_revoked_key(user_id)):
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+
+        # Only these fields come from the token; the rest stay deferred
+        fields = {
+            User._meta.pk.attname: User._meta.pk.to_python(user_id),
+            "role": claims.get("role"),
+            "azure_oid": claims.get("oid"),
+            "is_staff": bool(claims.get("staff")),
+            "is_superuser": bool(claims.get("su")),
+            "is_active": bool(claims["act"]),
+        }
+        # from_db takes the values in concrete-field order
+        names = [f.attname for f in User._meta.concrete_fields if f.attname in fields]
+        user = User.from_db(router.db_for_read(User), names, [fields[n] for n in names])
+        user.lms_claims = claims
+        return user
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Re-stamps the claim on refreshed access tokens from the current DB row,
+    so role changes apply within one access-token lifetime.
+    """
+
+    def validate(self, attrs):
+        previous = RefreshToken(attrs["refresh"]).payload.get(CLAIM)
+        data = super().validate(attrs)
+
+        if _claims_enabled():
+            access = AccessToken(data["access"])
+            user = get_user_model().objects.filter(
+                **{api_settings.USER_ID_FIELD: access[api_settings.USER_ID_CLAIM]}
+            ).first()
+            if user is not None:
+                access[CLAIM] = build_claims(user, previous=previous)
+                data["access"] = str(access)
+
+        return data
@@ -1,6 +1,9 @@
+import hashlib
+import threading
 import time
+from collections import OrderedDict
+
 import jwt
-from jwt import PyJWKClient
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -8,31 +11,59 @@ from django.contrib.auth import get_user_model
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
-
-_jwks_client_cache = {"client": None, "expires_at": 0}
+from .jwks import key_store
 
 
-def _jwks_client():
+class VerifiedTokenCache:
     """
-    Cache the JWKS client for a while to avoid fetching keys every request.
+    Bounded LRU of tokens that already passed full verification:
+    sha256(token) -> (user_id, exp). Entries die with the token's exp, so a
+    hit skips signature verification and the oid/email lookups.
     """
-    now = int(time.time())
-    if _jwks_client_cache["client"] and now < _jwks_client_cache["expires_at"]:
-        return _jwks_client_cache["client"]
 
-    tenant_id = settings.AZURE_TENANT_ID
-    jwks_url = f"https://login.microsoftonline.com/{tenant_id}/discovery/v2.0/keys"
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, digest: str):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return entry[0]
+
+    def put(self, digest: str, user_id: int, exp: int) -> None:
+        max_size = int(getattr(settings, "AZURE_TOKEN_CACHE_SIZE", 10000))
+        with self._lock:
+            self._entries[digest] = (user_id, exp)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest: str) -> None:
+        with self._lock:
+            self._entries.pop(digest, None)
 
-    client = PyJWKClient(jwks_url)
-    _jwks_client_cache["client"] = client
-    _jwks_client_cache["expires_at"] = now + 6 * 3600  # 6 hours
-    return client
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+verified_tokens = VerifiedTokenCache()
 
 
 def _expected_issuers():
     tid = settings.AZURE_TENANT_ID
     return {
-        f"https://login.microsoftonline.com/{tid}/v2.0",
+        f"{settings.AZURE_LOGIN_BASE_URL}/{tid}/v2.0",
         f"https://sts.windows.net/{tid}/",
     }
 
@@ -52,6 +83,7 @@ class AzureAdAccessTokenAuthentication(BaseAuthentication):
     - Prefer stable Entra OID for lookup/creation.
     - Fallback to case-insensitive email lookup.
     - Never create a second user due to casing differences.
+    - ✅ Verified tokens are remembered until exp (VerifiedTokenCache).
     """
 
     def authenticate(self, request):
@@ -63,9 +95,19 @@ class AzureAdAccessTokenAuthentication(BaseAuthentication):
         if not token:
             return None
 
+        User = get_user_model()
+
+        # ✅ Already verified (same bearer token, not yet expired): one pk lookup
+        digest = verified_tokens.digest(token)
+        user_id = verified_tokens.get(digest)
+        if user_id is not None:
+            user = User.objects.filter(pk=user_id, is_active=True).first()
+            if user:
+                return (user, None)
+            verified_tokens.discard(digest)
+
         try:
-            jwk_client = _jwks_client()
-            signing_key = jwk_client.get_signing_key_from_jwt(token).key
+            signing_key = key_store.signing_key_for_token(token)
 
             claims = jwt.decode(
                 token,
@@ -99,8 +141,6 @@ class AzureAdAccessTokenAuthentication(BaseAuthentication):
             if not oid and not email:
                 raise AuthenticationFailed("Token missing user identity (oid or preferred_username/upn/email).")
 
-            User = get_user_model()
-
             # ✅ 1) Prefer oid (best unique key)
             user = None
             if oid:
@@ -138,6 +178,9 @@ class AzureAdAccessTokenAuthentication(BaseAuthentication):
                 if changed:
                     user.save(update_fields=list(changed))
 
+            if user.is_active and claims.get("exp"):
+                verified_tokens.put(digest, user.pk, int(claims["exp"]))
+
             return (user, None)
 
         except AuthenticationFailed:
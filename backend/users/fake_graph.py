@@ -0,0 +1,600 @@
+# users/fake_graph.py
+"""
+In-memory stand-in for the parts of Microsoft Graph / Entra ID this backend uses.
+
+FakeGraph holds the state (trainer group, licenses, one SharePoint site with one
+document library, a signing key) and answers requests by method + path,
+independent of any transport:
+
+  - FakeGraph.patch() installs it in place of the `requests` module used by
+    users.graph and courses.sharepoint (tests, in-process benchmarks);
+  - FakeGraph.serve() exposes it over HTTP (python manage.py fake_graph), so a
+    dev server pointed at it with GRAPH_BASE_URL / AZURE_LOGIN_BASE_URL runs
+    fully offline.
+
+Latency, throttling (429 + Retry-After) and failure injection (503) apply to
+both transports.
+"""
+import base64
+import io
+import json as _json
+import mimetypes
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+UPLOAD_PREFIX = "/_upload/"
+
+DEFAULT_SKUS = {
+    "sku-f3": "SPE_F3",
+    "sku-e3": "ENTERPRISEPACK",
+}
+
+
+class FakeResponse:
+    """
+    The subset of requests.Response the Graph helpers read.
+    """
+
+    def __init__(self, status_code: int, body: bytes = b"", headers: dict | None = None):
+        self.status_code = status_code
+        self.content = body
+        self.headers = dict(headers or {})
+        self.raw = io.BytesIO(body)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return _json.loads(self.content or b"null")
+
+    def iter_content(self, chunk_size: int = 1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def _json_body(payload) -> tuple[bytes, dict]:
+    return _json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json"}
+
+
+def _merge(body_and_headers: tuple[bytes, dict], extra: dict) -> tuple[bytes, dict]:
+    body, headers = body_and_headers
+    return body, {**headers, **extra}
+
+
+def _b64url_uint(n: int) -> str:
+    raw = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+class FakeGraph:
+    """
+    Fake tenant. Routes mirror the Graph calls made in users.graph and
+    courses.sharepoint; anything else is answered with 404.
+    """
+
+    def __init__(self, *, trainer_oids=(), skus=None, user_licenses=None,
+                 site_host="aspectmaint.sharepoint.com", site_path="AspectVideosSorted", drive_name="Documents",
+                 latency_ms=0, jitter_ms=0, throttle_rps=0, failure_rate=0.0, fail_paths=None, seed=None):
+        self.trainer_oids = set(trainer_oids)
+        self.skus = dict(skus or DEFAULT_SKUS)
+        # user id/upn -> [skuId]
+        self.user_licenses = dict(user_licenses or {})
+
+        self.site_host = site_host
+        self.site_path = site_path
+        self.site_id = f"{site_host},{uuid.uuid4()},{uuid.uuid4()}"
+        self.drive_id = f"b!{uuid.uuid4().hex}"
+        self.drive_name = drive_name
+
+        # Fault injection
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rps = throttle_rps
+        self.failure_rate = failure_rate
+        self.fail_paths = re.compile(fail_paths) if fail_paths else None
+        self._rnd = random.Random(seed)
+        self._bucket = {"tokens": float(throttle_rps), "at": time.monotonic()}
+
+        self.calls = []
+        self._lock = threading.Lock()
+        self._signing_key = None
+        self.kid = uuid.uuid4().hex
+        self._items = {}          # item id -> item dict (content kept under "_content")
+        self._paths = {}          # lowercased path -> item id
+        self._sessions = {}       # upload session id -> {"path", "total", "buf"}
+        self._patches = []
+
+    # -----------------------------
+    # Seeding helpers
+    # -----------------------------
+    def add_file(self, path: str, content: bytes, mime: str | None = None) -> dict:
+        with self._lock:
+            return self._put_file(path, content, mime)
+
+    def item(self, item_id: str) -> dict | None:
+        return self._items.get(item_id)
+
+    def paths(self) -> list[str]:
+        return sorted(self._items[i]["_path"] for i in self._paths.values())
+
+    # -----------------------------
+    # Dispatch
+    # -----------------------------
+    def handle(self, method: str, url: str, *, headers=None, body: bytes = b"", json=None) -> FakeResponse:
+        method = method.upper()
+        parts = urlsplit(url)
+        path = unquote(parts.path)
+        query = parse_qs(parts.query)
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        if json is None and body and "json" in headers.get("content-type", ""):
+            json = _json.loads(body)
+
+        self.calls.append((method, url))
+
+        fault = self._inject_faults(path)
+        if fault is not None:
+            return fault
+
+        base = f"{parts.scheme}://{parts.netloc}"
+        if path.startswith(UPLOAD_PREFIX):
+            return self._upload_chunk(path, headers, body)
+
+        m = re.match(r"^/([^/]+)/oauth2/v2\.0/token$", path)
+        if m and method == "POST":
+            return FakeResponse(200, *_json_body({
+                "token_type": "Bearer",
+                "expires_in": 3599,
+                "access_token": f"fake-app-token-{uuid.uuid4().hex}",
+            }))
+
+        m = re.match(r"^/([^/]+)/discovery/v2\.0/keys$", path)
+        if m and method == "GET":
+            return FakeResponse(200, *_json_body({"keys": [self.jwk()]}))
+
+        # Test-only: mint an id_token for the login flow, e.g.
+        # POST /<tenant>/_fake/id_token {"aud": ..., "oid": ..., "preferred_username": ...}
+        m = re.match(r"^/([^/]+)/_fake/id_token$", path)
+        if m and method == "POST":
+            token = self.issue_id_token(json or {}, issuer=f"{base}/{m.group(1)}/v2.0", tenant_id=m.group(1))
+            return FakeResponse(200, *_json_body({"id_token": token}))
+
+        path = re.sub(r"^/v1\.0", "", path)
+        with self._lock:
+            if path == "/$batch" and method == "POST":
+                return self._batch(json or {}, base)
+            return self._route(method, path, query, headers, body, json or {}, base)
+
+    def _batch(self, payload, base) -> FakeResponse:
+        # JSON batching: up to 20 sub-requests, answered together (caller holds the lock)
+        requests_ = payload.get("requests") or []
+        if len(requests_) > 20:
+            return FakeResponse(400, *_json_body({"error": {"code": "invalidRequest"}}))
+        responses = []
+        for sub in requests_:
+            parts = urlsplit(sub.get("url") or "")
+            r = self._route(
+                (sub.get("method") or "GET").upper(), unquote(parts.path), parse_qs(parts.query),
+                {k.lower(): v for k, v in (sub.get("headers") or {}).items()}, b"", sub.get("body") or {}, base,
+            )
+            responses.append({"id": sub.get("id"), "status": r.status_code, "body": r.json() if r.content else None})
+        return FakeResponse(200, *_json_body({"responses": responses}))
+
+    def _inject_faults(self, path: str) -> FakeResponse | None:
+        if self.latency_ms or self.jitter_ms:
+            time.sleep((self.latency_ms + self._rnd.uniform(0, self.jitter_ms)) / 1000.0)
+
+        if self.throttle_rps:
+            with self._lock:
+                now = time.monotonic()
+                bucket = self._bucket
+                bucket["tokens"] = min(
+                    float(self.throttle_rps),
+                    bucket["tokens"] + (now - bucket["at"]) * self.throttle_rps,
+                )
+                bucket["at"] = now
+                if bucket["tokens"] < 1.0:
+                    return FakeResponse(429, *_merge(_json_body({
+                        "error": {"code": "TooManyRequests", "message": "Throttled by fake tenant"},
+                    }), {"Retry-After": "1"}))
+                bucket["tokens"] -= 1.0
+
+        if self.failure_rate and (self.fail_paths is None or self.fail_paths.search(path)):
+            if self._rnd.random() < self.failure_rate:
+                return FakeResponse(503, *_merge(_json_body({
+                    "error": {"code": "serviceNotAvailable", "message": "Injected failure"},
+                }), {"Retry-After": "1"}))
+
+        return None
+
+    def _route(self, method, path, query, headers, body, payload, base) -> FakeResponse:
+        m = re.match(r"^/users/([^/]+)/checkMemberGroups$", path)
+        if m and method == "POST":
+            groups = payload.get("groupIds") or []
+            hit = [g for g in groups if m.group(1) in self.trainer_oids]
+            return FakeResponse(200, *_json_body({"value": hit}))
+
+        m = re.match(r"^/users/([^/]+)$", path)
+        if m and method == "GET":
+            ident = m.group(1)
+            sku_ids = self.user_licenses.get(ident, [])
+            user_id = ident if "@" not in ident else str(uuid.uuid5(uuid.NAMESPACE_DNS, ident.lower()))
+            return FakeResponse(200, *_json_body({
+                "id": user_id,
+                "assignedLicenses": [{"skuId": s, "disabledPlans": []} for s in sku_ids],
+            }))
+
+        if path == "/subscribedSkus" and method == "GET":
+            return FakeResponse(200, *_json_body({
+                "value": [{"skuId": k, "skuPartNumber": v} for k, v in self.skus.items()],
+            }))
+
+        m = re.match(r"^/sites/([^/:]+):/sites/(.+)$", path)
+        if m and method == "GET":
+            if m.group(1).lower() != self.site_host.lower() or m.group(2).strip("/").lower() != self.site_path.lower():
+                return self._not_found(path)
+            return FakeResponse(200, *_json_body({"id": self.site_id, "name": self.site_path}))
+
+        m = re.match(r"^/sites/([^/]+)/drives$", path)
+        if m and method == "GET":
+            return FakeResponse(200, *_json_body({
+                "value": [{"id": self.drive_id, "name": self.drive_name, "driveType": "documentLibrary"}],
+            }))
+
+        m = re.match(r"^/drives/([^/]+)/(.*)$", path)
+        if m:
+            if m.group(1) != self.drive_id:
+                return self._not_found(path)
+            return self._drive_route(method, m.group(2), query, headers, payload, base)
+
+        return self._not_found(path)
+
+    def _drive_route(self, method, rest, query, headers, payload, base) -> FakeResponse:
+        # /root/children  |  /root:/<parent>:/children
+        m = re.match(r"^root(?::/(.+?):)?/children$", rest)
+        if m and method == "GET":
+            parent = (m.group(1) or "").strip("/").lower()
+            if parent and parent not in self._paths:
+                return self._not_found(parent)
+            prefix = f"{parent}/" if parent else ""
+            children = [
+                self._public(self._items[i]) for p, i in sorted(self._paths.items())
+                if p.startswith(prefix) and "/" not in p[len(prefix):]
+            ]
+            # one page of `$top` items, with an @odata.nextLink (skiptoken = offset)
+            top = int((query.get("$top") or ["200"])[0])
+            skip = int((query.get("$skiptoken") or ["0"])[0])
+            body = {"value": children[skip:skip + top]}
+            if skip + top < len(children):
+                link = f"/drives/{self.drive_id}/root" + (f":/{quote(parent)}:" if parent else "") + "/children"
+                body["@odata.nextLink"] = f"{base}/v1.0{link}?$top={top}&$skiptoken={skip + top}"
+            return FakeResponse(200, *_json_body(body))
+
+        if m and method == "POST":
+            parent = (m.group(1) or "").strip("/")
+            name = payload.get("name") or ""
+            full = f"{parent}/{name}" if parent else name
+            if full.lower() in self._paths:
+                if payload.get("@microsoft.graph.conflictBehavior") == "fail":
+                    return FakeResponse(409, *_json_body({"error": {"code": "nameAlreadyExists"}}))
+                return FakeResponse(200, *_json_body(self._public(self._items[self._paths[full.lower()]])))
+            if parent and parent.lower() not in self._paths:
+                return self._not_found(parent)
+            item = self._put_folder(full)
+            return FakeResponse(201, *_json_body(self._public(item)))
+
+        # /root:/<path>:/createUploadSession
+        m = re.match(r"^root:/(.+):/createUploadSession$", rest)
+        if m and method == "POST":
+            session_id = uuid.uuid4().hex
+            self._sessions[session_id] = {"path": m.group(1).strip("/"), "buf": bytearray(), "total": None}
+            return FakeResponse(200, *_json_body({
+                "uploadUrl": f"{base}{UPLOAD_PREFIX}{session_id}",
+                "expirationDateTime": "2099-01-01T00:00:00Z",
+            }))
+
+        # /root:/<path>
+        m = re.match(r"^root:/(.+?)/?$", rest)
+        if m:
+            item_id = self._paths.get(m.group(1).strip("/").lower())
+            if method == "GET":
+                if not item_id:
+                    return self._not_found(m.group(1))
+                return FakeResponse(200, *_json_body(self._public(self._items[item_id])))
+            if method == "DELETE":
+                if not item_id:
+                    return self._not_found(m.group(1))
+                self._delete_tree(self._items[item_id]["_path"])
+                return FakeResponse(204)
+
+        # /items/<id>/content
+        m = re.match(r"^items/([^/]+)/content$", rest)
+        if m and method == "GET":
+            item = self._items.get(m.group(1))
+            if not item or "_content" not in item:
+                return self._not_found(m.group(1))
+            return self._content(item, headers)
+
+        # /items/<id>
+        m = re.match(r"^items/([^/]+)$", rest)
+        if m:
+            item = self._items.get(m.group(1))
+            if not item:
+                return self._not_found(m.group(1))
+            if method == "GET":
+                return FakeResponse(200, *_json_body(self._public(item)))
+            if method == "DELETE":
+                self._delete_tree(item["_path"])
+                return FakeResponse(204)
+
+        return self._not_found(rest)
+
+    # -----------------------------
+    # Uploads / downloads
+    # -----------------------------
+    def _upload_chunk(self, path, headers, body) -> FakeResponse:
+        session_id = path.rsplit("/", 1)[-1]
+        with self._lock:
+            sess = self._sessions.get(session_id)
+            if not sess:
+                return self._not_found(path)
+
+            m = re.match(r"bytes (\d+)-(\d+)/(\d+)", headers.get("content-range", ""))
+            if not m:
+                return FakeResponse(400, *_json_body({"error": {"code": "invalidRange"}}))
+            start, end, total = (int(x) for x in m.groups())
+            if start != len(sess["buf"]) or end - start + 1 != len(body):
+                return FakeResponse(416, *_json_body({"error": {"code": "invalidRange"}}))
+
+            sess["buf"].extend(body)
+            if len(sess["buf"]) < total:
+                return FakeResponse(202, *_json_body({"nextExpectedRanges": [f"{len(sess['buf'])}-"]}))
+
+            del self._sessions[session_id]
+            item = self._put_file(sess["path"], bytes(sess["buf"]), None)
+            return FakeResponse(201, *_json_body(self._public(item)))
+
+    def _content(self, item, headers) -> FakeResponse:
+        data = item["_content"]
+        size = len(data)
+        base = {
+            "Content-Type": item["file"]["mimeType"],
+            "Accept-Ranges": "bytes",
+            "ETag": item["eTag"],
+        }
+
+        rng = headers.get("range")
+        m = re.match(r"^bytes=(\d*)-(\d*)$", (rng or "").strip())
+        if not m or (not m.group(1) and not m.group(2)):
+            return FakeResponse(200, data, {**base, "Content-Length": str(size)})
+
+        if m.group(1):
+            start = int(m.group(1))
+            end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+        else:
+            start = max(0, size - int(m.group(2)))
+            end = size - 1
+
+        if start >= size or start > end:
+            return FakeResponse(416, b"", {"Content-Range": f"bytes */{size}"})
+
+        chunk = data[start:end + 1]
+        return FakeResponse(206, chunk, {
+            **base,
+            "Content-Length": str(len(chunk)),
+            "Content-Range": f"bytes {start}-{end}/{size}",
+        })
+
+    # -----------------------------
+    # Item bookkeeping (caller holds the lock)
+    # -----------------------------
+    def _web_url(self, path: str) -> str:
+        return f"https://{self.site_host}/sites/{self.site_path}/{quote(self.drive_name)}/{quote(path)}"
+
+    def _new_item(self, path: str) -> dict:
+        name = path.rsplit("/", 1)[-1]
+        item_id = uuid.uuid4().hex.upper()
+        return {
+            "id": item_id,
+            "name": name,
+            "webUrl": self._web_url(path),
+            "eTag": f'"{{{uuid.uuid4()}}},1"',
+            "sharepointIds": {"listItemUniqueId": str(uuid.uuid4())},
+            "parentReference": {"driveId": self.drive_id},
+            "lastModifiedDateTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "_path": path,
+        }
+
+    def _put_folder(self, path: str) -> dict:
+        parent = path.rsplit("/", 1)[0] if "/" in path else ""
+        if parent and parent.lower() not in self._paths:
+            self._put_folder(parent)
+        existing = self._paths.get(path.lower())
+        if existing:
+            return self._items[existing]
+        item = self._new_item(path)
+        item["folder"] = {"childCount": 0}
+        item["size"] = 0
+        self._items[item["id"]] = item
+        self._paths[path.lower()] = item["id"]
+        return item
+
+    def _put_file(self, path: str, content: bytes, mime: str | None) -> dict:
+        path = path.strip("/")
+        parent = path.rsplit("/", 1)[0] if "/" in path else ""
+        if parent:
+            self._put_folder(parent)
+
+        existing = self._paths.get(path.lower())
+        item = self._items[existing] if existing else self._new_item(path)
+        item["size"] = len(content)
+        item["file"] = {"mimeType": mime or mimetypes.guess_type(path)[0] or "application/octet-stream"}
+        item["eTag"] = f'"{{{uuid.uuid4()}}},1"'
+        item["lastModifiedDateTime"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        item["_content"] = content
+        self._items[item["id"]] = item
+        self._paths[path.lower()] = item["id"]
+        return item
+
+    def _delete_tree(self, path: str) -> None:
+        prefix = path.lower() + "/"
+        for p in [p for p in self._paths if p == path.lower() or p.startswith(prefix)]:
+            self._items.pop(self._paths.pop(p), None)
+
+    def _public(self, item: dict) -> dict:
+        return {k: v for k, v in item.items() if not k.startswith("_")}
+
+    def _not_found(self, what) -> FakeResponse:
+        return FakeResponse(404, *_json_body({"error": {"code": "itemNotFound", "message": f"Not found: {what}"}}))
+
+    # -----------------------------
+    # Signing keys (JWKS / id_token)
+    # -----------------------------
+    def _key(self):
+        # RS256 needs `cryptography` (PyJWT[crypto]), which token verification
+        # requires anyway; generated lazily so the rest works without it.
+        if self._signing_key is None:
+            from cryptography.hazmat.primitives.asymmetric import rsa
+
+            self._signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        return self._signing_key
+
+    def jwk(self) -> dict:
+        numbers = self._key().public_key().public_numbers()
+        return {
+            "kty": "RSA",
+            "use": "sig",
+            "alg": "RS256",
+            "kid": self.kid,
+            "n": _b64url_uint(numbers.n),
+            "e": _b64url_uint(numbers.e),
+        }
+
+    def issue_id_token(self, claims: dict, *, issuer: str, tenant_id: str, lifetime: int = 3600) -> str:
+        import jwt
+
+        now = int(time.time())
+        payload = {
+            "iss": issuer,
+            "tid": tenant_id,
+            "iat": now,
+            "nbf": now,
+            "exp": now + lifetime,
+            "oid": str(uuid.uuid4()),
+            **claims,
+        }
+        return jwt.encode(payload, self._key(), algorithm="RS256", headers={"kid": self.kid})
+
+    # -----------------------------
+    # HTTP transport
+    # -----------------------------
+    def serve(self, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+        """
+        Serve this tenant over HTTP on a daemon thread. The bound address is
+        server.server_address; stop it with server.shutdown().
+        """
+        server = ThreadingHTTPServer((host, port), _handler_for(self))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    # -----------------------------
+    # `requests` stand-in
+    # -----------------------------
+    def request(self, method, url, *, headers=None, data=None, json=None, **kwargs) -> FakeResponse:
+        body = data if isinstance(data, (bytes, bytearray)) else b""
+        if isinstance(data, dict):
+            # form-encoded (token endpoint) – contents are not checked
+            body = b""
+        return self.handle(method, url, headers=headers, body=bytes(body), json=json)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def patch(self, targets=("users.graph.requests", "users.jwks.requests", "courses.sharepoint.requests")):
+        """
+        Replace `requests` in the Graph client modules with this fake.
+        Returns self so it can be used as a context manager.
+        """
+        from users import graph, jwks
+
+        graph.reset_caches()
+        jwks.key_store.reset()
+
+        fake_requests = SimpleNamespace(
+            Response=FakeResponse,
+            request=self.request,
+            get=self.get,
+            post=self.post,
+            put=self.put,
+            delete=self.delete,
+        )
+
+        for target in targets:
+            p = mock.patch(target, fake_requests)
+            p.start()
+            self._patches.append(p)
+        return self
+
+    def unpatch(self) -> None:
+        from users import graph, jwks
+
+        for p in reversed(self._patches):
+            p.stop()
+        self._patches = []
+        # never leave a fake token/key in the shared cache for the real tenant
+        graph.reset_caches()
+        jwks.key_store.reset()
+
+    def __enter__(self):
+        return self.patch()
+
+    def __exit__(self, *exc):
+        self.unpatch()
+        return False
+
+
+def _handler_for(graph: FakeGraph):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _dispatch(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            url = f"http://{self.headers.get('Host') or '%s:%s' % self.server.server_address}{self.path}"
+            resp = graph.handle(self.command, url, headers=dict(self.headers), body=body)
+
+            self.send_response(resp.status_code)
+            for k, v in resp.headers.items():
+                if k.lower() != "content-length":
+                    self.send_header(k, v)
+            self.send_header("Content-Length", str(len(resp.content)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(resp.content)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = do_HEAD = _dispatch
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
@@ -1,30 +1,52 @@
-import time
 import requests
 from urllib.parse import quote
 from django.conf import settings
 
+from config.instrumentation import graph_timer
+from config.shared_cache import SharedValue
+
 # -------------------------------------------------
-# In-memory caches (process-local)
+# Shared caches (see config.shared_cache)
 # -------------------------------------------------
+# The app token and SKU map are shared by every worker and renewed in the
+# background before they expire, so only a cold start waits for Graph.
+
+
+def _cache_key(name: str) -> str:
+    # Scoped to the tenant/app (and login host, so the fake tenant never
+    # shares entries with the real one)
+    return f"lms:graph:{name}:{settings.AZURE_AUTHORITY}:{settings.AZURE_CLIENT_ID}"
+
+
+def _renew_before() -> int:
+    return int(getattr(settings, "GRAPH_CACHE_RENEW_BEFORE_SECONDS", 300))
+
+
+_app_token = SharedValue(
+    lambda: _cache_key("app_token"), lambda: _fetch_graph_app_token(), renew_before=_renew_before,
+)
+_sku_map = SharedValue(
+    lambda: _cache_key("sku_map"), lambda: _fetch_sku_id_to_partnumber(), renew_before=_renew_before,
+)
+
 
-_token_cache = {"access_token": None, "expires_at": 0}
-_sku_cache = {"map": None, "expires_at": 0}
+def reset_caches() -> None:
+    """
+    Drop the token/SKU map from the process and the shared cache.
+    """
+    _app_token.reset()
+    _sku_map.reset()
 
 
 # -------------------------------------------------
 # App-only Microsoft Graph token
 # -------------------------------------------------
 
-def _get_graph_app_token() -> str:
+def _fetch_graph_app_token() -> tuple[str, int]:
     """
-    Gets an app-only Microsoft Graph token using client_credentials.
-    Uses an in-memory cache to avoid requesting a token on every call.
+    Requests an app-only Microsoft Graph token using client_credentials.
+    Returns (access_token, lifetime_seconds).
     """
-    now = int(time.time())
-
-    if _token_cache["access_token"] and now < _token_cache["expires_at"] - 60:
-        return _token_cache["access_token"]
-
     url = f"{settings.AZURE_AUTHORITY}/oauth2/v2.0/token"
 
     data = {
@@ -39,7 +61,8 @@ def _get_graph_app_token() -> str:
         ),
     }
 
-    r = requests.post(url, data=data, timeout=15)
+    with graph_timer():
+        r = requests.post(url, data=data, timeout=15)
 
     # ✅ DO NOT hide Azure AD error payloads
     if r.status_code >= 400:
@@ -58,11 +81,15 @@ def _get_graph_app_token() -> str:
         )
 
     j = r.json()
+    return j["access_token"], int(j.get("expires_in", 3600))
 
-    _token_cache["access_token"] = j["access_token"]
-    _token_cache["expires_at"] = now + int(j.get("expires_in", 3600))
 
-    return _token_cache["access_token"]
+def _get_graph_app_token() -> str:
+    """
+    Gets the app-only Microsoft Graph token from the shared cache
+    (fetching it only on a cold start).
+    """
+    return _app_token.get()
 
 
 # -------------------------------------------------
@@ -80,19 +107,27 @@ def get_graph_app_token() -> str:
 # Low-level Graph helpers
 # -------------------------------------------------
 
+def graph_url(path: str) -> str:
+    """
+    Absolute Graph URL for a /v1.0-relative path (settings.GRAPH_BASE_URL).
+    """
+    return f"{settings.GRAPH_BASE_URL}{path}"
+
+
 def _graph_get(path: str) -> dict:
     """
     Performs a GET against Microsoft Graph with the app-only token.
     On failure, raises RuntimeError with Graph's error body.
     """
     token = _get_graph_app_token()
-    url = f"https://graph.microsoft.com/v1.0{path}"
+    url = graph_url(path)
 
-    r = requests.get(
-        url,
-        headers={"Authorization": f"Bearer {token}"},
-        timeout=15,
-    )
+    with graph_timer():
+        r = requests.get(
+            url,
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=15,
+        )
 
     if r.status_code >= 400:
         raise RuntimeError(f"Graph {r.status_code} for {path}: {r.text}")
@@ -104,22 +139,25 @@ def _graph_get(path: str) -> dict:
 # License / SKU helpers
 # -------------------------------------------------
 
+def _fetch_sku_id_to_partnumber() -> tuple[dict, int]:
+    data = _graph_get("/subscribedSkus?$select=skuId,skuPartNumber")
+    m = {item["skuId"]: item.get("skuPartNumber", "") for item in data.get("value", [])}
+    return m, 6 * 3600  # 6 hours
+
+
 def _get_sku_id_to_partnumber() -> dict:
     """
     Cache tenant subscribed SKUs so we can map skuId -> skuPartNumber.
     """
-    now = int(time.time())
-
-    if _sku_cache["map"] and now < _sku_cache["expires_at"] - 60:
-        return _sku_cache["map"]
-
-    data = _graph_get("/subscribedSkus?$select=skuId,skuPartNumber")
-    m = {item["skuId"]: item.get("skuPartNumber", "") for item in data.get("value", [])}
+    return _sku_map.get()
 
-    _sku_cache["map"] = m
-    _sku_cache["expires_at"] = now + 6 * 3600  # 6 hours
 
-    return m
+def warm_graph_caches() -> None:
+    """
+    Fetch the app token and SKU map ahead of the first request (config.startup).
+    """
+    _get_graph_app_token()
+    _get_sku_id_to_partnumber()
 
 
 def get_user_licenses_and_object_id(user_identifier: str) -> tuple[list[str], str | None]:
@@ -177,20 +215,18 @@ def is_user_in_group(user_object_id: str, group_object_id: str) -> bool:
 
     token = _get_graph_app_token()
 
-    url = (
-        "https://graph.microsoft.com/v1.0"
-        f"/users/{quote(user_object_id, safe='')}/checkMemberGroups"
-    )
-
-    r = requests.post(
-        url,
-        headers={
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        },
-        json={"groupIds": [group_object_id]},
-        timeout=15,
-    )
+    url = graph_url(f"/users/{quote(user_object_id, safe='')}/checkMemberGroups")
+
+    with graph_timer():
+        r = requests.post(
+            url,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+            },
+            json={"groupIds": [group_object_id]},
+            timeout=15,
+        )
 
     if r.status_code >= 400:
         raise RuntimeError(f"Graph {r.status_code} checkMemberGroups: {r.text}")
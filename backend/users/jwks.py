@@ -0,0 +1,112 @@
+# users/jwks.py
+"""
+Entra signing keys for RS256 verification (token_verify, azure_auth).
+
+The JWKS document is a SharedValue (config.shared_cache): fetched once per
+cache, warmed at startup and renewed in the background. Each process keeps
+the parsed keys by `kid`, so verifying a token never fetches or parses keys
+on the request path. The only exception is an unknown kid (key rollover),
+which forces at most one refetch per JWKS_FORCED_REFRESH_INTERVAL_SECONDS.
+"""
+import logging
+import threading
+import time
+
+import jwt
+import requests
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+
+from config.instrumentation import graph_timer
+from config.shared_cache import HARD_EXPIRY_MARGIN_SECONDS, SharedValue
+
+logger = logging.getLogger(__name__)
+
+
+def jwks_url() -> str:
+    tenant_id = getattr(settings, "AZURE_TENANT_ID", "") or ""
+    if not tenant_id:
+        raise AuthenticationFailed("Server misconfiguration: AZURE_TENANT_ID missing")
+    return f"{settings.AZURE_LOGIN_BASE_URL}/{tenant_id}/discovery/v2.0/keys"
+
+
+def _fetch_jwks() -> tuple[dict, int]:
+    url = jwks_url()
+    with graph_timer():
+        r = requests.get(url, timeout=10)
+    if r.status_code >= 400:
+        raise RuntimeError(f"JWKS fetch failed: GET {url} -> {r.status_code} {r.text}")
+    return r.json(), int(getattr(settings, "JWKS_CACHE_TTL_SECONDS", 6 * 3600))
+
+
+def _kids(jwks: dict) -> set:
+    return {k.get("kid") for k in (jwks or {}).get("keys", [])}
+
+
+class JwksKeyStore:
+    def __init__(self):
+        self._jwks = SharedValue(
+            lambda: f"lms:jwks:{settings.AZURE_LOGIN_BASE_URL}:{settings.AZURE_TENANT_ID}",
+            lambda: _fetch_jwks(),
+            renew_before=lambda: getattr(settings, "JWKS_CACHE_RENEW_BEFORE_SECONDS", 3600),
+        )
+        self._lock = threading.Lock()
+        self._parsed_for = None  # the JWKS document self._keys was built from
+        self._keys = {}
+        self._last_forced = 0.0
+
+    def _parse(self, jwks: dict) -> dict:
+        with self._lock:
+            if jwks is not self._parsed_for:
+                keys = {}
+                for jwk in (jwks or {}).get("keys", []):
+                    try:
+                        keys[jwk.get("kid")] = jwt.PyJWK(jwk).key
+                    except Exception as e:
+                        logger.warning("Skipping JWKS key %s: %s", jwk.get("kid"), e)
+                self._keys = keys
+                self._parsed_for = jwks
+            return self._keys
+
+    def warm(self) -> None:
+        self._parse(self._jwks.get())
+
+    def signing_key(self, kid: str):
+        keys = self._parse(self._jwks.get())
+        if kid in keys:
+            return keys[kid]
+
+        # Unknown kid: maybe another worker already has the rolled-over keys,
+        # otherwise refetch (rate-limited so bogus kids cannot hammer Entra).
+        interval = int(getattr(settings, "JWKS_FORCED_REFRESH_INTERVAL_SECONDS", 60))
+        with self._lock:
+            if time.time() - self._last_forced < interval:
+                raise AuthenticationFailed("Unknown token signing key")
+            self._last_forced = time.time()
+
+        entry = self._jwks.refresh(
+            min_remaining=HARD_EXPIRY_MARGIN_SECONDS, wait=True, accept=lambda v: kid in _kids(v),
+        )
+        keys = self._parse(entry["value"])
+        if kid not in keys:
+            raise AuthenticationFailed("Unknown token signing key")
+        return keys[kid]
+
+    def signing_key_for_token(self, token: str):
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.PyJWTError as e:
+            raise AuthenticationFailed(f"Malformed token: {e}")
+        if not kid:
+            raise AuthenticationFailed("Token has no kid")
+        return self.signing_key(kid)
+
+    def reset(self) -> None:
+        self._jwks.reset()
+        with self._lock:
+            self._parsed_for = None
+            self._keys = {}
+            self._last_forced = 0.0
+
+
+key_store = JwksKeyStore()
@@ -0,0 +1,101 @@
+# users/licensing.py
+"""
+License snapshot -> role derivation, kept off the login critical path.
+
+microsoft_login only blocks on Graph for users that have never had a snapshot;
+everyone else logs in with their stored role and, when the snapshot is older
+than LICENSE_REFRESH_TTL_SECONDS, gets refreshed in the background.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from config import background
+
+from .graph import get_user_licenses_and_object_id, suggest_role_from_skus
+
+
+def license_snapshot_is_stale(user) -> bool:
+    refreshed = getattr(user, "licenses_refreshed_at", None)
+    if refreshed is None:
+        return True
+    ttl = int(getattr(settings, "LICENSE_REFRESH_TTL_SECONDS", 24 * 3600))
+    return timezone.now() - refreshed >= timedelta(seconds=ttl)
+
+
+def apply_license_snapshot(user, *, keep_on_error: bool = False) -> set:
+    """
+    Fetch licenses from Graph and update role / suggested_role / licenses on
+    `user` in memory. Returns the changed field names (caller saves).
+
+    On Graph failure the error is recorded in suggested_role_reason, unless
+    keep_on_error is set, in which case the previous snapshot is left alone
+    and retried on a later login.
+    """
+    changed = set()
+
+    try:
+        ident = user.azure_oid or user.email
+        sku_parts, resolved_object_id = get_user_licenses_and_object_id(ident)
+    except Exception as e:
+        if keep_on_error:
+            return changed
+        msg = f"Graph lookup failed: {e}"
+        if user.suggested_role is not None or user.suggested_role_reason != msg:
+            user.suggested_role = None
+            user.suggested_role_reason = msg
+            changed.update({"suggested_role", "suggested_role_reason"})
+        return changed
+
+    if resolved_object_id and user.azure_oid != resolved_object_id:
+        user.azure_oid = resolved_object_id
+        changed.add("azure_oid")
+
+    sug_role, reason = suggest_role_from_skus(sku_parts)
+
+    if user.suggested_role != sug_role:
+        user.suggested_role = sug_role
+        changed.add("suggested_role")
+
+    if user.suggested_role_reason != reason:
+        user.suggested_role_reason = reason
+        changed.add("suggested_role_reason")
+
+    licenses_str = ",".join(sku_parts or [])
+    if user.licenses != licenses_str:
+        user.licenses = licenses_str
+        changed.add("licenses")
+
+    # Role derived from license unless staff/superuser
+    if not (user.is_superuser or user.is_staff):
+        new_role = sug_role if sug_role in ("office", "field") else None
+        if user.role != new_role:
+            user.role = new_role
+            changed.add("role")
+
+    user.licenses_refreshed_at = timezone.now()
+    changed.add("licenses_refreshed_at")
+    return changed
+
+
+def refresh_user_licenses(user_id: int) -> None:
+    """
+    Background job: re-read the user (the request's copy may be outdated)
+    and store a fresh snapshot.
+    """
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None or not license_snapshot_is_stale(user):
+        return
+
+    changed = apply_license_snapshot(user, keep_on_error=True)
+    if changed:
+        user.save(update_fields=list(changed))
+
+
+def schedule_license_refresh(user) -> bool:
+    """
+    Queue a background refresh unless one is already in flight for this user.
+    """
+    return background.submit_once(f"licenses:{user.pk}", refresh_user_licenses, user.pk)
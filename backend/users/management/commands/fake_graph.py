@@ -0,0 +1,71 @@
+# users/management/commands/fake_graph.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.fake_graph import FakeGraph
+
+
+class Command(BaseCommand):
+    """
+    Run the fake Graph / Entra tenant (users.fake_graph) as a local HTTP server.
+
+    Point a dev server at it to exercise login, trainer checks, uploads and
+    streaming offline:
+
+      python manage.py fake_graph --port 8765 --trainer-oid <oid>
+      GRAPH_BASE_URL=http://127.0.0.1:8765/v1.0 \\
+      AZURE_LOGIN_BASE_URL=http://127.0.0.1:8765 python manage.py runserver
+    """
+
+    help = "Serve a fake Microsoft Graph / SharePoint / Entra tenant over HTTP."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--trainer-oid", action="append", default=[],
+                            help="Object id that is a member of every group (repeatable)")
+        parser.add_argument("--license", action="append", default=[], metavar="USER=SKU_ID",
+                            help="Assign a SKU id to a user id/UPN (repeatable)")
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every response")
+        parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random extra latency, 0..N ms")
+        parser.add_argument("--throttle-rps", type=float, default=0.0,
+                            help="Answer 429 + Retry-After above this request rate (0 = off)")
+        parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered 503")
+        parser.add_argument("--fail-paths", default=None, help="Regex; only matching paths get injected failures")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **opts):
+        licenses = {}
+        for entry in opts["license"]:
+            user, sep, sku = entry.partition("=")
+            if not sep or not user or not sku:
+                raise CommandError(f"--license expects USER=SKU_ID, got {entry!r}")
+            licenses.setdefault(user, []).append(sku)
+
+        graph = FakeGraph(
+            trainer_oids=opts["trainer_oid"],
+            user_licenses=licenses,
+            latency_ms=opts["latency_ms"],
+            jitter_ms=opts["jitter_ms"],
+            throttle_rps=opts["throttle_rps"],
+            failure_rate=opts["failure_rate"],
+            fail_paths=opts["fail_paths"],
+            seed=opts["seed"],
+        )
+        server = graph.serve(opts["host"], opts["port"])
+        host, port = server.server_address[:2]
+        base = f"http://{host}:{port}"
+
+        self.stdout.write(f"Fake tenant listening on {base}")
+        self.stdout.write(f"  GRAPH_BASE_URL={base}/v1.0")
+        self.stdout.write(f"  AZURE_LOGIN_BASE_URL={base}")
+
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            self.stdout.write(f"Stopped after {len(graph.calls)} requests.")
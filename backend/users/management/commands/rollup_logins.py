@@ -0,0 +1,26 @@
+# users/management/commands/rollup_logins.py
+from django.core.management.base import BaseCommand
+
+from users.activity import prune_login_events, rollup_logins
+
+
+class Command(BaseCommand):
+    """
+    Fold new login events into DAU / WAU / MAU (users.activity). Run it from
+    cron every few minutes; it only reads events past its watermark.
+    """
+
+    help = "Roll up login events into daily/weekly/monthly active users."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--prune-days", type=int, default=None,
+                            help="Afterwards delete rolled-up events older than N days")
+
+    def handle(self, *args, **opts):
+        result = rollup_logins(batch_size=opts["batch_size"])
+        self.stdout.write(f"Rolled up {result['events']} login events ({result['days']} days recomputed).")
+
+        if opts["prune_days"] is not None:
+            deleted = prune_login_events(opts["prune_days"])
+            self.stdout.write(f"Pruned {deleted} login events.")
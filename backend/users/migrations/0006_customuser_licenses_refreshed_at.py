@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_alter_customuser_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='licenses_refreshed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_login_events_and_active_user_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='usermonthlylogin',
+            name='first_login_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class CustomUser(AbstractUser):
@@ -24,6 +25,9 @@ class CustomUser(AbstractUser):
 
     licenses = models.TextField(blank=True, null=True)
 
+    # ✅ NEW: when the licenses/suggested_role snapshot was last read from Graph
+    licenses_refreshed_at = models.DateTimeField(blank=True, null=True)
+
     # creator permission (separate from office/field role)
     can_create_courses = models.BooleanField(default=False, db_index=True)
 
@@ -46,6 +50,16 @@ class CustomUser(AbstractUser):
 
         super().save(*args, **kwargs)
 
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # ✅ A user built from JWT claims (users.authentication) defers every
+        # other field; load all of them on first touch instead of one query
+        # per attribute.
+        if fields and getattr(self, "lms_claims", None) is not None:
+            deferred = self.get_deferred_fields()
+            if deferred and set(fields) <= deferred:
+                fields = list(deferred)
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
     def __str__(self):
         return self.email_display or self.email
 
@@ -53,11 +67,12 @@ class CustomUser(AbstractUser):
 class UserMonthlyLogin(models.Model):
     """
     Dedupe table: one row per (user, year, month) for first login in that month.
+    first_login_at is the earliest login event seen, not when it was rolled up.
     """
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="monthly_logins")
     year = models.PositiveIntegerField(db_index=True)
     month = models.PositiveIntegerField(db_index=True)
-    first_login_at = models.DateTimeField(auto_now_add=True)
+    first_login_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         constraints = [
@@ -83,3 +98,58 @@ class MonthlyActiveUsers(models.Model):
 
     def __str__(self):
         return f"MAU {self.year}-{self.month:02d}: {self.active_users}"
+
+
+class LoginEvent(models.Model):
+    """
+    ✅ Append-only: one row per successful microsoft_login. Never updated, so
+    concurrent logins never contend; users.activity.rollup_logins folds these
+    into the dedupe tables and the DAU/WAU/MAU aggregates.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="login_events")
+    at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.at:%Y-%m-%d %H:%M}"
+
+
+class UserDailyLogin(models.Model):
+    """
+    Dedupe table: one row per (user, day) with a login.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="daily_logins")
+    date = models.DateField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "date"], name="uniq_user_day_login")
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}"
+
+
+class DailyActiveUsers(models.Model):
+    """
+    Aggregated DAU / WAU (7 days ending on `date`) / MAU (month to date).
+    """
+    date = models.DateField(unique=True)
+    dau = models.PositiveIntegerField(default=0)
+    wau = models.PositiveIntegerField(default=0)
+    mau = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.date}: DAU {self.dau} / WAU {self.wau} / MAU {self.mau}"
+
+
+class RollupWatermark(models.Model):
+    """
+    Position (last processed id) of an incremental rollup over an append-only table.
+    """
+    name = models.CharField(max_length=64, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
@@ -1,3 +1,468 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+import jwt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from config.instrumentation import route_stats_store
+from courses.benchmarking import seed_catalog
+from courses.tests import FakeGraphMixin, QueryBudgetMixin
+
+from . import graph as graph_client
+from .authentication import ClaimsJWTAuthentication, issue_tokens
+from .activity import rollup_logins
+from .azure_auth import AzureAdAccessTokenAuthentication, verified_tokens
+from .fake_graph import FakeGraph
+from .jwks import JwksKeyStore
+from .models import DailyActiveUsers, LoginEvent, MonthlyActiveUsers, UserMonthlyLogin
+
+
+class UserEndpointQueryBudgetTests(FakeGraphMixin, QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        data = seed_catalog()
+        cls.learner = data["learners"][0]
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.learner)
+
+    def test_my_learning(self):
+        r = self.assertMaxQueries(1, self.client.get, "/api/my-learning/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json()), 20)
+        self.assertEqual(self.graph.calls, [])
+
+    def test_navigation(self):
+        r = self.assertMaxQueries(1, self.client.get, "/api/navigation/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(self.graph.calls, [])
+
+
+class FakeGraphServerTests(SimpleTestCase):
+    """
+    The real Graph/SharePoint clients against the fake tenant over HTTP.
+    """
+
+    def setUp(self):
+        self.graph = FakeGraph(trainer_oids={"oid-trainer"}, user_licenses={"a@example.com": ["sku-f3"]})
+        server = self.graph.serve()
+        self.addCleanup(server.shutdown)
+        base = "http://%s:%s" % server.server_address[:2]
+
+        settings_override = override_settings(
+            GRAPH_BASE_URL=f"{base}/v1.0",
+            AZURE_LOGIN_BASE_URL=base,
+            AZURE_AUTHORITY=f"{base}/tenant",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        graph_client.reset_caches()
+        self.addCleanup(graph_client.reset_caches)
+
+    def test_trainer_check_and_licenses(self):
+        self.assertTrue(graph_client.is_user_in_group("oid-trainer", "group-1"))
+        self.assertFalse(graph_client.is_user_in_group("oid-learner", "group-1"))
+        skus, oid = graph_client.get_user_licenses_and_object_id("a@example.com")
+        self.assertEqual(skus, ["SPE_F3"])
+        self.assertTrue(oid)
+
+    def test_upload_and_ranged_download(self):
+        from courses.sharepoint import SharePointStorage
+
+        sp = SharePointStorage()
+        sp.ensure_folder("office/Course A")
+        upload_url = sp.create_upload_session("office/Course A/clip.mp4")
+        payload = bytes(range(256)) * 40
+        item = sp.upload_file_via_session(upload_url, SimpleUploadedFile("clip.mp4", payload), chunk_size=4096)
+
+        r = sp.download_stream(sp.drive_id(), item["id"], range_header="bytes=100-199")
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r.content, payload[100:200])
+        self.assertEqual(r.headers["Content-Range"], f"bytes 100-199/{len(payload)}")
+
+    def test_throttling_and_injected_failures(self):
+        graph_client.get_graph_app_token()  # cached, so each call below is one request
+        self.graph.throttle_rps = 1
+        self.graph._bucket["tokens"] = 1.0
+        self.assertTrue(graph_client.is_user_in_group("oid-trainer", "group-1"))
+        with self.assertRaisesRegex(RuntimeError, "429"):
+            graph_client.is_user_in_group("oid-trainer", "group-1")
+
+        self.graph.throttle_rps = 0
+        self.graph.failure_rate = 1.0
+        with self.assertRaisesRegex(RuntimeError, "503"):
+            graph_client.get_user_licenses_and_object_id("a@example.com")
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True, LICENSE_REFRESH_TTL_SECONDS=3600)
+class LoginLicenseRefreshTests(TestCase):
+    """
+    Only first logins wait for Graph; stale snapshots refresh after the response.
+    """
+
+    claims = {"oid": "oid-1", "tid": "tid-1", "preferred_username": "Field.Eng@example.com", "name": "Field Eng"}
+
+    def setUp(self):
+        self.graph = FakeGraph(user_licenses={"oid-1": ["sku-f3"]}).patch()
+        self.addCleanup(self.graph.unpatch)
+        verify = mock.patch("users.views.verify_microsoft_id_token", return_value=self.claims)
+        verify.start()
+        self.addCleanup(verify.stop)
+
+    def login(self):
+        r = APIClient().post("/api/auth/microsoft/", {"id_token": "x"}, format="json")
+        self.assertEqual(r.status_code, 200)
+        return r.json()["user"]
+
+    def graph_paths(self):
+        return [url for method, url in self.graph.calls if "/users/" in url]
+
+    def test_first_login_blocks_for_snapshot(self):
+        self.assertEqual(self.login()["role"], "field")
+        self.assertEqual(len(self.graph_paths()), 1)
+        self.assertIsNotNone(get_user_model().objects.get(azure_oid="oid-1").licenses_refreshed_at)
+
+    def test_fresh_snapshot_skips_graph(self):
+        self.login()
+        self.graph.calls.clear()
+        self.login()
+        self.assertEqual(self.graph.calls, [])
+        # logins only append events; counters are left to the rollup
+        self.assertEqual(LoginEvent.objects.count(), 2)
+        self.assertFalse(MonthlyActiveUsers.objects.exists())
+
+    def test_stale_snapshot_refreshes_in_background(self):
+        get_user_model().objects.create(
+            email="field.eng@example.com", username="field.eng", azure_oid="oid-1",
+            role="office", licenses="ENTERPRISEPACK",
+            licenses_refreshed_at=timezone.now() - timedelta(hours=2),
+        )
+        with mock.patch("users.licensing.background.submit_once") as submit_once:
+            self.assertEqual(self.login()["role"], "office")  # stored role, no Graph wait
+            self.assertEqual(self.graph_paths(), [])
+            submit_once.assert_called_once()
+
+        self.login()  # eager: refresh runs right after this response
+        user = get_user_model().objects.get(azure_oid="oid-1")
+        self.assertEqual(user.role, "field")
+        self.assertEqual(user.licenses, "SPE_F3")
+
+
+@override_settings(AZURE_CLIENT_ID="client", BACKGROUND_TASKS_EAGER=True)
+class SharedGraphCacheTests(FakeGraphMixin, SimpleTestCase):
+    graph_options = {"latency_ms": 50}
+
+    def token_posts(self):
+        return [url for method, url in self.graph.calls if url.endswith("/oauth2/v2.0/token")]
+
+    def test_cold_start_is_single_flight(self):
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(graph_client.get_graph_app_token())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(tokens)), 1)
+        self.assertEqual(len(self.token_posts()), 1)
+
+    def test_value_from_another_worker_is_reused(self):
+        token = graph_client.get_graph_app_token()
+        graph_client._app_token.local.update({"key": None, "value": None, "expires_at": 0})  # "new process"
+        self.assertEqual(graph_client.get_graph_app_token(), token)
+        self.assertEqual(len(self.token_posts()), 1)
+
+    def test_waiter_never_releases_another_process_lock(self):
+        lock_key = graph_client._cache_key("app_token") + ":lock"
+        cache.add(lock_key, "other-process", timeout=30)
+        with mock.patch("config.shared_cache.LOCK_WAIT_SECONDS", 0.2):
+            graph_client.get_graph_app_token()  # gives up waiting and fetches itself
+        self.assertEqual(cache.get(lock_key), "other-process")
+        cache.delete(lock_key)
+
+    def test_token_near_expiry_is_served_then_renewed(self):
+        old = graph_client.get_graph_app_token()
+        graph_client._app_token.local["expires_at"] = time.time() + 120
+        cache.set(graph_client._cache_key("app_token"), {"value": old, "expires_at": time.time() + 120})
+
+        self.assertEqual(graph_client.get_graph_app_token(), old)  # no wait for the renewal
+        self.assertEqual(len(self.token_posts()), 2)
+        self.assertNotEqual(graph_client.get_graph_app_token(), old)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "jwks-tests"}},
+    AZURE_TENANT_ID="tenant",
+)
+class JwksKeyStoreTests(SimpleTestCase):
+    """
+    Keys come from the shared cache; only an unknown kid may refetch (rate-limited).
+    """
+
+    def setUp(self):
+        self.documents = [{"keys": [{"kty": "oct", "kid": "k1", "k": "c2VjcmV0"}]}]
+        fetch = mock.patch("users.jwks._fetch_jwks", side_effect=lambda: (self.documents[-1], 6 * 3600))
+        self.fetch = fetch.start()
+        self.addCleanup(fetch.stop)
+        self.store = JwksKeyStore()
+        self.addCleanup(self.store.reset)
+
+    def token(self, kid):
+        return jwt.encode({"sub": "x"}, "secret", algorithm="HS256", headers={"kid": kid})
+
+    def test_warm_store_never_fetches_on_request_path(self):
+        self.store.warm()
+        self.assertEqual(self.store.signing_key_for_token(self.token("k1")), b"secret")
+        self.assertEqual(JwksKeyStore().signing_key_for_token(self.token("k1")), b"secret")  # another worker
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_unknown_kid_refetches_once(self):
+        self.store.warm()
+        self.documents.append({"keys": [{"kty": "oct", "kid": "k2", "k": "bmV3"}]})
+        self.assertEqual(self.store.signing_key_for_token(self.token("k2")), b"new")
+        with self.assertRaises(AuthenticationFailed):
+            self.store.signing_key_for_token(self.token("bogus"))
+        self.assertEqual(self.fetch.call_count, 2)
+
+
+@override_settings(AZURE_TENANT_ID="tid-1", AZURE_CLIENT_ID="api-client")
+class VerifiedTokenCacheTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create(
+            email="learner@example.com", username="learner", azure_oid="oid-1", azure_tid="tid-1",
+        )
+        self.claims = {
+            "iss": "https://login.microsoftonline.com/tid-1/v2.0",
+            "oid": "oid-1", "tid": "tid-1", "preferred_username": "Learner@example.com",
+            "exp": int(time.time()) + 3600,
+        }
+        for target, kwargs in (
+            ("users.azure_auth.key_store.signing_key_for_token", {"return_value": "key"}),
+            ("users.azure_auth.jwt.decode", {"return_value": self.claims}),
+        ):
+            p = mock.patch(target, **kwargs)
+            setattr(self, target.rsplit(".", 1)[-1], p.start())
+            self.addCleanup(p.stop)
+        verified_tokens.clear()
+        self.addCleanup(verified_tokens.clear)
+
+    def authenticate(self, token="token-a"):
+        request = APIRequestFactory().get("/api/me/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        return AzureAdAccessTokenAuthentication().authenticate(request)[0]
+
+    def test_repeat_token_skips_verification_and_lookup(self):
+        self.assertEqual(self.authenticate(), self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.authenticate(), self.user)
+        self.assertEqual(self.decode.call_count, 1)
+
+        self.authenticate("token-b")
+        self.assertEqual(self.decode.call_count, 2)
+
+    def test_expired_or_deactivated_entries_are_not_used(self):
+        self.claims["exp"] = int(time.time()) - 1
+        self.authenticate()
+        self.authenticate()
+        self.assertEqual(self.decode.call_count, 2)
+
+        self.claims["exp"] = int(time.time()) + 3600
+        self.authenticate("token-c")
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        self.authenticate("token-c")
+        self.assertEqual(self.decode.call_count, 4)
+
+
+@override_settings(LMS_TRAINERS_GROUP_ID="group-trainers")
+class ClaimsJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        data = seed_catalog(courses=5, learners=1, hot_courses=3)
+        cls.learner = data["learners"][0]
+        cls.learner.azure_oid = "oid-learner"
+        cls.learner.save(update_fields=["azure_oid"])
+
+    def setUp(self):
+        self.graph = FakeGraph(trainer_oids={"oid-learner"}).patch()
+        self.addCleanup(self.graph.unpatch)
+
+    def client_for(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client
+
+    def test_claims_token_skips_user_query(self):
+        claims_client = self.client_for(issue_tokens(self.learner).access_token)
+        plain_client = self.client_for(RefreshToken.for_user(self.learner).access_token)
+
+        with CaptureQueriesContext(connection) as plain:
+            self.assertEqual(plain_client.get("/api/my-learning/").status_code, 200)
+        with CaptureQueriesContext(connection) as lazy:
+            r = claims_client.get("/api/my-learning/")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.json()), 3)
+        self.assertEqual(len(lazy), len(plain) - 1)
+
+    def test_deferred_fields_load_in_one_query(self):
+        token = AccessToken(str(issue_tokens(self.learner).access_token))
+        user = ClaimsJWTAuthentication().get_user(token)
+        self.assertEqual(
+            (user.pk, user.role, user.azure_oid, user.is_staff, user.is_superuser),
+            (self.learner.pk, "office", "oid-learner", False, False),
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual((user.email, user.licenses, user.first_name), (self.learner.email, None, ""))
+
+    def test_trainer_flag_is_trusted_until_it_expires(self):
+        client = self.client_for(issue_tokens(self.learner).access_token)
+        self.graph.calls.clear()
+        self.assertTrue(client.get("/api/me/").json()["can_upload"])
+        self.assertEqual(self.graph.calls, [])
+
+        with override_settings(LMS_TRAINER_CLAIM_TTL_SECONDS=-1):
+            client = self.client_for(issue_tokens(self.learner).access_token)
+        self.graph.calls.clear()
+        self.assertTrue(client.get("/api/me/").json()["can_upload"])
+        self.assertTrue(any("checkMemberGroups" in url for _, url in self.graph.calls))
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "revoke-tests"}})
+    def test_deactivated_user_is_rejected_before_token_expiry(self):
+        client = self.client_for(issue_tokens(self.learner).access_token)
+        self.assertEqual(client.get("/api/my-learning/").status_code, 200)
+
+        self.learner.is_active = False
+        self.learner.save(update_fields=["is_active"])
+        self.assertEqual(client.get("/api/my-learning/").status_code, 401)
+        # a token stamped while inactive is refused from its own claim
+        self.assertEqual(self.client_for(issue_tokens(self.learner).access_token).get("/api/my-learning/").status_code, 401)
+
+        self.learner.is_active = True
+        self.learner.save(update_fields=["is_active"])
+        self.assertEqual(client.get("/api/my-learning/").status_code, 200)
+
+    def test_refresh_restamps_role(self):
+        refresh = issue_tokens(self.learner)
+        get_user_model().objects.filter(pk=self.learner.pk).update(role="field")
+        r = APIClient().post("/api/token/refresh/", {"refresh": str(refresh)}, format="json")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(AccessToken(r.json()["access"])["lms"]["role"], "field")
+
+
+@override_settings(ROLLUP_SAFETY_LAG_SECONDS=0)
+class ActiveUsersRollupTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.users = [User.objects.create(email=f"u{i}@example.com", username=f"u{i}") for i in range(3)]
+        self.today = timezone.localdate()
+
+    def log(self, user, days_ago):
+        LoginEvent.objects.create(user=user, at=timezone.now() - timedelta(days=days_ago))
+
+    def test_rollup_counts_and_is_incremental(self):
+        a, b, c = self.users
+        self.log(a, 0)
+        self.log(a, 0)
+        self.log(b, 0)
+        self.log(c, 3)
+        self.assertEqual(rollup_logins()["events"], 4)
+
+        row = DailyActiveUsers.objects.get(date=self.today)
+        self.assertEqual((row.dau, row.wau), (2, 3))
+
+        self.assertEqual(rollup_logins()["events"], 0)  # nothing past the watermark
+        self.log(c, 0)
+        rollup_logins()
+        row.refresh_from_db()
+        self.assertEqual((row.dau, row.wau), (3, 3))
+        self.assertEqual(
+            MonthlyActiveUsers.objects.get(year=self.today.year, month=self.today.month).active_users,
+            row.mau,
+        )
+
+    def test_rollup_waits_for_ids_that_may_still_commit(self):
+        a, b, _ = self.users
+        young = LoginEvent.objects.create(user=a)
+        self.log(b, 1)  # higher id, older row: must not move the watermark past `young`
+        with override_settings(ROLLUP_SAFETY_LAG_SECONDS=300):
+            self.assertEqual(rollup_logins()["events"], 0)
+            LoginEvent.objects.filter(pk=young.pk).update(at=timezone.now() - timedelta(minutes=10))
+            self.assertEqual(rollup_logins()["events"], 2)
+
+    def test_mau_is_month_to_date_and_first_login_is_the_event_time(self):
+        a, b, _ = self.users
+
+        def at(day):
+            return timezone.make_aware(datetime(2025, 3, day, 12))
+
+        LoginEvent.objects.create(user=a, at=at(10))
+        LoginEvent.objects.create(user=b, at=at(20))
+        rollup_logins()
+        # recomputing 10 March after b's later login must not count b
+        self.assertEqual(DailyActiveUsers.objects.get(date=date(2025, 3, 10)).mau, 1)
+        self.assertEqual(DailyActiveUsers.objects.get(date=date(2025, 3, 20)).mau, 2)
+        self.assertEqual(MonthlyActiveUsers.objects.get(year=2025, month=3).active_users, 2)
+        self.assertEqual(UserMonthlyLogin.objects.get(user=b, year=2025, month=3).first_login_at, at(20))
+
+        LoginEvent.objects.create(user=a, at=at(5))  # folded late, but earlier
+        rollup_logins()
+        self.assertEqual(UserMonthlyLogin.objects.get(user=a, year=2025, month=3).first_login_at, at(5))
+        self.assertEqual(DailyActiveUsers.objects.get(date=date(2025, 3, 10)).mau, 1)
+
+
+class RequestMetricsTests(FakeGraphMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        data = seed_catalog(courses=2, learners=1, hot_courses=1)
+        cls.learner = data["learners"][0]
+        cls.staff = get_user_model().objects.create(
+            email="ops@example.com", username="ops", role="office", is_staff=True,
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        route_stats_store.reset()
+        self.addCleanup(route_stats_store.reset)
+
+    def test_server_timing_is_only_sent_to_staff(self):
+        self.assertNotIn("Server-Timing", self.client.get("/"))
+
+        self.client.force_authenticate(self.learner)
+        r = self.client.get("/api/my-learning/")
+        self.assertEqual(r.status_code, 200)
+        self.assertNotIn("Server-Timing", r)
+
+        self.client.force_authenticate(self.staff)
+        r = self.client.get("/api/my-learning/")
+        self.assertRegex(r["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", graph;dur=[\d.]+;desc="0 calls", total;dur=')
+
+        with override_settings(REQUEST_METRICS_SERVER_TIMING=True):
+            self.assertIn("Server-Timing", APIClient().get("/"))
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.force_authenticate(self.learner)
+        self.client.get("/api/my-learning/")
+        self.assertEqual(APIClient().get("/api/metrics/").status_code, 401)
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 403)
+        self.assertEqual(self.client.delete("/api/metrics/").status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        routes = {row["route"]: row for row in self.client.get("/api/metrics/").json()["routes"]}
+        self.assertEqual(routes["GET /api/my-learning/"]["count"], 1)
+        self.assertGreater(routes["GET /api/my-learning/"]["avg_db_queries"], 0)
+
+        self.assertEqual(self.client.delete("/api/metrics/").status_code, 204)
+        routes = {row["route"] for row in self.client.get("/api/metrics/").json()["routes"]}
+        self.assertNotIn("GET /api/my-learning/", routes)
@@ -1,38 +1,15 @@
-import time
 import jwt
-from jwt import PyJWKClient
 
 from django.conf import settings
 from rest_framework.exceptions import AuthenticationFailed
 
-
-_jwks_client_cache = {"client": None, "expires_at": 0}
-
-
-def _jwks_client() -> PyJWKClient:
-    """
-    Cache JWKS client to avoid fetching keys every request.
-    """
-    now = int(time.time())
-    if _jwks_client_cache["client"] and now < _jwks_client_cache["expires_at"]:
-        return _jwks_client_cache["client"]
-
-    tenant_id = getattr(settings, "AZURE_TENANT_ID", "") or ""
-    if not tenant_id:
-        raise AuthenticationFailed("Server misconfiguration: AZURE_TENANT_ID missing")
-
-    jwks_url = f"https://login.microsoftonline.com/{tenant_id}/discovery/v2.0/keys"
-    client = PyJWKClient(jwks_url)
-
-    _jwks_client_cache["client"] = client
-    _jwks_client_cache["expires_at"] = now + 6 * 3600
-    return client
+from .jwks import key_store
 
 
 def _expected_issuers() -> set[str]:
     tid = getattr(settings, "AZURE_TENANT_ID", "") or ""
     return {
-        f"https://login.microsoftonline.com/{tid}/v2.0",
+        f"{settings.AZURE_LOGIN_BASE_URL}/{tid}/v2.0",
         f"https://sts.windows.net/{tid}/",
     }
 
@@ -71,8 +48,7 @@ def verify_microsoft_id_token(id_token: str) -> dict:
     if not tok:
         raise AuthenticationFailed("id_token is required")
 
-    jwk_client = _jwks_client()
-    signing_key = jwk_client.get_signing_key_from_jwt(tok).key
+    signing_key = key_store.signing_key_for_token(tok)
 
     audiences = list(_expected_audiences_for_id_token())
     if not audiences:
@@ -1,6 +1,4 @@
 from django.contrib.auth import get_user_model
-from django.utils import timezone
-from django.db.models import F
 from django.conf import settings
 
 from rest_framework.decorators import api_view, permission_classes
@@ -8,17 +6,15 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
-from rest_framework_simplejwt.tokens import RefreshToken
-
 from courses.models import CourseProgress
 
-from .graph import (
-    get_user_licenses_and_object_id,
-    suggest_role_from_skus,
-    is_user_in_group,
-)
+from rest_framework_simplejwt.views import TokenRefreshView
+
+from .activity import record_login
+from .authentication import ClaimsTokenRefreshSerializer, issue_tokens, trainer_from_claims
+from .graph import is_user_in_group
+from .licensing import apply_license_snapshot, license_snapshot_is_stale, schedule_license_refresh
 
-from .models import UserMonthlyLogin, MonthlyActiveUsers
 from .token_verify import verify_microsoft_id_token  # ✅ NEW
 
 User = get_user_model()
@@ -109,61 +105,25 @@ def microsoft_login(request):
             user.role = "office"
             changed_fields.add("role")
 
-    # Always compute license-derived role suggestion on every login
-    try:
-        ident = oid or email_norm
-        sku_parts, resolved_object_id = get_user_licenses_and_object_id(ident)
-
-        if resolved_object_id and getattr(user, "azure_oid", None) != resolved_object_id:
-            user.azure_oid = resolved_object_id
-            changed_fields.add("azure_oid")
-
-        sug_role, reason = suggest_role_from_skus(sku_parts)
-
-        if getattr(user, "suggested_role", None) != sug_role:
-            user.suggested_role = sug_role
-            changed_fields.add("suggested_role")
-
-        if getattr(user, "suggested_role_reason", None) != reason:
-            user.suggested_role_reason = reason
-            changed_fields.add("suggested_role_reason")
-
-        licenses_str = ",".join(sku_parts or [])
-        if getattr(user, "licenses", None) != licenses_str:
-            user.licenses = licenses_str
-            changed_fields.add("licenses")
-
-        # Role derived from license unless staff/superuser
-        if not (user.is_superuser or user.is_staff):
-            if sug_role in ("office", "field"):
-                if user.role != sug_role:
-                    user.role = sug_role
-                    changed_fields.add("role")
-            else:
-                if user.role is not None:
-                    user.role = None
-                    changed_fields.add("role")
-
-    except Exception as e:
-        msg = f"Graph lookup failed: {e}"
-        if getattr(user, "suggested_role", None) is not None or getattr(user, "suggested_role_reason", None) != msg:
-            user.suggested_role = None
-            user.suggested_role_reason = msg
-            changed_fields.update({"suggested_role", "suggested_role_reason"})
+    # ✅ License-derived role: only a user that never had a snapshot (first
+    # login) waits for Graph; everyone else logs in with the stored role and a
+    # stale snapshot is refreshed in the background after the response.
+    refresh_later = False
+    if user.licenses is None and user.licenses_refreshed_at is None:
+        changed_fields.update(apply_license_snapshot(user))
+    elif license_snapshot_is_stale(user):
+        refresh_later = True
 
     if changed_fields:
         user.save(update_fields=list(changed_fields))
 
-    # ✅ MAU: Count unique users who logged in this month
-    now = timezone.now()
-    y, m = now.year, now.month
+    if refresh_later:
+        schedule_license_refresh(user)
 
-    monthly_row, monthly_created = UserMonthlyLogin.objects.get_or_create(user=user, year=y, month=m)
-    if monthly_created:
-        MonthlyActiveUsers.objects.get_or_create(year=y, month=m)
-        MonthlyActiveUsers.objects.filter(year=y, month=m).update(active_users=F("active_users") + 1)
+    # ✅ MAU/DAU/WAU: append-only event; users.activity.rollup_logins aggregates
+    record_login(user)
 
-    refresh = RefreshToken.for_user(user)
+    refresh = issue_tokens(user)
 
     return Response({
         "access": str(refresh.access_token),
@@ -200,6 +160,8 @@ def me(request):
 
         if u.is_superuser or u.is_staff:
             can_upload = True
+        elif trainer_from_claims(u) is not None:
+            can_upload = trainer_from_claims(u)
         elif group_id and oid:
             can_upload = is_user_in_group(oid, group_id)
         else:
@@ -319,3 +281,10 @@ def my_learning(request):
         })
 
     return Response(items)
+
+
+class ClaimsTokenRefreshView(TokenRefreshView):
+    """
+    POST /api/token/refresh/ – re-stamps the "lms" claim (users.authentication).
+    """
+    serializer_class = ClaimsTokenRefreshSerializer